@@ -34,7 +34,7 @@ export const FineTuneRecordSchema = z.object({
   output_path: z.string().describe('Path to the fine-tuned model'),
   data_size: z.number().int().describe('Number of training examples used'),
   training_config: TrainingConfigSchema.describe('Training configuration used'),
-  status: z.enum(['training', 'completed', 'failed']).describe('Status of the fine-tune'),
+  status: z.enum(['queued', 'training', 'completed', 'failed']).describe('Status of the fine-tune'),
   created_at: z.coerce.date().describe('Creation timestamp'),
   updated_at: z.coerce.date().describe('Last update timestamp'),
   meta: z
@@ -44,5 +44,13 @@ export const FineTuneRecordSchema = z.object({
     .describe('Optional metadata dictionary'),
   error: z.string().optional().describe('Error message if status is failed'),
   resumed_from: z.string().optional().nullable().describe('Name of the fine-tune this was resumed from'),
+  disk_usage: z
+    .object({
+      total_bytes: z.number().int(),
+      exclusive_bytes: z.number().int(),
+    })
+    .optional()
+    .nullable()
+    .describe('Total and exclusive (reclaimable) bytes of the fine-tune directory'),
 });
 export type FineTuneRecord = z.infer<typeof FineTuneRecordSchema>;
@@ -6,24 +6,45 @@ This API provides endpoints for:
 - Managing fine-tuned models in MongoDB
 - Starting and stopping VLLM servers for inference
 - Monitoring VLLM server status and health
+- Evaluating inference results against gold annotations
 """
 
 import os
-import subprocess
+import hashlib
 import signal
+import shutil
+import tarfile
+import tempfile
 import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import requests
 import json
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Response, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+from output_schema import build_output_schema, try_parse_output, retry_temperature, new_parse_stats, summarize_parse_stats
+from speculative import build_ngram_speculative_config
+import artifact_store
+from worker_queue import JobQueue, HEARTBEAT_TIMEOUT_SECONDS
+from data_manifest import row_hash, save_manifest, load_manifest, select_incremental_rows
+from validation_split import split_validation_rows
+import snapshots
+from profiler import load_profile
+from model_cache import ModelCache
+from gpu_arbiter import GPUArbiter
+from idle_scaler import IdleScaler
+from log_buffer import LogRingBuffer, pump_stream, STREAM_READ_LIMIT
+from record_cache import RecordCache
 
 
 # API Configuration
@@ -56,14 +77,57 @@ mongodb_client: Optional[AsyncIOMotorClient] = None
 database = None
 collection = None
 
+# Read-through cache of fine-tune records, invalidated on writes and from the change stream
+FINE_TUNE_CACHE_SIZE = 1024
+FINE_TUNE_CACHE_TTL_SECONDS = 30
+fine_tune_cache = RecordCache(max_size=FINE_TUNE_CACHE_SIZE, ttl_seconds=FINE_TUNE_CACHE_TTL_SECONDS)
+fine_tune_change_stream_active = False
+
 # Thread pool for CPU-intensive operations
 thread_pool = ThreadPoolExecutor(max_workers=2)
 
+# Output paths of fine-tunes currently training in this process
+training_output_paths = set()
+
+# Number of removed near-duplicate clusters stored on a fine-tune record
+MAX_REPORTED_DEDUP_CLUSTERS = 100
+
+# Training mode: "local" trains in this process, "remote" dispatches jobs to worker agents
+TRAINING_MODE = os.getenv("TRAINING_MODE", "local")
+job_queue = JobQueue(heartbeat_timeout=HEARTBEAT_TIMEOUT_SECONDS)
+
+# Local base-model cache, prefetched when a fine-tune or server start is requested
+model_cache = ModelCache()
+
 # VLLM Server Management
-vllm_process: Optional[subprocess.Popen] = None
+vllm_process: Optional[asyncio.subprocess.Process] = None
+vllm_base_model: Optional[str] = None  # Base model pinned in the model cache while served
+vllm_start_request: Optional["VLLMServerStartRequest"] = None  # Request the running server was started with
 vllm_server_port = 8001  # Fixed port
 vllm_server_host = "0.0.0.0"  # Fixed host
-vllm_server_status = "not_running"  # Possible values: "not_running", "starting", "running", "error"
+vllm_server_status = "not_running"  # Possible values: "not_running", "starting", "running", "error", "suspended", "scaled_to_zero"
+
+# Newest lines of the VLLM server's stdout and stderr
+VLLM_LOG_LINES = 5000
+VLLM_STOP_TIMEOUT_SECONDS = 10
+VLLM_LOG_DRAIN_SECONDS = 5
+vllm_logs = LogRingBuffer(max_lines=VLLM_LOG_LINES)
+vllm_log_tasks: List[asyncio.Task] = []  # Tasks pumping the server's stdout and stderr into vllm_logs
+
+# Sleep mode lets the GPU arbiter release the server's GPU memory without restarting it.
+# It needs VLLM_SERVER_DEV_MODE, which also exposes vLLM's development endpoints
+# (sleep, wake_up, reset_prefix_cache, ...) on vllm_server_host. It is therefore off by
+# default; enable it only where the server port is not reachable from untrusted
+# networks. Without it, the arbiter stops and restarts the server instead.
+VLLM_SLEEP_MODE = os.getenv("VLLM_SLEEP_MODE", "0") == "1"
+
+# Evaluation results cached by (inference_job_id, gold_dataset_version, hash of the items)
+EVALUATION_CACHE_SIZE = 64
+evaluation_cache: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+
+# Parse statistics of completions proxied to the VLLM server
+GUIDED_DECODING_BACKEND = "xgrammar"
+completion_parse_stats = new_parse_stats()
 
 
 # Pydantic Models
@@ -82,6 +146,16 @@ class TrainingConfig(BaseModel):
     max_seq_length: int = Field(default=2048, ge=128, le=8192, description="Maximum sequence length")
     learning_rate: float = Field(default=2e-4, gt=0, le=1e-2, description="Learning rate")
     resume_from_finetune: Optional[str] = Field(None, description="Name of the fine-tune to resume from")
+    keep_checkpoints: int = Field(default=1, ge=0, le=2, description="Number of newest checkpoints kept after success (0 prevents resuming from this fine-tune unless it kept a best checkpoint)")
+    validation_fraction: float = Field(default=0.0, ge=0, le=0.5, description="Fraction of the data held out for validation when no eval data is given")
+    eval_steps: Optional[int] = Field(None, ge=1, description="Evaluate every eval_steps steps instead of every epoch")
+    early_stopping_patience: int = Field(default=3, ge=1, le=100, description="Evaluations without improvement before training stops early")
+    early_stopping_min_delta: float = Field(default=0.0, ge=0, description="Minimum eval loss improvement that resets the patience")
+    incremental: bool = Field(default=False, description="When resuming, train only on rows not seen by the parent fine-tune")
+    replay_ratio: float = Field(default=0.0, ge=0, le=1, description="Old rows replayed per new row in incremental mode")
+    dedup_threshold: Optional[float] = Field(None, gt=0, le=1, description="Remove near-duplicate rows above this estimated Jaccard similarity (disabled if not set)")
+    profile_cpu: bool = Field(False, description="Dump a cProfile of the CPU-side training phases next to the adapter")
+
 
 class FineTuneRecord(BaseModel):
     """Fine-tune record stored in database."""
@@ -94,10 +168,21 @@ class FineTuneRecord(BaseModel):
     updated_at: datetime = Field(..., description="Last update timestamp")
     meta: Optional[Dict[str, Any]] = Field(None, description="Optional metadata dictionary")
     resumed_from: Optional[str] = Field(None, description="Name of the fine-tune this was resumed from")
+    artifact_stats: Optional[Dict[str, Any]] = Field(None, description="Checkpoint pruning and deduplication statistics")
+    disk_usage: Optional[Dict[str, int]] = Field(None, description="Total and exclusive (reclaimable) bytes of the fine-tune directory")
+    training_summary: Optional[Dict[str, Any]] = Field(None, description="Epochs trained and saved, early stopping and eval loss curve")
+    training_profile: Optional[Dict[str, Any]] = Field(None, description="Time and peak memory of every fine-tuning phase")
+    gpu_arbitration: Optional[Dict[str, Any]] = Field(None, description="Time waited for the GPU and how the VLLM server was suspended for this fine-tune")
+    incremental_stats: Optional[Dict[str, int]] = Field(None, description="Rows submitted, new, replayed, skipped and trained in incremental mode")
+    dedup_report: Optional[Dict[str, Any]] = Field(None, description="Near-duplicate removal statistics and the largest removed clusters")
+    training_snapshot: Optional[Dict[str, Any]] = Field(None, description="Parquet files holding the exact training and validation rows")
+    eval_data_size: Optional[int] = Field(None, description="Number of validation examples used, explicit or held out by validation_fraction")
+    worker_id: Optional[str] = Field(None, description="Remote training worker running or having run the fine-tune")
 
 class FineTuneRequest(BaseModel):
     """Request for fine-tuning a model."""
     data: List[TrainingData] = Field(..., min_items=1, description="Training data array")
+    eval_data: Optional[List[TrainingData]] = Field(None, description="Explicit validation data, takes precedence over validation_fraction")
     training_config: TrainingConfig = Field(..., description="Training configuration")
     meta: Optional[Dict[str, Any]] = Field(None, description="Optional metadata dictionary for informational purposes")
 
@@ -112,9 +197,34 @@ class FineTuneResponse(BaseModel):
     meta: Optional[Dict[str, Any]] = Field(None, description="Optional metadata dictionary")
 
 
+class WorkerRegisterRequest(BaseModel):
+    """Request from a training worker to register with the API."""
+    hostname: str = Field(..., description="Hostname of the worker")
+    capacity: int = Field(default=1, ge=1, le=16, description="Number of fine-tune jobs the worker runs concurrently")
+    worker_id: Optional[str] = Field(None, description="Id of a previously registered worker re-registering")
+    info: Optional[Dict[str, Any]] = Field(None, description="Optional worker information (GPUs, memory, ...)")
+
+
+class WorkerRegisterResponse(BaseModel):
+    """Response to a worker registration."""
+    worker_id: str = Field(..., description="Id assigned to the worker")
+    heartbeat_interval: float = Field(..., description="Seconds between heartbeats expected from the worker")
+
+
+class WorkerJobStatusRequest(BaseModel):
+    """Status update streamed by a worker for one of its jobs."""
+    status: str = Field(..., description="Job status: 'training' or 'failed'")
+    message: Optional[str] = Field(None, description="Progress information")
+    error: Optional[str] = Field(None, description="Error message if status is failed")
+
+
 class VLLMServerStartRequest(BaseModel):
     """Request to start VLLM server."""
     fine_tune_name: str = Field(..., description="Name of the fine-tune to serve")
+    speculative_decoding: bool = Field(default=False, description="Enable n-gram prompt-lookup speculative decoding")
+    prompt_lookup_max: int = Field(default=4, ge=1, le=16, description="Largest n-gram window matched against the prompt")
+    prompt_lookup_min: int = Field(default=1, ge=1, le=16, description="Smallest n-gram window matched against the prompt")
+    num_speculative_tokens: int = Field(default=5, ge=1, le=32, description="Lookahead tokens proposed per decoding step")
 
 
 class VLLMServerResponse(BaseModel):
@@ -125,6 +235,71 @@ class VLLMServerResponse(BaseModel):
     pid: Optional[int] = Field(None, description="Process ID of the server")
 
 
+class Annotation(BaseModel):
+    """A single (sense, stimulus, perception, sentiment) annotation."""
+    sense: str = Field(..., description="Sense of the annotation")
+    stimulus: str = Field(..., description="Stimulus text span")
+    perception: str = Field(..., description="Perception text span")
+    sentiment: str = Field(..., description="Sentiment of the annotation")
+
+
+class EvaluationItem(BaseModel):
+    """Gold and predicted annotations of one data point."""
+    gold: List[Annotation] = Field(..., description="Gold annotations of the data point")
+    predicted: List[Annotation] = Field(..., description="Predicted annotations of the data point")
+
+
+class EvaluationRequest(BaseModel):
+    """Request for evaluating an inference run."""
+    inference_job_id: str = Field(..., description="Identifier of the inference run being evaluated")
+    gold_dataset_version: str = Field(..., description="Version of the gold dataset, part of the cache key")
+    items: List[EvaluationItem] = Field(..., description="Data points to evaluate")
+    include_individual_scores: bool = Field(default=True, description="Whether to return per data point scores")
+
+
+class EvaluationResponse(BaseModel):
+    """Response from evaluating an inference run."""
+    inference_job_id: str = Field(..., description="Identifier of the evaluated inference run")
+    gold_dataset_version: str = Field(..., description="Version of the gold dataset")
+    cached: bool = Field(..., description="Whether the result was served from cache")
+    precision: float = Field(..., description="Micro precision")
+    recall: float = Field(..., description="Micro recall")
+    f1: float = Field(..., description="Micro F1 score")
+    total_true_positives: int = Field(..., description="Total true positives")
+    total_false_positives: int = Field(..., description="Total false positives")
+    total_false_negatives: int = Field(..., description="Total false negatives")
+    macro_f1_sense: float = Field(..., description="Macro F1 score over senses")
+    macro_f1_sentiment: float = Field(..., description="Macro F1 score over sentiments")
+    per_sense: Dict[str, Dict[str, Any]] = Field(..., description="Breakdown per sense")
+    per_sentiment: Dict[str, Dict[str, Any]] = Field(..., description="Breakdown per sentiment")
+    data_size: int = Field(..., description="Number of evaluated data points")
+    individual_scores: Optional[List[Dict[str, Any]]] = Field(None, description="Scores of every data point")
+
+
+class ModelPrefetchRequest(BaseModel):
+    """Request to resolve a base model into the local cache and prefetch its weights."""
+    model_name: str = Field(..., description="Base model name or local model directory")
+
+
+class VLLMCompletionRequest(BaseModel):
+    """Completion request proxied to the VLLM server."""
+    prompt: str = Field(..., description="Prompt text")
+    temperature: float = Field(default=0.1, ge=0, le=2, description="Sampling temperature")
+    max_tokens: int = Field(default=1000, ge=1, description="Maximum number of tokens to generate")
+    output_schema: Optional[Dict[str, Any]] = Field(None, description="JSON schema enforced with guided decoding")
+    output_format: Optional[Dict[str, Any]] = Field(None, description="Output format used to build the JSON schema if output_schema is not given")
+    format_type: str = Field(default="order-preserving", description="Output format type used with output_format")
+    max_parse_retries: int = Field(default=0, ge=0, le=5, description="Number of times an unparseable output is regenerated, at a temperature of at least 0.7")
+
+
+class VLLMCompletionResponse(BaseModel):
+    """Completion returned by the VLLM server."""
+    text: str = Field(..., description="Generated text")
+    parse_ok: bool = Field(..., description="Whether the generated text parses as JSON")
+    guided: bool = Field(..., description="Whether guided decoding was used")
+    retries: int = Field(..., description="Number of regenerations due to parse failures")
+
+
 # Startup and Shutdown Events
 @app.on_event("startup")
 async def startup_event():
@@ -148,9 +323,18 @@ async def startup_event():
         
         print(f"✅ Connected to MongoDB: {DATABASE_NAME}.{COLLECTION_NAME}")
         
+        await fail_orphaned_fine_tunes()
+        asyncio.create_task(watch_fine_tune_changes())
+        
+        if TRAINING_MODE == "remote":
+            asyncio.create_task(monitor_workers())
+            print("🛰️ Remote training mode: fine-tunes are dispatched to worker agents")
+        
     except Exception as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
         print("⚠️  API will run without database functionality")
+    
+    asyncio.create_task(idle_scaler.run())
 
 
 @app.on_event("shutdown")
@@ -159,18 +343,17 @@ async def shutdown_event():
     global mongodb_client, vllm_process, vllm_server_status
     
     # Stop VLLM server if running
-    if vllm_process and vllm_process.poll() is None:
+    if is_vllm_process_alive():
         try:
-            vllm_process.terminate()
-            vllm_process.wait(timeout=10)
-            print("✅ VLLM server stopped")
-        except subprocess.TimeoutExpired:
-            vllm_process.kill()
-            print("⚠️ VLLM server force killed")
+            if await terminate_vllm_process():
+                print("✅ VLLM server stopped")
+            else:
+                print("⚠️ VLLM server force killed")
         except Exception as e:
             print(f"❌ Error stopping VLLM server: {e}")
         finally:
             vllm_server_status = "not_running"
+    await stop_vllm_log_pumps()
     
     if mongodb_client:
         mongodb_client.close()
@@ -182,6 +365,84 @@ async def shutdown_event():
 
 
 # Helper Functions
+async def find_fine_tune_record(fine_tune_name: str) -> Optional[Dict[str, Any]]:
+    """Get a fine-tune record, from the record cache if possible."""
+    document = fine_tune_cache.get(fine_tune_name)
+    if document is not None:
+        return document
+    
+    generation = fine_tune_cache.generation(fine_tune_name)
+    document = await collection.find_one({"fine_tune_name": fine_tune_name})
+    if document is not None:
+        fine_tune_cache.put(fine_tune_name, document, generation)
+    return document
+
+
+async def update_fine_tune_record(fine_tune_name: str, update: Dict[str, Any]):
+    """Apply an update to a fine-tune record and invalidate its cached copy."""
+    try:
+        await collection.update_one({"fine_tune_name": fine_tune_name}, update)
+    finally:
+        fine_tune_cache.invalidate(fine_tune_name)
+
+
+async def watch_fine_tune_changes():
+    """
+    Invalidate cached fine-tune records changed outside this API.
+    
+    Uses a MongoDB change stream, which requires a replica set; on a
+    standalone server cached records only expire after their TTL.
+    """
+    global fine_tune_change_stream_active
+    
+    while collection is not None:
+        try:
+            async with collection.watch() as stream:
+                # Changes made before the stream opened may have been missed
+                fine_tune_cache.clear()
+                fine_tune_change_stream_active = True
+                print("👀 Watching fine-tune record changes")
+                async for change in stream:
+                    document = change.get("fullDocument") or {}
+                    if document.get("fine_tune_name"):
+                        fine_tune_cache.invalidate(document["fine_tune_name"])
+                    elif "documentKey" in change:
+                        fine_tune_cache.invalidate_document_id(change["documentKey"]["_id"])
+                    else:
+                        fine_tune_cache.clear()
+        except OperationFailure as e:
+            print(f"ℹ️ Change streams unavailable, cached fine-tune records expire after {FINE_TUNE_CACHE_TTL_SECONDS}s: {e}")
+            return
+        except Exception as e:
+            print(f"⚠️ Fine-tune change stream interrupted, reconnecting: {e}")
+            await asyncio.sleep(5)
+        finally:
+            fine_tune_change_stream_active = False
+            fine_tune_cache.clear()
+
+
+async def fail_orphaned_fine_tunes():
+    """
+    Fail fine-tunes left queued or training by a previous run of the API.
+    
+    Queued jobs, their training data and local training threads only live in
+    this process, so after a restart nothing would ever finish these records.
+    """
+    result = await collection.update_many(
+        {"status": {"$in": ["queued", "training"]}},
+        {
+            "$set": {
+                "status": "failed",
+                "error": "Interrupted by an API restart, submit the fine-tune again",
+                "updated_at": datetime.now()
+            }
+        }
+    )
+    fine_tune_cache.clear()
+    if result.modified_count:
+        print(f"⚠️ Marked {result.modified_count} fine-tunes interrupted by the restart as failed")
+
+
 def generate_fine_tune_name(model_name: str) -> str:
     """Generate a unique fine-tune name with datetime suffix."""
     # Extract model name without path/organization
@@ -192,12 +453,16 @@ def generate_fine_tune_name(model_name: str) -> str:
 
 def generate_output_path(fine_tune_name: str) -> str:
     """Generate output path for the fine-tuned model."""
-    return f"./fine_tuned_models/{fine_tune_name}"
+    return f"{artifact_store.ARTIFACT_ROOT}/{fine_tune_name}"
 
 
 def generate_vllm_command(model_name: str, lora_adapter_path: Optional[str] = None, 
                          port: int = 8001, host: str = "localhost", 
-                         additional_args: Optional[List[str]] = None) -> List[str]:
+                         additional_args: Optional[List[str]] = None,
+                         guided_decoding_backend: Optional[str] = None,
+                         speculative_config: Optional[Dict[str, Any]] = None,
+                         served_model_name: Optional[str] = None,
+                         enable_sleep_mode: bool = False) -> List[str]:
     """Generate VLLM server command based on parameters."""
     cmd = [
         "vllm", "serve", model_name,
@@ -208,15 +473,75 @@ def generate_vllm_command(model_name: str, lora_adapter_path: Optional[str] = No
         "--dtype", "half"
     ]
     
+    if served_model_name:
+        cmd.extend(["--served-model-name", served_model_name])
+    
+    if enable_sleep_mode:
+        cmd.append("--enable-sleep-mode")
+    
     if lora_adapter_path:
         cmd.extend(["--enable-lora", "--lora-modules", f"fine_tuned_adapter={lora_adapter_path}"])
     
+    if guided_decoding_backend:
+        cmd.extend(["--guided-decoding-backend", guided_decoding_backend])
+    
+    if speculative_config:
+        cmd.extend(["--speculative-config", json.dumps(speculative_config)])
+    
     if additional_args:
         cmd.extend(additional_args)
     
     return cmd
 
 
+def is_vllm_process_alive() -> bool:
+    """Check if the VLLM server process exists and has not exited."""
+    return vllm_process is not None and vllm_process.returncode is None
+
+
+async def terminate_vllm_process(timeout: float = VLLM_STOP_TIMEOUT_SECONDS) -> bool:
+    """
+    Terminate the VLLM server process without blocking the event loop.
+    
+    Sends SIGTERM and waits up to timeout seconds before killing the process.
+    
+    Returns:
+        True if the process exited gracefully, False if it had to be killed
+    """
+    try:
+        vllm_process.terminate()
+    except ProcessLookupError:
+        return True
+    try:
+        await asyncio.wait_for(vllm_process.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        try:
+            vllm_process.kill()
+        except ProcessLookupError:
+            pass
+        await vllm_process.wait()
+        return False
+
+
+async def stop_vllm_log_pumps(timeout: float = VLLM_LOG_DRAIN_SECONDS):
+    """
+    Wait for the log pumps of an exited VLLM server to drain its last output,
+    then cancel those still running.
+    """
+    global vllm_log_tasks
+    
+    tasks, vllm_log_tasks = vllm_log_tasks, []
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            print(f"⚠️ Reading VLLM server output failed: {result}")
+
+
 def check_vllm_server_health() -> bool:
     """Check if VLLM server is responsive via health endpoint."""
     global vllm_server_port, vllm_server_host
@@ -228,13 +553,111 @@ def check_vllm_server_health() -> bool:
         return False
 
 
+async def resolve_base_model(model_name: str) -> str:
+    """
+    Return the local model cache directory of a base model.
+    
+    Falls back to the model name, loaded through the Hugging Face cache, if
+    the model cannot be cached (e.g. gated without a token).
+    """
+    try:
+        return await asyncio.wrap_future(model_cache.ensure(model_name))
+    except Exception as e:
+        print(f"⚠️ Base model {model_name} not cached, loading it by name: {e}")
+        return model_name
+
+
+def release_vllm_base_model():
+    """Allow the base model of a stopped VLLM server to be evicted from the model cache."""
+    global vllm_base_model
+    
+    if vllm_base_model is not None:
+        model_cache.unpin(vllm_base_model)
+        vllm_base_model = None
+
+
+class VLLMServerController:
+    """Drives the VLLM server managed by this API on behalf of the GPU arbiter."""
+    
+    async def is_running(self) -> bool:
+        return is_vllm_process_alive()
+    
+    async def is_ready(self) -> bool:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, check_vllm_server_health)
+    
+    async def metrics(self) -> Optional[str]:
+        loop = asyncio.get_event_loop()
+        try:
+            response = await loop.run_in_executor(
+                None,
+                lambda: requests.get(f"http://{vllm_server_host}:{vllm_server_port}/metrics", timeout=5)
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            return None
+        return response.text
+    
+    def served_fine_tune(self) -> Optional[str]:
+        return vllm_start_request.fine_tune_name if vllm_start_request else None
+    
+    def supports_sleep(self) -> bool:
+        return VLLM_SLEEP_MODE
+    
+    async def sleep(self):
+        # Level 1 offloads the weights to CPU memory and discards the KV cache
+        await self._post("/sleep?level=1")
+    
+    async def wake_up(self):
+        await self._post("/wake_up")
+    
+    async def stop(self):
+        await stop_vllm_server()
+    
+    async def start(self, fine_tune_name: str):
+        request = vllm_start_request
+        if request is None or request.fine_tune_name != fine_tune_name:
+            request = VLLMServerStartRequest(fine_tune_name=fine_tune_name)
+        await start_vllm_server(request)
+    
+    async def _post(self, path: str):
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            None,
+            lambda: requests.post(f"http://{vllm_server_host}:{vllm_server_port}{path}", timeout=60)
+        )
+        response.raise_for_status()
+
+
+# Suspends the VLLM server while local fine-tunes need its GPU memory
+gpu_arbiter = GPUArbiter(VLLMServerController())
+
+
+def vllm_start_blocked() -> Optional[str]:
+    """Return why the VLLM server must not be cold-started now, None if it may be."""
+    if gpu_arbiter.active_trainings:
+        return f"fine-tunes {', '.join(gpu_arbiter.active_trainings)} are using the GPU"
+    return None
+
+
+# Stops the VLLM server when neither the API nor direct clients have sent requests for a
+# while, and starts it again for the next completion request through the API
+idle_scaler = IdleScaler(VLLMServerController(), start_blocked=vllm_start_blocked)
+
+
 def update_vllm_server_status():
     """Update the VLLM server status based on process and health check."""
     global vllm_process, vllm_server_status
     
+    # Serving is paused while a fine-tune holds the GPU
+    if gpu_arbiter.suspension is not None:
+        vllm_server_status = "suspended"
+        return
+    
     # Check if process is still running
-    if not vllm_process or vllm_process.poll() is not None:
-        vllm_server_status = "not_running"
+    if not is_vllm_process_alive():
+        vllm_server_status = "scaled_to_zero" if idle_scaler.scaled_down is not None else "not_running"
+        release_vllm_base_model()
         return
     
     # If process is running, check if server is responsive
@@ -251,16 +674,130 @@ def is_vllm_server_running() -> bool:
     return vllm_server_status == "running"
 
 
-async def run_fine_tuning(training_data: List[Dict[str, str]], training_settings: Dict[str, Any]) -> str:
-    """Run fine-tuning in thread pool to avoid blocking the event loop."""
+async def run_fine_tuning(fine_tune_name: str, training_data: List[Dict[str, str]], training_settings: Dict[str, Any],
+                          eval_data: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    Run fine-tuning in thread pool to avoid blocking the event loop.
+    
+    The GPU arbiter suspends the VLLM server for the duration of training if
+    the GPU memory would not suffice, and restores it afterwards.
+    """
     from fine_tune import fine_tune
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        thread_pool, 
-        fine_tune, 
-        training_data, 
-        training_settings
+    
+    # Train from the verified local copy of the base model, which is being
+    # prefetched since the fine-tune was submitted
+    model_name = training_settings["model_name"]
+    model_path = await resolve_base_model(model_name)
+    model_cache.pin(model_name)
+    try:
+        gpu_arbitration = await gpu_arbiter.acquire(fine_tune_name)
+        try:
+            await update_fine_tune_record(
+                fine_tune_name,
+                {"$set": {"gpu_arbitration": gpu_arbitration, "updated_at": datetime.now()}}
+            )
+            return await loop.run_in_executor(
+                thread_pool, 
+                fine_tune, 
+                training_data, 
+                {**training_settings, "model_path": model_path},
+                eval_data
+            )
+        finally:
+            await gpu_arbiter.release(fine_tune_name)
+    finally:
+        model_cache.unpin(model_name)
+
+
+async def complete_fine_tune(fine_tune_name: str, output_path: str, keep_checkpoints: int):
+    """Finalize the artifact of a finished fine-tune and mark its record completed."""
+    loop = asyncio.get_event_loop()
+    
+    # Record every row seen so far for incremental fine-tunes resuming from this one
+    manifest_hashes = await loop.run_in_executor(
+        None, load_manifest, snapshots.fine_tune_snapshot_dir(fine_tune_name)
     )
+    if manifest_hashes:
+        await loop.run_in_executor(None, save_manifest, output_path, manifest_hashes)
+    
+    # Prune checkpoints and deduplicate the adapter files
+    artifact_stats = await loop.run_in_executor(
+        None,
+        artifact_store.finalize_artifact,
+        output_path,
+        keep_checkpoints
+    )
+    
+    # Update record with success status
+    await update_fine_tune_record(
+        fine_tune_name,
+        {
+            "$set": {
+                "status": "completed",
+                "artifact_stats": artifact_stats,
+                "training_summary": artifact_store.load_training_summary(output_path),
+                "training_profile": load_profile(output_path),
+                "updated_at": datetime.now()
+            }
+        }
+    )
+    print(f"✅ Fine-tuning completed: {fine_tune_name}")
+
+
+async def fail_fine_tune(fine_tune_name: str, error: str):
+    """Mark the record of a fine-tune failed."""
+    await update_fine_tune_record(
+        fine_tune_name,
+        {
+            "$set": {
+                "status": "failed",
+                "error": error,
+                "updated_at": datetime.now()
+            }
+        }
+    )
+    print(f"❌ Fine-tuning failed: {fine_tune_name}, Error: {error}")
+
+
+def extract_artifact_archive(archive_path: str, output_path: str):
+    """Extract an uploaded adapter archive into the fine-tune directory."""
+    destination = os.path.realpath(output_path)
+    with tarfile.open(archive_path, "r:gz") as archive:
+        for member in archive.getmembers():
+            member_path = os.path.realpath(os.path.join(destination, member.name))
+            if member_path != destination and not member_path.startswith(destination + os.sep):
+                raise ValueError(f"Archive member escapes the fine-tune directory: {member.name}")
+            if not (member.isdir() or member.isfile()):
+                raise ValueError(f"Archive member is not a regular file: {member.name}")
+        if os.path.exists(output_path):
+            shutil.rmtree(output_path)
+        archive.extractall(output_path)
+
+
+async def monitor_workers():
+    """Periodically requeue the jobs of workers whose heartbeat timed out."""
+    while True:
+        await asyncio.sleep(job_queue.heartbeat_timeout / 3)
+        for fine_tune_name in job_queue.requeue_lost_workers():
+            print(f"⚠️ Worker lost, requeued fine-tune: {fine_tune_name}")
+            if collection is not None:
+                await update_fine_tune_record(
+                    fine_tune_name,
+                    {
+                        "$set": {"status": "queued", "worker_id": None, "updated_at": datetime.now()},
+                        "$inc": {"requeue_count": 1}
+                    }
+                )
+
+
+def collect_disk_usage(output_paths: List[str]) -> List[Optional[Dict[str, int]]]:
+    """Report the disk usage of several fine-tune directories, scanning the object store once."""
+    stored_inodes = artifact_store.object_inodes()
+    return [
+        artifact_store.disk_usage(path, stored_inodes) if path and os.path.isdir(path) else None
+        for path in output_paths
+    ]
 
 
 # Note: Direct inference function removed - now using VLLM server via HTTP requests
@@ -277,9 +814,20 @@ async def root():
             "fine_tune": "/fine-tune",
             "list_models": "/fine-tunes",
             "delete_model": "/fine-tunes/{fine_tune_name}",
+            "collect_garbage": "/fine-tunes/gc",
+            "download_artifact": "/fine-tunes/{fine_tune_name}/artifact",
+            "workers": "/workers",
             "start_vllm_server": "/start-vllm-server",
             "stop_vllm_server": "/stop-vllm-server",
-            "vllm_server_status": "/vllm-server-status"
+            "vllm_server_status": "/vllm-server-status",
+            "vllm_server_logs": "/vllm-server-logs",
+            "vllm_server_idle": "/vllm-server-idle",
+            "gpu_arbiter": "/gpu-arbiter",
+            "fine_tune_cache": "/fine-tune-cache",
+            "model_cache": "/model-cache",
+            "evaluate": "/evaluate",
+            "vllm_completions": "/vllm/completions",
+            "vllm_parse_stats": "/vllm/parse-stats"
         }
     }
 
@@ -308,7 +856,7 @@ async def create_fine_tune(request: FineTuneRequest, background_tasks: Backgroun
         
         if request.training_config.resume_from_finetune:
             # Retrieve the fine-tune record to resume from
-            resume_record = await collection.find_one({"fine_tune_name": request.training_config.resume_from_finetune})
+            resume_record = await find_fine_tune_record(request.training_config.resume_from_finetune)
             if not resume_record:
                 raise HTTPException(
                     status_code=404,
@@ -331,15 +879,27 @@ async def create_fine_tune(request: FineTuneRequest, background_tasks: Backgroun
                     detail=f"Fine-tune record '{request.training_config.resume_from_finetune}' is missing output path"
                 )
             
+            # A fine-tune kept with keep_checkpoints=0 has no checkpoint to continue from
+            if not artifact_store.list_checkpoints(resume_from_dir):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot resume from fine-tune '{request.training_config.resume_from_finetune}': it kept no checkpoints (keep_checkpoints=0)"
+                )
+            
             print(f"🔄 Resuming from fine-tune: {request.training_config.resume_from_finetune}")
             print(f"📂 Resume from directory: {resume_from_dir}")
         
+        # Warm the base model while the data is prepared and the job waits to run
+        if TRAINING_MODE == "local":
+            model_cache.ensure(request.training_config.model_name)
+        
         # Generate unique fine-tune name and output path
         fine_tune_name = generate_fine_tune_name(request.training_config.model_name)
         output_path = generate_output_path(fine_tune_name)
         
         # Prepare training data and settings
         training_data = [{"input": item.input, "output": item.output} for item in request.data]
+        eval_data = [{"input": item.input, "output": item.output} for item in request.eval_data] if request.eval_data else None
         training_settings = request.training_config.dict()
         training_settings["output_dir"] = output_path
         
@@ -347,56 +907,114 @@ async def create_fine_tune(request: FineTuneRequest, background_tasks: Backgroun
         if resume_from_dir:
             training_settings["resume_from_dir"] = resume_from_dir
         
+        # The manifest covers every row seen, including the parent's
+        loop = asyncio.get_event_loop()
+        parent_hashes = await loop.run_in_executor(None, load_manifest, resume_from_dir) if resume_from_dir else set()
+        manifest_hashes = parent_hashes | {row_hash(row) for row in training_data}
+        
+        # Remove near-duplicate rows (e.g. boosted variants) before training
+        dedup_report = None
+        if request.training_config.dedup_threshold is not None:
+            from dedup import deduplicate
+            training_data, dedup_report = await loop.run_in_executor(
+                None, deduplicate, training_data, request.training_config.dedup_threshold
+            )
+            print(f"🧹 Removed {dedup_report['removed_rows']} near-duplicate rows "
+                  f"in {len(dedup_report['clusters'])} clusters ({dedup_report['seconds']:.2f}s)")
+            dedup_report["cluster_count"] = len(dedup_report["clusters"])
+            dedup_report["clusters"] = dedup_report["clusters"][:MAX_REPORTED_DEDUP_CLUSTERS]
+        
+        incremental_stats = None
+        if request.training_config.incremental:
+            if not resume_from_dir:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Incremental fine-tuning requires resume_from_finetune"
+                )
+            if not parent_hashes:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Fine-tune '{resumed_from}' has no data manifest to compute the delta against"
+                )
+            training_data, incremental_stats = select_incremental_rows(
+                training_data, parent_hashes, request.training_config.replay_ratio
+            )
+            if incremental_stats["new_rows"] == 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"No new rows since fine-tune '{resumed_from}'"
+                )
+            print(f"➕ Incremental fine-tune: {incremental_stats['new_rows']} new rows, "
+                  f"{incremental_stats['replay_rows']} replayed, {incremental_stats['skipped_rows']} skipped")
+        
+        # Hold out the validation rows now, so the snapshot separates them from the training rows
+        if not eval_data:
+            training_data, eval_data = split_validation_rows(training_data, request.training_config.validation_fraction)
+        
         print(f"🚀 Starting fine-tuning: {fine_tune_name}")
         print(f"📁 Output path: {output_path}")
         print(f"📊 Training data size: {len(training_data)}")
         
+        # Persist the exact training and validation sets for reproduction and analysis
+        training_snapshot = await loop.run_in_executor(
+            None, snapshots.write_fine_tune_snapshot, fine_tune_name, training_data, eval_data
+        )
+        # The manifest waits next to the snapshot until it is saved with the finished adapter
+        await loop.run_in_executor(
+            None, save_manifest, snapshots.fine_tune_snapshot_dir(fine_tune_name), manifest_hashes
+        )
+        
         # Create initial record in database
         fine_tune_record = {
             "fine_tune_name": fine_tune_name,
             "output_path": output_path,
             "data_size": len(training_data),
             "training_config": training_settings,
-            "status": "training",
+            "status": "queued" if TRAINING_MODE == "remote" else "training",
             "created_at": datetime.now(),
             "updated_at": datetime.now(),
             "meta": request.meta,
-            "resumed_from": resumed_from
+            "resumed_from": resumed_from,
+            "eval_data_size": len(eval_data) if eval_data else None,
+            "incremental_stats": incremental_stats,
+            "dedup_report": dedup_report,
+            "training_snapshot": training_snapshot
         }
         
         await collection.insert_one(fine_tune_record)
+        fine_tune_cache.invalidate(fine_tune_name)
+        
+        if TRAINING_MODE == "remote":
+            # Hand the job to the next worker agent that pulls
+            job_queue.enqueue(fine_tune_name, {
+                "fine_tune_name": fine_tune_name,
+                "training_data": training_data,
+                "eval_data": eval_data,
+                "training_settings": training_settings,
+                "resumed_from": resumed_from
+            })
+            return FineTuneResponse(
+                fine_tune_name=fine_tune_name,
+                status="queued",
+                message=f"Fine-tuning queued for a training worker. Model will be saved as '{fine_tune_name}'",
+                data_size=len(training_data),
+                created_at=datetime.now(),
+                meta=request.meta
+            )
         
         # Define background task to run fine-tuning
         async def fine_tune_task():
+            training_output_paths.add(output_path)
             try:
                 # Run fine-tuning
-                await run_fine_tuning(training_data, training_settings)
-                
-                # Update record with success status
-                await collection.update_one(
-                    {"fine_tune_name": fine_tune_name},
-                    {
-                        "$set": {
-                            "status": "completed",
-                            "updated_at": datetime.now()
-                        }
-                    }
-                )
-                print(f"✅ Fine-tuning completed: {fine_tune_name}")
+                await run_fine_tuning(fine_tune_name, training_data, training_settings, eval_data)
+                await complete_fine_tune(fine_tune_name, output_path, training_settings["keep_checkpoints"])
                 
             except Exception as e:
                 # Update record with error status
-                await collection.update_one(
-                    {"fine_tune_name": fine_tune_name},
-                    {
-                        "$set": {
-                            "status": "failed",
-                            "error": str(e),
-                            "updated_at": datetime.now()
-                        }
-                    }
-                )
-                print(f"❌ Fine-tuning failed: {fine_tune_name}, Error: {e}")
+                await fail_fine_tune(fine_tune_name, str(e))
+            finally:
+                training_output_paths.discard(output_path)
                 
         
         # Add fine-tuning task to background
@@ -411,6 +1029,8 @@ async def create_fine_tune(request: FineTuneRequest, background_tasks: Backgroun
             meta=request.meta
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start fine-tuning: {str(e)}")
 
@@ -426,22 +1046,68 @@ async def list_fine_tunes():
     
     try:
         cursor = collection.find({}).sort("created_at", -1)  # Sort by newest first
-        fine_tunes = []
+        documents = []
         
         async for document in cursor:
             # Convert MongoDB ObjectId to string and remove it
             document.pop("_id", None)
-            fine_tunes.append(FineTuneRecord(**document))
+            documents.append(document)
+        
+        # Walk the fine-tune directories off the event loop
+        loop = asyncio.get_event_loop()
+        usages = await loop.run_in_executor(
+            None, collect_disk_usage, [document.get("output_path") for document in documents]
+        )
         
-        return fine_tunes
+        return [
+            FineTuneRecord(**document, disk_usage=usage)
+            for document, usage in zip(documents, usages)
+        ]
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list fine-tunes: {str(e)}")
 
 
+@app.post("/fine-tunes/gc")
+async def collect_fine_tune_garbage():
+    """
+    Reclaim disk space of fine-tunes that no longer have a record.
+
+    Removes fine-tune directories not referenced by any record (except those
+    still training), objects of the artifact store no longer linked and
+    snapshots of deleted fine-tunes.
+    """
+    if collection is None:
+        raise HTTPException(
+            status_code=503, 
+            detail="Database not available."
+        )
+    
+    try:
+        documents = [
+            document async for document in collection.find({}, {"output_path": 1, "fine_tune_name": 1})
+        ]
+        referenced_paths = [document["output_path"] for document in documents if document.get("output_path")]
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(
+            None, artifact_store.collect_garbage, referenced_paths, list(training_output_paths)
+        )
+        result["removed_snapshots"] = await loop.run_in_executor(
+            None, snapshots.collect_orphan_snapshots, [document["fine_tune_name"] for document in documents]
+        )
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to collect garbage: {str(e)}")
+
+
 @app.delete("/fine-tunes/{fine_tune_name}")
 async def delete_fine_tune(fine_tune_name: str):
-    """Delete a fine-tune record from the database."""
+    """
+    Delete a fine-tune record from the database and its files from disk.
+    
+    Files of a fine-tune still training in this process are left for the
+    next /fine-tunes/gc sweep.
+    """
     if collection is None:
         raise HTTPException(
             status_code=503, 
@@ -450,7 +1116,7 @@ async def delete_fine_tune(fine_tune_name: str):
     
     try:
         # Check if fine-tune exists
-        existing = await collection.find_one({"fine_tune_name": fine_tune_name})
+        existing = await find_fine_tune_record(fine_tune_name)
         if not existing:
             raise HTTPException(
                 status_code=404, 
@@ -459,11 +1125,25 @@ async def delete_fine_tune(fine_tune_name: str):
         
         # Delete the record
         result = await collection.delete_one({"fine_tune_name": fine_tune_name})
+        fine_tune_cache.invalidate(fine_tune_name)
+        # A queued job is not dispatched anymore, and a worker training it is
+        # refused when it reports back
+        job_queue.finish(fine_tune_name)
         
         if result.deleted_count == 1:
+            output_path = existing.get("output_path")
+            artifact_stats = None
+            if output_path and output_path not in training_output_paths:
+                loop = asyncio.get_event_loop()
+                artifact_stats = await loop.run_in_executor(
+                    None, artifact_store.delete_artifact, output_path
+                )
+                await loop.run_in_executor(None, snapshots.delete_fine_tune_snapshot, fine_tune_name)
+            
             return {
                 "message": f"Fine-tune '{fine_tune_name}' deleted successfully",
-                "deleted_count": result.deleted_count
+                "deleted_count": result.deleted_count,
+                "artifact_stats": artifact_stats
             }
         else:
             raise HTTPException(
@@ -487,7 +1167,7 @@ async def get_fine_tune(fine_tune_name: str):
         )
     
     try:
-        document = await collection.find_one({"fine_tune_name": fine_tune_name})
+        document = await find_fine_tune_record(fine_tune_name)
         if not document:
             raise HTTPException(
                 status_code=404, 
@@ -504,6 +1184,171 @@ async def get_fine_tune(fine_tune_name: str):
         raise HTTPException(status_code=500, detail=f"Failed to get fine-tune: {str(e)}")
 
 
+@app.get("/fine-tunes/{fine_tune_name}/artifact")
+async def download_fine_tune_artifact(fine_tune_name: str):
+    """Download the adapter directory of a completed fine-tune as a tar.gz archive."""
+    if collection is None:
+        raise HTTPException(
+            status_code=503, 
+            detail="Database not available."
+        )
+    
+    document = await find_fine_tune_record(fine_tune_name)
+    if not document or document.get("status") != "completed":
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Completed fine-tune '{fine_tune_name}' not found"
+        )
+    
+    output_path = document.get("output_path")
+    if not output_path or not os.path.isdir(output_path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Files of fine-tune '{fine_tune_name}' not found on disk"
+        )
+    
+    temp_dir = tempfile.mkdtemp()
+    loop = asyncio.get_event_loop()
+    archive_path = await loop.run_in_executor(
+        None, shutil.make_archive, os.path.join(temp_dir, fine_tune_name), "gztar", output_path
+    )
+    return FileResponse(
+        archive_path,
+        media_type="application/gzip",
+        filename=f"{fine_tune_name}.tar.gz",
+        background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+    )
+
+
+@app.post("/workers/register", response_model=WorkerRegisterResponse)
+async def register_worker(request: WorkerRegisterRequest):
+    """Register a remote training worker and its capacity."""
+    worker_id = job_queue.register_worker(
+        hostname=request.hostname,
+        capacity=request.capacity,
+        worker_id=request.worker_id,
+        info=request.info
+    )
+    print(f"🛰️ Training worker registered: {worker_id} (capacity {request.capacity})")
+    return WorkerRegisterResponse(
+        worker_id=worker_id,
+        heartbeat_interval=job_queue.heartbeat_timeout / 3
+    )
+
+
+@app.post("/workers/{worker_id}/heartbeat")
+async def worker_heartbeat(worker_id: str):
+    """Keep a training worker alive."""
+    if not job_queue.heartbeat(worker_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Worker '{worker_id}' is not registered"
+        )
+    return {"worker_id": worker_id, "status": "alive"}
+
+
+@app.post("/workers/{worker_id}/pull")
+async def pull_worker_job(worker_id: str):
+    """
+    Assign the next queued fine-tune job to a worker.
+    
+    Returns 204 if there is no job or the worker has no free capacity.
+    """
+    if worker_id not in job_queue.workers:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Worker '{worker_id}' is not registered"
+        )
+    
+    job = job_queue.pull(worker_id)
+    if job is None:
+        return Response(status_code=204)
+    
+    fine_tune_name = job["job_id"]
+    if collection is not None:
+        await update_fine_tune_record(
+            fine_tune_name,
+            {"$set": {"status": "training", "worker_id": worker_id, "updated_at": datetime.now()}}
+        )
+    print(f"🛰️ Fine-tune '{fine_tune_name}' dispatched to worker {worker_id}")
+    return job["payload"]
+
+
+@app.post("/workers/{worker_id}/jobs/{fine_tune_name}/status")
+async def report_worker_job_status(worker_id: str, fine_tune_name: str, request: WorkerJobStatusRequest):
+    """Receive a status update of a job from the worker running it."""
+    if not job_queue.owns(worker_id, fine_tune_name):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Fine-tune '{fine_tune_name}' is not assigned to worker '{worker_id}'"
+        )
+    job_queue.heartbeat(worker_id)
+    
+    if request.status == "failed":
+        job_queue.finish(fine_tune_name)
+        await fail_fine_tune(fine_tune_name, request.error or "Worker reported failure")
+    elif request.status == "training":
+        await update_fine_tune_record(
+            fine_tune_name,
+            {"$set": {"status": "training", "progress": request.message, "updated_at": datetime.now()}}
+        )
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid job status: {request.status}"
+        )
+    
+    return {"fine_tune_name": fine_tune_name, "status": request.status}
+
+
+@app.put("/workers/{worker_id}/jobs/{fine_tune_name}/artifact")
+async def upload_worker_job_artifact(worker_id: str, fine_tune_name: str, file: UploadFile = File(...)):
+    """
+    Receive the finished adapter directory of a job as a tar.gz archive.
+    
+    The archive is extracted into the central artifact location and the
+    fine-tune is finalized and marked completed.
+    """
+    if not job_queue.owns(worker_id, fine_tune_name):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Fine-tune '{fine_tune_name}' is not assigned to worker '{worker_id}'"
+        )
+    
+    job = job_queue.jobs[fine_tune_name]
+    training_settings = job["payload"]["training_settings"]
+    output_path = training_settings["output_dir"]
+    loop = asyncio.get_event_loop()
+    
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=False) as temp_file:
+            archive_path = temp_file.name
+            await loop.run_in_executor(None, shutil.copyfileobj, file.file, temp_file)
+        try:
+            await loop.run_in_executor(None, extract_artifact_archive, archive_path, output_path)
+        finally:
+            os.remove(archive_path)
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid artifact archive: {str(e)}")
+    
+    # The job is done either way; a record left in "training" would never finish
+    try:
+        await complete_fine_tune(fine_tune_name, output_path, training_settings["keep_checkpoints"])
+    except Exception as e:
+        await fail_fine_tune(fine_tune_name, f"Finalizing the uploaded artifact failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to finalize artifact: {str(e)}")
+    finally:
+        job_queue.finish(fine_tune_name)
+    
+    return {"fine_tune_name": fine_tune_name, "status": "completed"}
+
+
+@app.get("/workers")
+async def list_workers():
+    """List registered training workers, their jobs and the pending queue."""
+    return {"training_mode": TRAINING_MODE, **job_queue.snapshot()}
+
+
 @app.post("/start-vllm-server", response_model=VLLMServerResponse)
 async def start_vllm_server(request: VLLMServerStartRequest):
     """
@@ -515,7 +1360,7 @@ async def start_vllm_server(request: VLLMServerStartRequest):
     3. Starts the server with fixed host and port values
     4. Users cannot directly specify VLLM parameters - everything is derived from the fine-tune record
     """
-    global vllm_process, vllm_server_port, vllm_server_host, vllm_server_status
+    global vllm_process, vllm_server_port, vllm_server_host, vllm_server_status, vllm_base_model, vllm_start_request, vllm_log_tasks
     
     if collection is None:
         raise HTTPException(
@@ -523,6 +1368,12 @@ async def start_vllm_server(request: VLLMServerStartRequest):
             detail="Database not available. Cannot retrieve fine-tune records."
         )
     
+    if gpu_arbiter.suspension is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"VLLM server is suspended while fine-tune '{gpu_arbiter.suspension['suspended_for']}' trains. It is restored automatically when training finishes."
+        )
+    
     # Check if server is already running or starting
     update_vllm_server_status()
     if vllm_server_status in ["running", "starting"]:
@@ -535,7 +1386,7 @@ async def start_vllm_server(request: VLLMServerStartRequest):
     
     try:
         # Retrieve fine-tune record from database
-        fine_tune_record = await collection.find_one({"fine_tune_name": request.fine_tune_name})
+        fine_tune_record = await find_fine_tune_record(request.fine_tune_name)
         if not fine_tune_record:
             raise HTTPException(
                 status_code=404, 
@@ -571,40 +1422,72 @@ async def start_vllm_server(request: VLLMServerStartRequest):
         print(f"🎯 LoRA adapter path: {lora_adapter_path}")
         print(f"🌐 Server will run on: {vllm_server_host}:{vllm_server_port}")
         
+        speculative_config = None
+        if request.speculative_decoding:
+            try:
+                speculative_config = build_ngram_speculative_config(
+                    prompt_lookup_max=request.prompt_lookup_max,
+                    prompt_lookup_min=request.prompt_lookup_min,
+                    num_speculative_tokens=request.num_speculative_tokens
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            print(f"⚡ N-gram speculative decoding: {speculative_config}")
+        
+        # Serve the verified local copy of the base model under its original name
+        base_model_path = await resolve_base_model(base_model_name)
+        
         # Generate VLLM command using fixed host/port and fine-tune data
         cmd = generate_vllm_command(
-            model_name=base_model_name,
+            model_name=base_model_path,
             lora_adapter_path=lora_adapter_path,
             port=vllm_server_port,  # Use fixed port
             host=vllm_server_host,  # Use fixed host
-            additional_args=None  # No additional args allowed
+            additional_args=None,  # No additional args allowed
+            guided_decoding_backend=GUIDED_DECODING_BACKEND,
+            speculative_config=speculative_config,
+            served_model_name=base_model_name,
+            enable_sleep_mode=VLLM_SLEEP_MODE
         )
         
         print(f"🚀 Starting VLLM server with command: {' '.join(cmd)}")
-        print("📺 VLLM server output will be displayed in real time below:")
+        print("📺 VLLM server output will be displayed in real time below and at /vllm-server-logs:")
         print("-" * 60)
         
-        # Start VLLM server process with real-time output
-        vllm_process = subprocess.Popen(
-            cmd,
-            stdout=None,  # Allow stdout to be displayed in real time
-            stderr=None,  # Allow stderr to be displayed in real time
-            text=True
+        # Start VLLM server process, capturing its output into the log buffer
+        vllm_logs.append("api", f"Starting VLLM server for fine-tune '{request.fine_tune_name}': {' '.join(cmd)}")
+        vllm_process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_READ_LIMIT,
+            # The sleep and wake_up endpoints are only exposed in development mode
+            env={**os.environ, "VLLM_SERVER_DEV_MODE": "1"} if VLLM_SLEEP_MODE else None
         )
+        # Pumps of a previous server that exited on its own have ended at its EOF
+        await stop_vllm_log_pumps()
+        vllm_log_tasks = [
+            asyncio.create_task(pump_stream(vllm_process.stdout, "stdout", vllm_logs)),
+            asyncio.create_task(pump_stream(vllm_process.stderr, "stderr", vllm_logs)),
+        ]
         
         # Set status to starting immediately after command execution
         vllm_server_status = "starting"
+        model_cache.pin(base_model_name)
+        vllm_base_model = base_model_name
+        vllm_start_request = request
+        idle_scaler.notify_started()
         
         # Wait a moment for the process to initialize
         await asyncio.sleep(2)
         
         # Check if process started successfully (didn't die immediately)
-        if vllm_process.poll() is not None:
+        if not is_vllm_process_alive():
             # Process died immediately
             vllm_server_status = "error"
             exit_code = vllm_process.returncode
             vllm_process = None
-            raise RuntimeError(f"VLLM server failed to start. Process exited with code: {exit_code}. Check console output for details.")
+            raise RuntimeError(f"VLLM server failed to start. Process exited with code: {exit_code}. Check /vllm-server-logs for details.")
         
         server_url = f"http://{vllm_server_host}:{vllm_server_port}"
         
@@ -618,7 +1501,7 @@ async def start_vllm_server(request: VLLMServerStartRequest):
                 attempt += 1
                 
                 # Check if process is still running
-                if vllm_process and vllm_process.poll() is not None:
+                if vllm_process and not is_vllm_process_alive():
                     print(f"❌ VLLM server process died during startup")
                     vllm_server_status = "error"
                     return
@@ -659,6 +1542,7 @@ async def start_vllm_server(request: VLLMServerStartRequest):
                 pass
         
         vllm_server_status = "not_running"
+        release_vllm_base_model()
         raise HTTPException(status_code=500, detail=f"Failed to start VLLM server: {str(e)}")
 
 
@@ -669,7 +1553,13 @@ async def stop_vllm_server():
     """
     global vllm_process, vllm_server_status
     
-    if not vllm_process or vllm_process.poll() is not None:
+    # A server stopped by hand is not restored after the fine-tune that suspended it,
+    # nor started again by the next completion request
+    if gpu_arbiter.suspension is not None:
+        gpu_arbiter.suspension["served_fine_tune"] = None
+    idle_scaler.forget()
+    
+    if not is_vllm_process_alive():
         vllm_server_status = "not_running"
         return VLLMServerResponse(
             status="not_running",
@@ -679,20 +1569,17 @@ async def stop_vllm_server():
     try:
         print(f"🛑 Stopping VLLM server (PID: {vllm_process.pid})")
         
-        # Try graceful termination first
-        vllm_process.terminate()
-        
-        try:
-            vllm_process.wait(timeout=10)
+        # Try graceful termination first, force kill if it doesn't terminate in time
+        if await terminate_vllm_process():
             print("✅ VLLM server stopped gracefully")
-        except subprocess.TimeoutExpired:
-            # Force kill if it doesn't terminate gracefully
-            vllm_process.kill()
-            vllm_process.wait()
+        else:
             print("⚠️ VLLM server force killed")
+        await stop_vllm_log_pumps()
+        vllm_logs.append("api", f"VLLM server stopped with exit code {vllm_process.returncode}")
         
         vllm_process = None
         vllm_server_status = "not_running"
+        release_vllm_base_model()
         
         return VLLMServerResponse(
             status="stopped",
@@ -713,23 +1600,253 @@ async def get_vllm_server_status():
     # Update status based on current process and health check
     update_vllm_server_status()
     
-    server_url = f"http://{vllm_server_host}:{vllm_server_port}" if vllm_server_status != "not_running" else None
+    server_url = f"http://{vllm_server_host}:{vllm_server_port}" if vllm_server_status not in ["not_running", "scaled_to_zero"] else None
     
     status_messages = {
         "not_running": "VLLM server is not running",
         "starting": f"VLLM server is starting on {vllm_server_host}:{vllm_server_port}",
         "running": f"VLLM server is running on {vllm_server_host}:{vllm_server_port}",
-        "error": f"VLLM server encountered an error on {vllm_server_host}:{vllm_server_port}"
+        "error": f"VLLM server encountered an error on {vllm_server_host}:{vllm_server_port}",
+        "suspended": "VLLM server is suspended while a fine-tune uses the GPU",
+        "scaled_to_zero": "VLLM server was stopped while idle, the next completion request starts it again"
     }
     
     return VLLMServerResponse(
         status=vllm_server_status,
         message=status_messages.get(vllm_server_status, "Unknown status"),
         server_url=server_url,
-        pid=vllm_process.pid if vllm_process and vllm_process.poll() is None else None
+        pid=vllm_process.pid if is_vllm_process_alive() else None
     )
 
 
+@app.get("/vllm-server-logs")
+async def get_vllm_server_logs(
+    tail: int = Query(200, ge=0, le=VLLM_LOG_LINES, description="Number of newest lines to return"),
+    since: Optional[int] = Query(None, ge=0, description="Only return lines from this sequence number on"),
+    follow: bool = Query(False, description="Keep streaming new lines while the server runs")
+):
+    """
+    Get the captured stdout and stderr of the VLLM server.
+    
+    Without follow, returns the newest lines and the sequence number to pass
+    as since on the next poll. With follow, streams the lines as
+    newline-delimited JSON until the server process exits.
+    """
+    if not follow:
+        return {
+            "lines": vllm_logs.tail(tail, since),
+            "next_seq": vllm_logs.next_seq,
+            "status": vllm_server_status
+        }
+    
+    async def stream_lines():
+        start = since if since is not None else max(vllm_logs.next_seq - tail, 0)
+        async for entry in vllm_logs.follow(start, is_vllm_process_alive):
+            yield json.dumps(entry) + "\n"
+    
+    return StreamingResponse(stream_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/evaluate", response_model=EvaluationResponse)
+async def evaluate_inference(request: EvaluationRequest):
+    """
+    Evaluate an inference run against gold annotations.
+
+    Results are cached by (inference_job_id, gold_dataset_version) and a hash
+    of the submitted items, so repeated views of the same run do not rescore
+    every data point, while a changed prediction or gold annotation does.
+    """
+    from evaluation import evaluate
+
+    items_hash = hashlib.sha256(
+        json.dumps([item.dict() for item in request.items], sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    cache_key = (request.inference_job_id, request.gold_dataset_version, items_hash)
+    result = evaluation_cache.get(cache_key)
+    cached = result is not None
+
+    if cached:
+        evaluation_cache.move_to_end(cache_key)
+    else:
+        gold = [[annotation.dict() for annotation in item.gold] for item in request.items]
+        predicted = [[annotation.dict() for annotation in item.predicted] for item in request.items]
+
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(None, evaluate, gold, predicted)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        evaluation_cache[cache_key] = result
+        if len(evaluation_cache) > EVALUATION_CACHE_SIZE:
+            evaluation_cache.popitem(last=False)
+
+    response = {**result}
+    if not request.include_individual_scores:
+        response["individual_scores"] = None
+
+    return EvaluationResponse(
+        inference_job_id=request.inference_job_id,
+        gold_dataset_version=request.gold_dataset_version,
+        cached=cached,
+        **response
+    )
+
+
+def request_vllm_completion(payload: Dict[str, Any]) -> str:
+    """Send a completion request to the VLLM server and return the generated text."""
+    response = requests.post(
+        f"http://{vllm_server_host}:{vllm_server_port}/v1/completions",
+        json=payload,
+        timeout=300
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["text"]
+
+
+@app.post("/vllm/completions", response_model=VLLMCompletionResponse)
+async def create_vllm_completion(request: VLLMCompletionRequest):
+    """
+    Generate a completion with the running VLLM server.
+
+    If an output schema (or an output format to build it from) is given, the
+    generation is constrained to it with guided JSON decoding, so that the
+    output always parses into the output-format structure.
+
+    If the server was stopped while idle, it is started again and the
+    request is held until the server is ready.
+    """
+    try:
+        output_schema = request.output_schema
+        if output_schema is None and request.output_format is not None:
+            output_schema = build_output_schema(request.output_format, request.format_type)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid output format: {str(e)}")
+
+    if gpu_arbiter.suspension is not None:
+        raise HTTPException(status_code=503, detail="VLLM server is suspended while a fine-tune uses the GPU")
+
+    try:
+        async with idle_scaler.request():
+            return await generate_vllm_completion(request, output_schema)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=f"VLLM server was not ready within {idle_scaler.cold_start_timeout_seconds:.0f}s, check /vllm-server-logs"
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def generate_vllm_completion(request: VLLMCompletionRequest, output_schema: Optional[Dict[str, Any]]) -> VLLMCompletionResponse:
+    """Generate a completion with the ready VLLM server, regenerating unparseable outputs."""
+    payload = {
+        "model": "fine_tuned_adapter",
+        "prompt": request.prompt,
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+    }
+    if output_schema is not None:
+        payload["guided_json"] = output_schema
+
+    stats = completion_parse_stats["guided" if output_schema is not None else "unguided"]
+    stats["requests"] += 1
+
+    try:
+        loop = asyncio.get_event_loop()
+        text = await loop.run_in_executor(None, request_vllm_completion, payload)
+        retries = 0
+        retry_payload = {**payload, "temperature": retry_temperature(request.temperature)}
+        while try_parse_output(text) is None and retries < request.max_parse_retries:
+            retries += 1
+            stats["retries"] += 1
+            text = await loop.run_in_executor(None, request_vllm_completion, retry_payload)
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"VLLM server request failed: {str(e)}")
+
+    parse_ok = try_parse_output(text) is not None
+    if not parse_ok:
+        stats["parse_failures"] += 1
+
+    return VLLMCompletionResponse(
+        text=text,
+        parse_ok=parse_ok,
+        guided=output_schema is not None,
+        retries=retries
+    )
+
+
+@app.get("/vllm/parse-stats")
+async def get_vllm_parse_stats():
+    """Get parse-failure and retry rates of proxied completions, with and without guided decoding."""
+    return summarize_parse_stats(completion_parse_stats)
+
+
+@app.get("/fine-tune-cache")
+async def get_fine_tune_cache_stats():
+    """Report hit/miss statistics of the fine-tune record cache and whether the change stream is active."""
+    return {**fine_tune_cache.stats(), "change_stream_active": fine_tune_change_stream_active}
+
+
+@app.get("/vllm-server-idle")
+async def get_vllm_server_idle():
+    """
+    Report the scale-to-zero policy of the VLLM server.
+    
+    Returns the idle timeout, how long the server has been idle, the
+    fine-tune remembered after an idle stop, gaps between completion
+    requests and past cold starts with how long they took, to tune the
+    idle timeout.
+    """
+    return idle_scaler.report()
+
+
+@app.get("/gpu-arbiter")
+async def get_gpu_arbiter():
+    """
+    Report GPU sharing between the VLLM server and local fine-tunes.
+    
+    Returns the fine-tunes holding the GPU, the current suspension of the
+    server if any, and past pause windows with how long serving was paused
+    and how long the fine-tune waited for the GPU.
+    """
+    return gpu_arbiter.report()
+
+
+@app.get("/model-cache")
+async def get_model_cache():
+    """
+    Report the local base-model cache.
+    
+    Returns the cache size and disk budget, and for every model its size,
+    last use, whether it is pinned by a running fine-tune or server, and its
+    resolve/prefetch state.
+    """
+    return model_cache.report()
+
+
+@app.post("/model-cache/prefetch")
+async def prefetch_model(request: ModelPrefetchRequest):
+    """
+    Resolve a base model into the local cache and read its weights into the page cache.
+    
+    Returns once the files are verified; the page-cache read continues in the background.
+    """
+    try:
+        path = await asyncio.wrap_future(model_cache.ensure(request.model_name))
+    except (FileNotFoundError, RuntimeError) as e:
+        raise HTTPException(status_code=503, detail=f"Base model unavailable: {e}")
+    return {"model_name": request.model_name, "path": path}
+
+
+@app.post("/model-cache/evict")
+async def evict_model_cache():
+    """Evict least recently used base models until the cache fits its disk budget."""
+    loop = asyncio.get_event_loop()
+    evicted = await loop.run_in_executor(None, model_cache.evict)
+    return {"evicted": evicted, "total_bytes": model_cache.report()["total_bytes"]}
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
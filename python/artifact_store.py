@@ -0,0 +1,217 @@
+"""
+Artifact store for fine-tuned adapters.
+
+Every fine-tune writes its adapter, tokenizer files and checkpoints into its
+own directory under ARTIFACT_ROOT. Once a fine-tune finishes, its directory is
+finalized: old checkpoints are pruned down to the configured retention and
+every file is content-addressed into OBJECTS_DIR and hard-linked back, so
+identical files (tokenizers, copied parent checkpoints of resumed fine-tunes,
+...) are stored once on disk.
+
+Deleting a fine-tune removes its directory, and a garbage collection sweep
+removes objects no longer linked from any directory as well as directories
+no longer referenced by any record.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Dict, Any, Iterable, Optional, Set
+
+
+ARTIFACT_ROOT = "./fine_tuned_models"
+OBJECTS_DIR = os.path.join(ARTIFACT_ROOT, ".objects")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Summary of the training run written next to the adapter by fine_tune()
+TRAINING_SUMMARY_FILENAME = "training_summary.json"
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def load_training_summary(artifact_dir: str) -> Optional[Dict[str, Any]]:
+    """Load the training summary saved with an adapter, or None if there is none."""
+    path = os.path.join(artifact_dir, TRAINING_SUMMARY_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def list_checkpoints(artifact_dir: str) -> List[str]:
+    """List checkpoint directories of an artifact, oldest first."""
+    checkpoint_dirs = glob.glob(os.path.join(artifact_dir, "checkpoint-*"))
+    checkpoint_dirs.sort(key=lambda x: int(x.split("-")[-1]))
+    return checkpoint_dirs
+
+
+def prune_checkpoints(artifact_dir: str, keep: int, protected: Iterable[str] = ()) -> int:
+    """
+    Remove all but the newest checkpoints of an artifact.
+
+    Resuming from a fine-tune needs its best (or else newest) checkpoint, so
+    keep=0 without a best checkpoint makes the fine-tune impossible to resume
+    from. Checkpoints named in protected (e.g.
+    the best checkpoint of an early-stopped run) are always kept.
+
+    Returns:
+        Number of checkpoint directories removed
+    """
+    checkpoint_dirs = list_checkpoints(artifact_dir)
+    to_remove = checkpoint_dirs[:-keep] if keep > 0 else checkpoint_dirs
+    to_remove = [path for path in to_remove if os.path.basename(path) not in set(protected)]
+    for checkpoint_dir in to_remove:
+        shutil.rmtree(checkpoint_dir)
+    return len(to_remove)
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link source to destination, copying if hard links are unsupported."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def deduplicate_directory(artifact_dir: str) -> Dict[str, int]:
+    """
+    Content-address every file of a directory into the object store.
+
+    Files already backed by an object are replaced by a hard link to it, new
+    files become the object themselves.
+
+    Returns:
+        Dictionary with the number of files processed and bytes deduplicated
+    """
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    files = 0
+    deduplicated_bytes = 0
+
+    for dirpath, _, filenames in os.walk(artifact_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.islink(path):
+                continue
+            files += 1
+            object_path = os.path.join(OBJECTS_DIR, hash_file(path))
+
+            if not os.path.exists(object_path):
+                _link_or_copy(path, object_path)
+                continue
+            if os.path.samefile(path, object_path):
+                continue
+
+            # Replace the duplicate with a link to the stored object
+            deduplicated_bytes += os.path.getsize(path)
+            temporary_path = path + ".dedup"
+            _link_or_copy(object_path, temporary_path)
+            os.replace(temporary_path, path)
+
+    return {"files": files, "deduplicated_bytes": deduplicated_bytes}
+
+
+def finalize_artifact(artifact_dir: str, keep_checkpoints: int) -> Dict[str, int]:
+    """Prune checkpoints and deduplicate a successfully finished artifact."""
+    summary = load_training_summary(artifact_dir) or {}
+    best_checkpoint = summary.get("best_checkpoint")
+    removed_checkpoints = prune_checkpoints(
+        artifact_dir, keep_checkpoints, [best_checkpoint] if best_checkpoint else []
+    )
+    stats = deduplicate_directory(artifact_dir)
+    print(
+        f"🗄️ Finalized artifact {artifact_dir}: removed {removed_checkpoints} checkpoints, "
+        f"deduplicated {stats['deduplicated_bytes'] / 1024 ** 2:.1f} MiB"
+    )
+    return {"removed_checkpoints": removed_checkpoints, **stats}
+
+
+def object_inodes() -> Set[int]:
+    """Return the inode numbers of all stored objects."""
+    if not os.path.isdir(OBJECTS_DIR):
+        return set()
+    return {entry.inode() for entry in os.scandir(OBJECTS_DIR)}
+
+
+def disk_usage(artifact_dir: str, stored_inodes: Optional[Set[int]] = None) -> Dict[str, int]:
+    """
+    Report the disk usage of an artifact directory.
+
+    Args:
+        artifact_dir: Artifact directory
+        stored_inodes: Inodes of stored objects, computed if not given. Pass it
+            when reporting many artifacts to scan the object store once
+
+    Returns:
+        Dictionary with the apparent size of all files and the exclusive size,
+        i.e. the bytes that deleting this artifact would reclaim
+    """
+    if stored_inodes is None:
+        stored_inodes = object_inodes()
+
+    total_bytes = 0
+    exclusive_bytes = 0
+    for dirpath, _, filenames in os.walk(artifact_dir):
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirpath, filename))
+            total_bytes += stat.st_size
+            # The object store holds one extra link to every deduplicated file
+            other_links = stat.st_nlink - 1 - (1 if stat.st_ino in stored_inodes else 0)
+            if other_links <= 0:
+                exclusive_bytes += stat.st_size
+    return {"total_bytes": total_bytes, "exclusive_bytes": exclusive_bytes}
+
+
+def collect_orphan_objects() -> Dict[str, int]:
+    """Remove objects no longer linked from any artifact directory."""
+    removed_objects = 0
+    reclaimed_bytes = 0
+    if os.path.isdir(OBJECTS_DIR):
+        for entry in os.scandir(OBJECTS_DIR):
+            stat = entry.stat()
+            if stat.st_nlink <= 1:
+                os.remove(entry.path)
+                removed_objects += 1
+                reclaimed_bytes += stat.st_size
+    return {"removed_objects": removed_objects, "reclaimed_object_bytes": reclaimed_bytes}
+
+
+def delete_artifact(artifact_dir: str) -> Dict[str, int]:
+    """Physically delete an artifact directory and reclaim its unshared objects."""
+    if os.path.exists(artifact_dir):
+        shutil.rmtree(artifact_dir)
+    return collect_orphan_objects()
+
+
+def collect_garbage(referenced_dirs: Iterable[str], protected_dirs: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Sweep the artifact root for unreferenced directories and orphan objects.
+
+    Args:
+        referenced_dirs: Artifact directories still referenced by a record
+        protected_dirs: Directories in use (e.g. fine-tunes still training)
+
+    Returns:
+        Dictionary with the removed directories and the reclaimed objects
+    """
+    keep = {os.path.normpath(path) for path in list(referenced_dirs) + list(protected_dirs)}
+    keep.add(os.path.normpath(OBJECTS_DIR))
+    removed_dirs = []
+    if os.path.isdir(ARTIFACT_ROOT):
+        for entry in os.scandir(ARTIFACT_ROOT):
+            if not entry.is_dir():
+                continue
+            if os.path.normpath(entry.path) not in keep:
+                shutil.rmtree(entry.path)
+                removed_dirs.append(entry.path)
+
+    return {"removed_dirs": removed_dirs, **collect_orphan_objects()}
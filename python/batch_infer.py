@@ -0,0 +1,293 @@
+"""
+Sharded, resumable offline batch inference over a JSONL file.
+
+Streams the input file and assigns line i to shard i % N. Every shard runs in
+its own process (pinned to one GPU) with one vLLM engine and one pool of
+prompt-preparation workers, and appends its results to shard-<k>.jsonl.
+Shards sharing a GPU split its memory budget. After every batch, a checkpoint
+records how many of the shard's lines are done and the size of its output
+file, so a killed run started again with the same arguments resumes after the
+last completed batch. Once all shards are done, the outputs are merged back into input order
+and the aggregate throughput is printed.
+
+Each input line is a JSON object; the prompt is read from --input-field and
+all other fields are kept in the output.
+
+Usage:
+    python batch_infer.py --input data.jsonl --output-dir runs/overnight \\
+        --model-name unsloth/Qwen2.5-7B-Instruct --adapter-path ./fine_tuned_models/<name> \\
+        --gpus 0 1 --max-output-tokens 1000
+    python batch_infer.py --output-dir runs/overnight --merge-only
+"""
+
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import time
+from typing import List, Dict, Any, Iterator, Tuple
+
+
+RUN_FILENAME = "run.json"
+MERGED_FILENAME = "merged.jsonl"
+DEFAULT_CHECKPOINT_EVERY = 1000
+
+
+def shard_output_path(output_dir: str, shard: int) -> str:
+    return os.path.join(output_dir, f"shard-{shard}.jsonl")
+
+
+def shard_checkpoint_path(output_dir: str, shard: int) -> str:
+    return os.path.join(output_dir, f"shard-{shard}.checkpoint.json")
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]):
+    """Write a JSON file so that a crash leaves either the old or the new content."""
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(output_dir: str, shard: int) -> Dict[str, Any]:
+    """Load the checkpoint of a shard, or an empty one if it has not started."""
+    path = shard_checkpoint_path(output_dir, shard)
+    if not os.path.exists(path):
+        return {"lines_done": 0, "output_bytes": 0, "generated_tokens": 0,
+                "generation_seconds": 0.0, "wall_seconds": 0.0, "finished": False}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def iter_shard_lines(input_path: str, shard: int, num_shards: int, skip: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Stream (line index, record) of the lines assigned to a shard, skipping the first done ones."""
+    position = 0
+    with open(input_path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if index % num_shards != shard or not line.strip():
+                continue
+            if position >= skip:
+                yield index, json.loads(line)
+            position += 1
+
+
+def batched(iterator: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_shard(run: Dict[str, Any], shard: int, gpu: str, shards_on_gpu: int = 1):
+    """Run one shard in its own process, resuming from its checkpoint."""
+    started_at = time.time()
+    # Pin the process to its GPU before vLLM initializes CUDA
+    if gpu is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu
+    from inference import infer_with_report, load_lora_model, DEFAULT_GPU_MEMORY_UTILIZATION
+    from prompt_prep import PromptPreparer, DEFAULT_PREP_WORKERS
+
+    output_dir = run["output_dir"]
+    checkpoint = load_checkpoint(output_dir, shard)
+    if checkpoint["finished"]:
+        print(f"✅ Shard {shard} already finished")
+        return
+
+    # Drop results written after the last checkpoint, they are generated again
+    output_path = shard_output_path(output_dir, shard)
+    with open(output_path, "a") as f:
+        f.truncate(checkpoint["output_bytes"])
+    if checkpoint["lines_done"]:
+        print(f"🔄 Shard {shard} resuming after {checkpoint['lines_done']} lines")
+
+    settings = dict(run["inference_settings"])
+    # Engines sharing a GPU would each claim the full budget and fail to start
+    settings["gpu_memory_utilization"] = (
+        settings.get("gpu_memory_utilization", DEFAULT_GPU_MEMORY_UTILIZATION) / shards_on_gpu
+    )
+    model = load_lora_model(settings)
+    input_field = run["input_field"]
+    lines = iter_shard_lines(run["input_path"], shard, run["num_shards"], checkpoint["lines_done"])
+
+    # The workers start once per shard. Without an explicit chunk size, a batch
+    # is split across all of them, so later chunks are prepared while the
+    # first ones generate
+    prep_workers = settings.get("prep_workers", DEFAULT_PREP_WORKERS)
+    prep_chunk_size = settings.get("prep_chunk_size") or -(-run["checkpoint_every"] // max(prep_workers, 1))
+    preparer = PromptPreparer(settings["model_name"], prep_workers, prep_chunk_size)
+
+    with preparer, open(output_path, "a", encoding="utf-8") as output:
+        for batch in batched(lines, run["checkpoint_every"]):
+            data = [{"input": record[input_field]} for _, record in batch]
+            results, report = infer_with_report(data, settings, model, preparer)
+            for (index, record), result in zip(batch, results):
+                output.write(json.dumps({"index": index, **record, **result}, ensure_ascii=False) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+
+            checkpoint["lines_done"] += len(batch)
+            checkpoint["output_bytes"] = output.tell()
+            checkpoint["generated_tokens"] += report["generated_tokens"]
+            checkpoint["generation_seconds"] += report["generation_seconds"]
+            # Wall time of this invocation only, so downtime between resumes is not counted
+            now = time.time()
+            checkpoint["wall_seconds"] = checkpoint.get("wall_seconds", 0.0) + now - started_at
+            started_at = now
+            write_json_atomic(shard_checkpoint_path(output_dir, shard), checkpoint)
+            print(f"💾 Shard {shard}: {checkpoint['lines_done']} lines done, "
+                  f"{report['tokens_per_second']:.0f} tokens/s")
+
+    checkpoint["finished"] = True
+    write_json_atomic(shard_checkpoint_path(output_dir, shard), checkpoint)
+    print(f"✅ Shard {shard} finished")
+
+
+def merge_shards(output_dir: str) -> Dict[str, Any]:
+    """
+    Merge the shard outputs back into input order.
+
+    Every shard file is already sorted by line index, so a k-way merge
+    streams them without loading the results into memory.
+
+    Returns:
+        Aggregate statistics of the run
+    """
+    with open(os.path.join(output_dir, RUN_FILENAME), "r") as f:
+        run = json.load(f)
+
+    paths = [shard_output_path(output_dir, shard) for shard in range(run["num_shards"])]
+    files = [open(path, "r", encoding="utf-8") for path in paths if os.path.exists(path)]
+    merged_path = os.path.join(output_dir, MERGED_FILENAME)
+    items = 0
+    parse_failures = 0
+
+    def parse_lines(f):
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                yield result["index"], not result.get("parse_ok", True), line
+
+    try:
+        with open(merged_path + ".tmp", "w", encoding="utf-8") as merged:
+            for _, failed, line in heapq.merge(*(parse_lines(f) for f in files)):
+                merged.write(line)
+                items += 1
+                parse_failures += failed
+        os.replace(merged_path + ".tmp", merged_path)
+    finally:
+        for f in files:
+            f.close()
+
+    checkpoints = [load_checkpoint(output_dir, shard) for shard in range(run["num_shards"])]
+    generated_tokens = sum(checkpoint["generated_tokens"] for checkpoint in checkpoints)
+    # Shards run in parallel, so the slowest shard bounds the generation and wall time
+    generation_seconds = max((checkpoint["generation_seconds"] for checkpoint in checkpoints), default=0.0)
+    wall_seconds = max((checkpoint.get("wall_seconds", 0.0) for checkpoint in checkpoints), default=0.0)
+    return {
+        "merged_path": merged_path,
+        "items": items,
+        "parse_failures": parse_failures,
+        "unfinished_shards": [shard for shard, checkpoint in enumerate(checkpoints) if not checkpoint["finished"]],
+        "generated_tokens": generated_tokens,
+        "generation_seconds": generation_seconds,
+        "tokens_per_second": generated_tokens / generation_seconds if generation_seconds > 0 else 0.0,
+        "wall_seconds": wall_seconds,
+        "items_per_second": items / wall_seconds if wall_seconds > 0 else 0.0,
+    }
+
+
+def prepare_run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Create the run description, or load it when resuming into the same output directory."""
+    os.makedirs(args.output_dir, exist_ok=True)
+    run_path = os.path.join(args.output_dir, RUN_FILENAME)
+    gpus = args.gpus or [None]
+    num_shards = args.shards or len(gpus)
+
+    if os.path.exists(run_path):
+        with open(run_path, "r") as f:
+            run = json.load(f)
+        # Line-to-shard assignment depends on the shard count, so it must not change
+        if run["num_shards"] != num_shards or run["input_path"] != os.path.abspath(args.input):
+            raise SystemExit(f"❌ {args.output_dir} holds a run over {run['input_path']} with "
+                             f"{run['num_shards']} shards; use a new output directory")
+        print(f"🔄 Resuming run in {args.output_dir}")
+        run["gpus"] = gpus
+        return run
+
+    settings = {
+        "adapter_path": args.adapter_path,
+        "model_name": args.model_name,
+        "temperature": args.temperature,
+        "max_output_tokens": args.max_output_tokens,
+    }
+    if args.settings:
+        with open(args.settings, "r") as f:
+            settings.update(json.load(f))
+
+    run = {
+        "input_path": os.path.abspath(args.input),
+        "output_dir": args.output_dir,
+        "input_field": args.input_field,
+        "num_shards": num_shards,
+        "checkpoint_every": args.checkpoint_every,
+        "inference_settings": settings,
+        "started_at": time.time(),
+    }
+    write_json_atomic(run_path, run)
+    run["gpus"] = gpus
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL input file")
+    parser.add_argument("--output-dir", required=True, help="Directory of shard outputs, checkpoints and merged results")
+    parser.add_argument("--input-field", default="input", help="Field of each line holding the prompt")
+    parser.add_argument("--model-name", help="Base model name")
+    parser.add_argument("--adapter-path", help="Directory of the LoRA adapter")
+    parser.add_argument("--temperature", type=float, default=0.1)
+    parser.add_argument("--max-output-tokens", type=int, default=1000)
+    parser.add_argument("--settings", help="JSON file with further inference settings (see inference.infer_with_report)")
+    parser.add_argument("--gpus", nargs="+", help="GPU ids; shards are assigned to them round-robin")
+    parser.add_argument("--shards", type=int, help="Number of shards (default: one per GPU)")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="Lines generated between checkpoints")
+    parser.add_argument("--merge-only", action="store_true", help="Only merge existing shard outputs")
+    args = parser.parse_args()
+
+    if not args.merge_only:
+        if not (args.input and args.model_name and args.adapter_path):
+            parser.error("--input, --model-name and --adapter-path are required unless --merge-only")
+        run = prepare_run(args)
+
+        context = multiprocessing.get_context("spawn")
+        processes = []
+        shard_gpus = [run["gpus"][shard % len(run["gpus"])] for shard in range(run["num_shards"])]
+        for shard, gpu in enumerate(shard_gpus):
+            process = context.Process(target=run_shard, args=(run, shard, gpu, shard_gpus.count(gpu)),
+                                      name=f"shard-{shard}")
+            process.start()
+            processes.append(process)
+        for process in processes:
+            process.join()
+        failed = [process.name for process in processes if process.exitcode != 0]
+        if failed:
+            print(f"❌ Shards failed: {', '.join(failed)}. Run the same command again to resume.")
+
+    stats = merge_shards(args.output_dir)
+    print(f"📦 Merged {stats['items']} results into {stats['merged_path']}")
+    if stats["unfinished_shards"]:
+        print(f"⚠️ Unfinished shards: {stats['unfinished_shards']}, the merged output is partial")
+    print(f"📊 {stats['generated_tokens']} tokens in {stats['generation_seconds']:.1f}s of generation "
+          f"({stats['tokens_per_second']:.0f} tokens/s), {stats['items_per_second']:.1f} items/s over "
+          f"{stats['wall_seconds']:.0f}s wall time, {stats['parse_failures']} parse failures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark MinHash/LSH near-duplicate removal on synthetic boosted data.
+
+Synthetic rows mimic data boosting: a set of base annotation examples, each
+expanded into several variants with a few characters substituted. Every
+variant of a base example should land in the same cluster.
+
+Usage:
+    python benchmark_dedup.py --sizes 100000 300000 --threshold 0.8
+"""
+
+import argparse
+import json
+import random
+import time
+
+from dedup import deduplicate, DEFAULT_THRESHOLD, DEFAULT_NUM_PERM, DEFAULT_SHINGLE_SIZE
+
+
+SENSES = ["Vision", "Hearing", "Taste", "Smell", "Touch"]
+SENTIMENTS = ["Positive", "Negative", "Neutral"]
+ALPHABET = "abcdefghijklmnopqrstuvwxyz     "
+
+
+def synthetic_rows(size: int, variants: int, text_length: int, edits: int, seed: int = 0):
+    """Generate size rows made of size // variants base examples with edited variants."""
+    rng = random.Random(seed)
+    rows = []
+    bases = max(size // variants, 1)
+    for _ in range(bases):
+        text = "".join(rng.choice(ALPHABET) for _ in range(text_length))
+        stimulus = text[10:30]
+        output = json.dumps([{
+            "sense": rng.choice(SENSES),
+            "stimulus": stimulus,
+            "perception": text[30:45],
+            "sentiment": rng.choice(SENTIMENTS),
+        }])
+        for _ in range(variants):
+            chars = list(text)
+            for _ in range(edits):
+                chars[rng.randrange(text_length)] = rng.choice(ALPHABET)
+            rows.append({"input": "".join(chars), "output": output})
+    return rows[:size], bases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--variants", type=int, default=5, help="Variants generated per base example")
+    parser.add_argument("--text-length", type=int, default=300)
+    parser.add_argument("--edits", type=int, default=3, help="Characters substituted per variant")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--shingle-size", type=int, default=DEFAULT_SHINGLE_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'seconds':>8} {'rows/s':>10} {'kept':>9} {'expected':>9} {'clusters':>9}")
+    for size in args.sizes:
+        rows, bases = synthetic_rows(size, args.variants, args.text_length, args.edits)
+        start = time.perf_counter()
+        _, report = deduplicate(rows, args.threshold, args.num_perm, args.shingle_size)
+        seconds = time.perf_counter() - start
+        print(f"{size:>9} {seconds:>8.2f} {size / seconds:>10.0f} {report['kept_rows']:>9} "
+              f"{bases:>9} {len(report['clusters']):>9}")
+
+
+if __name__ == "__main__":
+    main()
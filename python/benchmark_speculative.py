@@ -0,0 +1,119 @@
+"""
+Benchmark n-gram speculative decoding against plain decoding on our data.
+
+Each configuration runs in its own process so the vLLM engine and its GPU
+memory are fully released between runs. The input file is JSONL with an
+'input' field per line (the same rows used for fine-tuning).
+
+Usage:
+    python benchmark_speculative.py --data data.jsonl --model-name Qwen/Qwen3-4B \
+        --adapter-path ./fine_tuned_models/<fine_tune_name>
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue as queue_module
+from typing import List, Dict, Any
+
+
+REPORT_POLL_SECONDS = 5
+
+
+def load_inputs(path: str, limit: int = None) -> List[Dict[str, str]]:
+    """Load input rows from a JSONL file."""
+    data = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data.append({"input": json.loads(line)["input"]})
+            if limit is not None and len(data) >= limit:
+                break
+    return data
+
+
+def _run_config(data: List[Dict[str, str]], settings: Dict[str, Any], queue: multiprocessing.Queue):
+    """Run one inference configuration and put its report on the queue."""
+    from inference import infer_with_report
+    _, report = infer_with_report(data, settings)
+    queue.put(report)
+
+
+def run_benchmark(data: List[Dict[str, str]], base_settings: Dict[str, Any],
+                  configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run every configuration in a fresh process and collect the reports."""
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for config in configs:
+        queue = context.Queue()
+        process = context.Process(target=_run_config, args=(data, {**base_settings, **config}, queue))
+        process.start()
+        report = None
+        # A child that crashed (OOM, engine init error) never puts a report
+        while report is None and (process.is_alive() or not queue.empty()):
+            try:
+                report = queue.get(timeout=REPORT_POLL_SECONDS)
+            except queue_module.Empty:
+                pass
+        process.join()
+        if report is None:
+            reports.append({"config": config, "error": f"exit code {process.exitcode}"})
+            continue
+        reports.append({"config": config, **report})
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="JSONL file with an 'input' field per line")
+    parser.add_argument("--model-name", required=True, help="Base model name")
+    parser.add_argument("--adapter-path", required=True, help="Path to the LoRA adapter")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of inputs")
+    parser.add_argument("--max-output-tokens", type=int, default=1000)
+    parser.add_argument("--ngram-windows", type=int, nargs="+", default=[2, 4], help="prompt_lookup_max values")
+    parser.add_argument("--lookaheads", type=int, nargs="+", default=[3, 5], help="num_speculative_tokens values")
+    parser.add_argument("--output", default=None, help="Optional JSON file to write the reports to")
+    args = parser.parse_args()
+
+    data = load_inputs(args.data, args.limit)
+    base_settings = {
+        "adapter_path": args.adapter_path,
+        "model_name": args.model_name,
+        "temperature": 0.0,
+        "max_output_tokens": args.max_output_tokens,
+    }
+    configs = [{"speculative_decoding": False}]
+    for window in args.ngram_windows:
+        for lookahead in args.lookaheads:
+            configs.append({
+                "speculative_decoding": True,
+                "prompt_lookup_max": window,
+                "prompt_lookup_min": 1,
+                "num_speculative_tokens": lookahead,
+            })
+
+    print(f"Benchmarking {len(configs)} configurations on {len(data)} inputs")
+    reports = run_benchmark(data, base_settings, configs)
+
+    baseline = reports[0].get("tokens_per_second")
+    print(f"{'config':<40} {'tokens/s':>10} {'speedup':>8} {'acceptance':>11}")
+    for report in reports:
+        config = report["config"]
+        name = ("plain" if not config["speculative_decoding"]
+                else f"ngram max={config['prompt_lookup_max']} k={config['num_speculative_tokens']}")
+        if "error" in report:
+            print(f"{name:<40} failed: {report['error']}")
+            continue
+        acceptance = report["speculative_acceptance"]
+        acceptance_text = f"{acceptance['acceptance_rate']:.2%}" if acceptance else "-"
+        speedup = report["tokens_per_second"] / baseline if baseline else 0.0
+        print(f"{name:<40} {report['tokens_per_second']:>10.1f} {speedup:>7.2f}x {acceptance_text:>11}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Benchmark the fine_tune() data pipeline and trainer settings on CPU.
+
+Runs the real fine_tune() flow end to end with the "cpu" backend on a tiny,
+randomly initialised Llama-style model and synthetic annotation data whose
+inputs vary in length like ours. The tokenizer is a small byte-level BPE
+trained on the synthetic data, so nothing is downloaded; pass --tokenizer to
+use the tokenizer of a real base model instead (more realistic token counts
+and padding).
+
+Each configuration of the grid (packing x batch size x dataset_num_proc x
+max_seq_length) runs in its own process, so peak RSS is measured per
+configuration. Reported are the training tokens per second, the share of
+padding in the training batches, the formatting/tokenization time and the
+peak RSS, all read from the training profile fine_tune() writes.
+
+Absolute numbers on CPU say nothing about GPU speed; compare configurations
+against each other.
+
+Usage:
+    python benchmark_training.py --rows 512 --batch-sizes 4 8 --packing off on \\
+        --dataset-num-proc 1 2 --max-seq-lengths 512 1024
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+from typing import List, Dict, Any
+
+
+SENSES = ["Vision", "Hearing", "Taste", "Smell", "Touch"]
+SENTIMENTS = ["Positive", "Negative", "Neutral"]
+WORDS = (
+    "the old market smelled of fresh bread and smoke while a street band played loud brass "
+    "music under warm yellow lights and cold rain hit the rough stone floor near a quiet "
+    "bitter coffee stand where soft velvet chairs felt pleasant and bright colours glowed"
+).split()
+
+SPECIAL_TOKENS = ["<|endoftext|>", "<|im_start|>", "<|im_end|>"]
+
+
+def synthetic_rows(size: int, min_words: int, max_words: int, seed: int = 0) -> List[Dict[str, str]]:
+    """Generate annotation-style rows with inputs of random length and one to three annotations."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(size):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+        annotations = []
+        for _ in range(rng.randint(1, 3)):
+            start = rng.randrange(max(len(words) - 4, 1))
+            annotations.append({
+                "sense": rng.choice(SENSES),
+                "stimulus": " ".join(words[start:start + 2]),
+                "perception": " ".join(words[start + 2:start + 4]),
+                "sentiment": rng.choice(SENTIMENTS),
+            })
+        rows.append({"input": " ".join(words), "output": json.dumps(annotations)})
+    return rows
+
+
+def build_tokenizer(rows: List[Dict[str, str]], vocab_size: int):
+    """Train a small byte-level BPE tokenizer with the ChatML special tokens on the rows."""
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders, trainers
+    from transformers import PreTrainedTokenizerFast
+    from fine_tune import CHATML_TEMPLATE
+
+    backend = Tokenizer(models.BPE())
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    backend.train_from_iterator((text for row in rows for text in (row["input"], row["output"])), trainer)
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        eos_token="<|im_end|>",
+        pad_token="<|endoftext|>",
+        additional_special_tokens=["<|im_start|>"],
+    )
+    tokenizer.chat_template = CHATML_TEMPLATE
+    return tokenizer
+
+
+def build_tiny_model(model_dir: str, rows: List[Dict[str, str]], args: argparse.Namespace):
+    """Save a randomly initialised Llama-style model and its tokenizer to model_dir."""
+    import torch
+    from transformers import AutoTokenizer, LlamaConfig, LlamaForCausalLM
+
+    if args.tokenizer:
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+    else:
+        tokenizer = build_tokenizer(rows, args.vocab_size)
+
+    torch.manual_seed(3407)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=args.hidden_size,
+        intermediate_size=args.hidden_size * 4,
+        num_hidden_layers=args.num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=max(args.max_seq_lengths),
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+    )
+    LlamaForCausalLM(config).save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+
+
+def _run_config(rows: List[Dict[str, str]], settings: Dict[str, Any]):
+    """Run fine_tune() for one configuration; it saves its profile to the output directory."""
+    from fine_tune import fine_tune
+    fine_tune(rows, settings)
+
+
+def run_benchmark(rows: List[Dict[str, str]], base_settings: Dict[str, Any],
+                  configs: List[Dict[str, Any]], work_dir: str) -> List[Dict[str, Any]]:
+    """Run every configuration in a fresh process and collect the results."""
+    from profiler import load_profile
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for index, config in enumerate(configs):
+        settings = {
+            **base_settings,
+            **config,
+            "accumulated_batch_size": config["batch_size"],
+            "output_dir": os.path.join(work_dir, f"run-{index}"),
+        }
+        process = context.Process(target=_run_config, args=(rows, settings))
+        process.start()
+        process.join()
+        profile = load_profile(settings["output_dir"])
+        if process.exitcode != 0 or profile is None:
+            results.append({"config": config, "error": f"exit code {process.exitcode}"})
+            continue
+        phases = {phase["name"]: phase for phase in profile["phases"]}
+        results.append({
+            "config": config,
+            "tokens_per_second": profile["throughput"]["tokens_per_second"],
+            "padding_ratio": profile["throughput"]["padding_ratio"],
+            "tokens": profile["throughput"]["tokens"],
+            "formatting_seconds": phases["formatting"]["seconds"],
+            "training_seconds": phases["training"]["seconds"],
+            "rss_peak_mb": profile["rss_peak_mb"],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=512, help="Synthetic training rows")
+    parser.add_argument("--min-words", type=int, default=10, help="Shortest synthetic input in words")
+    parser.add_argument("--max-words", type=int, default=200, help="Longest synthetic input in words")
+    parser.add_argument("--packing", nargs="+", choices=["off", "on"], default=["off", "on"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--dataset-num-proc", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--max-seq-lengths", type=int, nargs="+", default=[512])
+    parser.add_argument("--num-epochs", type=int, default=1)
+    parser.add_argument("--tokenizer", help="Use the tokenizer of this model instead of a synthetic one")
+    parser.add_argument("--vocab-size", type=int, default=2000, help="Vocabulary of the synthetic tokenizer")
+    parser.add_argument("--hidden-size", type=int, default=128, help="Hidden size of the tiny model")
+    parser.add_argument("--num-layers", type=int, default=2, help="Layers of the tiny model")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.min_words, args.max_words)
+    configs = [
+        {"packing": packing == "on", "batch_size": batch_size,
+         "dataset_num_proc": num_proc, "max_seq_length": max_seq_length}
+        for packing, batch_size, num_proc, max_seq_length in itertools.product(
+            args.packing, args.batch_sizes, args.dataset_num_proc, args.max_seq_lengths
+        )
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_training_") as work_dir:
+        model_dir = os.path.join(work_dir, "tiny_model")
+        build_tiny_model(model_dir, rows, args)
+        base_settings = {
+            "backend": "cpu",
+            "model_name": model_dir,
+            "num_epochs": args.num_epochs,
+            # Keep data loading in the training process, where the profiler measures RSS
+            "dataloader_num_workers": 0,
+        }
+        results = run_benchmark(rows, base_settings, configs, work_dir)
+
+    print(f"{'packing':>7} {'batch':>5} {'procs':>5} {'max_len':>7} {'tokens/s':>9} "
+          f"{'padding':>8} {'format_s':>8} {'train_s':>8} {'rss_mb':>7}")
+    for result in results:
+        config = result["config"]
+        prefix = (f"{'on' if config['packing'] else 'off':>7} {config['batch_size']:>5} "
+                  f"{config['dataset_num_proc']:>5} {config['max_seq_length']:>7}")
+        if "error" in result:
+            print(f"{prefix} failed: {result['error']}")
+            continue
+        print(f"{prefix} {result['tokens_per_second']:>9.0f} {result['padding_ratio']:>8.1%} "
+              f"{result['formatting_seconds']:>8.2f} {result['training_seconds']:>8.2f} {result['rss_peak_mb']:>7.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
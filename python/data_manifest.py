@@ -0,0 +1,83 @@
+"""
+Manifests of the training rows seen by a fine-tune.
+
+Each fine-tune stores the content hashes of every row it has seen (its own
+rows plus those of the fine-tune it was resumed from) next to its adapter. An
+incremental fine-tune compares the submitted rows against its parent's
+manifest and trains only on the new ones, optionally replaying a small sample
+of old rows to limit forgetting.
+"""
+
+import hashlib
+import json
+import os
+import random
+from typing import List, Dict, Set, Iterable, Tuple
+
+
+MANIFEST_FILENAME = "data_manifest.json"
+
+
+def row_hash(row: Dict[str, str]) -> str:
+    """Return the content hash of a training row."""
+    content = json.dumps([row["input"], row["output"]], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def save_manifest(artifact_dir: str, hashes: Iterable[str]):
+    """Save the row hashes seen by a fine-tune next to its adapter."""
+    # Write a new file instead of truncating, the old one may be a deduplicated hard link
+    path = os.path.join(artifact_dir, MANIFEST_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(sorted(set(hashes)), f)
+    os.replace(path + ".tmp", path)
+
+
+def load_manifest(artifact_dir: str) -> Set[str]:
+    """Load the row hashes seen by a fine-tune, empty if it has no manifest."""
+    path = os.path.join(artifact_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r") as f:
+        return set(json.load(f))
+
+
+def select_incremental_rows(
+    rows: List[Dict[str, str]], parent_hashes: Set[str],
+    replay_ratio: float = 0.0, seed: int = 3407
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Select the rows an incremental fine-tune trains on.
+
+    Args:
+        rows: All submitted training rows
+        parent_hashes: Row hashes in the parent fine-tune's manifest
+        replay_ratio: Old rows replayed per new row, sampled from the submitted
+            rows already seen by the parent
+        seed: Random seed of the replay sample
+
+    Returns:
+        Tuple of the rows to train on (new rows followed by replayed rows) and
+        statistics on how many rows were skipped versus trained
+    """
+    new_rows = []
+    old_rows = []
+    seen = set()
+    for row in rows:
+        digest = row_hash(row)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        (old_rows if digest in parent_hashes else new_rows).append(row)
+
+    replay_size = min(len(old_rows), round(replay_ratio * len(new_rows)))
+    replay_rows = random.Random(seed).sample(old_rows, replay_size)
+
+    stats = {
+        "submitted_rows": len(rows),
+        "new_rows": len(new_rows),
+        "replay_rows": replay_size,
+        "skipped_rows": len(rows) - len(new_rows) - replay_size,
+        "trained_rows": len(new_rows) + replay_size,
+    }
+    return new_rows + replay_rows, stats
@@ -0,0 +1,254 @@
+"""
+Near-duplicate removal of training data with MinHash and LSH.
+
+Data boosting produces many near-identical synthetic variants of the same
+example. This module estimates the Jaccard similarity of rows from MinHash
+signatures over character n-gram shingles and finds candidate pairs with
+locality-sensitive hashing (banding), so only rows sharing a band bucket are
+ever compared. Shingle hashing and one-permutation MinHash are vectorized
+over chunks of rows with numpy, which keeps hundreds of thousands of rows
+within seconds.
+"""
+
+import time
+from typing import List, Dict, Any, Tuple, Sequence
+
+import numpy as np
+
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 5
+
+# Number of characters shingled per signature chunk, bounds peak memory
+SHINGLE_CHUNK_SIZE = 1 << 22
+
+_ROLLING_BASE = np.uint64(1000003)
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Choose the LSH banding (bands, rows per band) for a similarity threshold.
+
+    The band count b and rows per band r (b * r <= num_perm) are chosen so that
+    the S-curve threshold (1 / b) ** (1 / r) is as close as possible to the
+    requested threshold.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def shingle_hashes(texts: Sequence[str], shingle_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the character n-gram shingles of all texts in one vectorized pass.
+
+    Args:
+        texts: Texts to shingle
+        shingle_size: Number of characters per shingle
+
+    Returns:
+        Tuple of the shingle hashes of all texts concatenated, and the offset
+        of the first shingle of every text. Texts shorter than shingle_size
+        yield a single shingle covering the whole text
+    """
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    text_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(texts) else np.zeros(0, np.int64)
+
+    # Every text contributes max(len - k + 1, 1) shingles
+    shingle_counts = np.maximum(lengths - shingle_size + 1, 1)
+    offsets = np.concatenate(([0], np.cumsum(shingle_counts)[:-1])) if len(texts) else np.zeros(0, np.int64)
+    total = int(shingle_counts.sum())
+
+    # Start position of every shingle in the concatenated code points
+    row_of_shingle = np.repeat(np.arange(len(texts)), shingle_counts)
+    positions = text_starts[row_of_shingle] + (np.arange(total) - offsets[row_of_shingle])
+
+    # Polynomial rolling hash over each shingle's characters
+    hashes = np.zeros(total, dtype=np.uint64)
+    padded = np.concatenate((codes, np.zeros(shingle_size, dtype=np.uint64)))
+    with np.errstate(over="ignore"):
+        for j in range(shingle_size):
+            hashes = hashes * _ROLLING_BASE + padded[positions + j]
+
+        # Texts shorter than a shingle hash only their own characters
+        for row in np.flatnonzero(lengths < shingle_size):
+            value = np.uint64(0)
+            for code in codes[text_starts[row]:text_starts[row] + lengths[row]]:
+                value = value * _ROLLING_BASE + code
+            hashes[offsets[row]] = value
+    return hashes, offsets
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer, spreading shingle hashes uniformly over 64 bits."""
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int, shingle_size: int,
+                       seed: int = 3407) -> np.ndarray:
+    """
+    Compute MinHash signatures of texts with one-permutation hashing.
+
+    Instead of evaluating num_perm hash functions on every shingle, each
+    shingle is hashed once: the high bits pick one of num_perm bins and the
+    low bits are its value, and every bin keeps its minimum. Empty bins are
+    filled by rotation densification from the next non-empty bin, which keeps
+    the collision probability of two signatures equal to their Jaccard
+    similarity while the cost stays linear in the number of shingles.
+
+    Returns:
+        Array of shape (rows, num_perm) with uint32 signature values
+    """
+    empty = np.uint32(0xFFFFFFFF)
+    seed_offset = _mix64(np.array([seed], dtype=np.uint64))[0]
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+
+    row_start = 0
+    while row_start < len(texts):
+        # Take whole rows until the chunk holds about SHINGLE_CHUNK_SIZE characters
+        row_end = row_start
+        chunk_chars = 0
+        while row_end < len(texts) and (row_end == row_start or chunk_chars < SHINGLE_CHUNK_SIZE):
+            chunk_chars += len(texts[row_end])
+            row_end += 1
+        rows = row_end - row_start
+
+        hashes, offsets = shingle_hashes(texts[row_start:row_end], shingle_size)
+        mixed = _mix64(hashes ^ seed_offset)
+        bins = ((mixed >> np.uint64(32)) % np.uint64(num_perm)).astype(np.int64)
+        values = (mixed & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        row_of_shingle = np.repeat(np.arange(rows), np.diff(np.append(offsets, len(hashes))))
+
+        chunk = np.full(rows * num_perm, empty, dtype=np.uint32)
+        np.minimum.at(chunk, row_of_shingle * num_perm + bins, values)
+        chunk = chunk.reshape(rows, num_perm)
+
+        # Rotation densification: an empty bin borrows the next non-empty bin
+        # (circularly) and adds a distance-dependent offset
+        doubled = np.concatenate((chunk, chunk), axis=1)
+        positions = np.where(doubled != empty, np.arange(2 * num_perm), 2 * num_perm)
+        next_filled = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+        distance = (next_filled - np.arange(num_perm)).astype(np.uint32)
+        with np.errstate(over="ignore"):
+            densified = np.take_along_axis(doubled, next_filled, axis=1) + distance * np.uint32(0x9E3779B1)
+        signatures[row_start:row_end] = np.where(chunk != empty, chunk, densified)
+        row_start = row_end
+    return signatures
+
+
+def _find(parents: List[int], i: int) -> int:
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def near_duplicate_clusters(signatures: np.ndarray, threshold: float) -> List[List[int]]:
+    """
+    Cluster rows whose estimated Jaccard similarity reaches the threshold.
+
+    Rows sharing a bucket in any LSH band are paired with the first row of
+    that bucket. A candidate pair is merged into one cluster if the two
+    signatures agree on at least threshold of their values.
+
+    Returns:
+        Clusters with more than one row, each a sorted list of row indices
+    """
+    rows, num_perm = signatures.shape
+    if rows < 2:
+        return []
+    bands, rows_per_band = optimal_bands(threshold, num_perm)
+    parents = list(range(rows))
+    # Random multipliers folding a band into one 64-bit bucket key; key collisions
+    # only add candidates, which are verified against the full signatures
+    multipliers = np.random.default_rng(0).integers(1, 2 ** 63, size=rows_per_band, dtype=np.uint64)
+
+    pairs = []
+    for band in range(bands):
+        band_values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            keys = (band_values * multipliers).sum(axis=1, dtype=np.uint64)
+        # Sort by bucket key so each bucket is a contiguous run, and pair every
+        # row with the first row of its bucket
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        is_first = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        first_of_bucket = order[np.maximum.accumulate(np.where(is_first, np.arange(rows), 0))]
+        candidates = ~is_first
+        pairs.append(np.stack((first_of_bucket[candidates], order[candidates]), axis=1))
+
+    # Drop pairs found in several bands before verifying them
+    pair_keys = np.unique(np.concatenate(pairs) @ np.array([rows, 1], dtype=np.int64))
+    candidate_pairs = np.stack((pair_keys // rows, pair_keys % rows), axis=1)
+    similarities = np.empty(len(candidate_pairs))
+    for start in range(0, len(candidate_pairs), 65536):
+        batch = candidate_pairs[start:start + 65536]
+        similarities[start:start + 65536] = (signatures[batch[:, 0]] == signatures[batch[:, 1]]).mean(axis=1)
+
+    for first, other in candidate_pairs[similarities >= threshold].tolist():
+        root_first, root_other = _find(parents, first), _find(parents, other)
+        if root_first != root_other:
+            parents[max(root_first, root_other)] = min(root_first, root_other)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(rows):
+        clusters.setdefault(_find(parents, i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def deduplicate(
+    rows: List[Dict[str, str]],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = DEFAULT_NUM_PERM,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    fields: Sequence[str] = ("input", "output"),
+    seed: int = 3407,
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """
+    Remove near-duplicate rows, keeping the first row of every cluster.
+
+    Args:
+        rows: Training rows
+        threshold: Estimated Jaccard similarity above which rows are duplicates
+        num_perm: Number of MinHash permutations
+        shingle_size: Number of characters per shingle
+        fields: Row fields concatenated into the compared text
+        seed: Random seed of the permutations
+
+    Returns:
+        Tuple of the kept rows in their original order, and a report with the
+        number of removed rows and the removed clusters
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError(f"Similarity threshold must be in (0, 1]: {threshold}")
+
+    start = time.perf_counter()
+    texts = ["\n".join(row[field] for field in fields) for row in rows]
+    signatures = minhash_signatures(texts, num_perm, shingle_size, seed)
+    clusters = near_duplicate_clusters(signatures, threshold)
+
+    removed = {i for members in clusters for i in members[1:]}
+    kept_rows = [row for i, row in enumerate(rows) if i not in removed]
+    report = {
+        "input_rows": len(rows),
+        "kept_rows": len(kept_rows),
+        "removed_rows": len(removed),
+        "threshold": threshold,
+        "num_perm": num_perm,
+        "shingle_size": shingle_size,
+        "seconds": time.perf_counter() - start,
+        "clusters": [
+            {"kept_index": members[0], "removed_indices": members[1:], "size": len(members)}
+            for members in sorted(clusters, key=len, reverse=True)
+        ],
+    }
+    return kept_rows, report
@@ -0,0 +1,128 @@
+"""
+Evaluation module for scoring inference results against gold annotations.
+
+An annotation is identified by its (sense, stimulus, perception, sentiment)
+tuple. Each data point is scored with hashed multiset matching: gold and
+predicted tuples are counted with a Counter and the true positives are the
+size of the multiset intersection. This replaces the O(n*m) nested matching
+loop of the client-side implementation while producing identical counts.
+"""
+
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Iterable
+
+
+ANNOTATION_FIELDS = ("sense", "stimulus", "perception", "sentiment")
+SENSES = ["Vision", "Hearing", "Taste", "Smell", "Touch"]
+SENTIMENTS = ["Positive", "Negative", "Neutral"]
+
+
+def annotation_key(annotation: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """Return the hashable tuple used to match two annotations."""
+    return tuple(annotation.get(field) for field in ANNOTATION_FIELDS)
+
+
+def precision_recall_f1(tp: int, fp: int, fn: int) -> Dict[str, float]:
+    """Calculate precision, recall and F1 score from raw counts."""
+    precision = tp / (tp + fp) if tp + fp > 0 else 0.0
+    recall = tp / (tp + fn) if tp + fn > 0 else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def _breakdown(
+    counts: Dict[str, List[int]], labels: Iterable[str]
+) -> Tuple[Dict[str, Dict[str, Any]], float]:
+    """Build a per-label breakdown and the macro F1 across the given labels."""
+    breakdown = {}
+    for label in labels:
+        tp, fp, fn = counts.get(label, [0, 0, 0])
+        breakdown[str(label)] = {
+            **precision_recall_f1(tp, fp, fn),
+            "true_positives": tp,
+            "false_positives": fp,
+            "false_negatives": fn,
+            "support": tp + fn,
+        }
+
+    # Labels that never appear in gold nor predictions do not count towards macro F1
+    present = [label for label, stats in breakdown.items()
+               if stats["support"] > 0 or stats["false_positives"] > 0]
+    macro_f1 = sum(breakdown[label]["f1"] for label in present) / len(present) if present else 0.0
+    return breakdown, macro_f1
+
+
+def evaluate(
+    gold: List[List[Dict[str, Any]]], predicted: List[List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Score a whole inference run against gold annotations in a single pass.
+
+    Args:
+        gold: Gold annotations, one list of annotation dicts per data point
+        predicted: Predicted annotations, aligned with ``gold``
+
+    Returns:
+        Dictionary with micro precision/recall/F1, macro F1 over senses and
+        sentiments, per-sense and per-sentiment breakdowns, and the individual
+        scores of every data point
+    """
+    if len(gold) != len(predicted):
+        raise ValueError(
+            f"Gold and predicted lengths differ: {len(gold)} != {len(predicted)}"
+        )
+
+    total_tp = total_fp = total_fn = 0
+    sense_counts: Dict[str, List[int]] = {}
+    sentiment_counts: Dict[str, List[int]] = {}
+    individual_scores = []
+
+    for index, (gold_annotations, predicted_annotations) in enumerate(zip(gold, predicted)):
+        gold_counter = Counter(annotation_key(a) for a in gold_annotations)
+        predicted_counter = Counter(annotation_key(a) for a in predicted_annotations)
+        matched = gold_counter & predicted_counter
+
+        tp = sum(matched.values())
+        fp = sum(predicted_counter.values()) - tp
+        fn = sum(gold_counter.values()) - tp
+        total_tp += tp
+        total_fp += fp
+        total_fn += fn
+
+        # Attribute every matched/unmatched tuple to its sense and sentiment
+        for key, count in matched.items():
+            sense_counts.setdefault(key[0], [0, 0, 0])[0] += count
+            sentiment_counts.setdefault(key[3], [0, 0, 0])[0] += count
+        for key, count in (predicted_counter - matched).items():
+            sense_counts.setdefault(key[0], [0, 0, 0])[1] += count
+            sentiment_counts.setdefault(key[3], [0, 0, 0])[1] += count
+        for key, count in (gold_counter - matched).items():
+            sense_counts.setdefault(key[0], [0, 0, 0])[2] += count
+            sentiment_counts.setdefault(key[3], [0, 0, 0])[2] += count
+
+        individual_scores.append({
+            "data_index": index,
+            **precision_recall_f1(tp, fp, fn),
+            "true_positives": tp,
+            "false_positives": fp,
+            "false_negatives": fn,
+        })
+
+    # Keep unexpected labels (e.g. malformed model output) visible in the breakdown
+    sense_labels = SENSES + sorted((s for s in sense_counts if s not in SENSES), key=str)
+    sentiment_labels = SENTIMENTS + sorted((s for s in sentiment_counts if s not in SENTIMENTS), key=str)
+    per_sense, macro_f1_sense = _breakdown(sense_counts, sense_labels)
+    per_sentiment, macro_f1_sentiment = _breakdown(sentiment_counts, sentiment_labels)
+
+    return {
+        **precision_recall_f1(total_tp, total_fp, total_fn),
+        "total_true_positives": total_tp,
+        "total_false_positives": total_fp,
+        "total_false_negatives": total_fn,
+        "macro_f1_sense": macro_f1_sense,
+        "macro_f1_sentiment": macro_f1_sentiment,
+        "per_sense": per_sense,
+        "per_sentiment": per_sentiment,
+        "data_size": len(gold),
+        "individual_scores": individual_scores,
+    }
@@ -4,25 +4,58 @@ import shutil
 import json
 import glob
 import torch
-from typing import List, Dict, Any
-from unsloth import FastLanguageModel
-from unsloth.chat_templates import get_chat_template
+from typing import List, Dict, Any, Optional
+
+# unsloth patches transformers and trl, so it must be imported first. It
+# requires a GPU; without one only the "cpu" backend is available.
+try:
+    from unsloth import FastLanguageModel
+    from unsloth.chat_templates import get_chat_template
+except (ImportError, NotImplementedError, RuntimeError):
+    FastLanguageModel = None
+
 from datasets import Dataset
 from trl import SFTTrainer
-from transformers import TrainingArguments
+from transformers import TrainingArguments, EarlyStoppingCallback
+
+from length_budget import compute_length_stats, save_length_stats
+from validation_split import split_validation_rows
+from artifact_store import TRAINING_SUMMARY_FILENAME
+from profiler import PhaseProfiler, TokenCounter, save_profile, CPU_PROFILE_FILENAME
+
+
+LORA_TARGET_MODULES = ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
+
+# Same format as get_chat_template(tokenizer, chat_template="chatml") of unsloth
+CHATML_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ '<|im_start|>' + message['role'] + '\\n' + message['content'] + '<|im_end|>' + '\\n' }}"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|im_start|>assistant\\n' }}{% endif %}"
+)
 
 
 def resume_from_existing_model(
     resume_from_dir: str, output_dir: str, train_batch_size: int
-):
+) -> str:
     """
     Resume from an existing fine-tuned model by copying the model directory
     and resetting the trainer state for fresh training.
 
+    Training continues from the checkpoint holding the weights that are
+    served: the best checkpoint of a run with a validation set (the newest
+    one holds the weights trained after it), otherwise the newest.
+
     Args:
         resume_from_dir: Directory containing the existing fine-tuned model
         output_dir: Directory where the resumed training will be saved
         train_batch_size: Batch size to set in the trainer state
+
+    Returns:
+        Path of the checkpoint to resume from
+
+    Raises:
+        FileNotFoundError: If the fine-tune kept no checkpoints
     """
     # Copy contents from resume_from_dir to output_dir
     if os.path.exists(output_dir):
@@ -30,31 +63,40 @@ def resume_from_existing_model(
     shutil.copytree(resume_from_dir, output_dir)
     print(f"Copied model from {resume_from_dir} to {output_dir}")
 
-    # Find the newest checkpoint folder
+    # Find the checkpoint folders
     checkpoint_pattern = os.path.join(output_dir, "checkpoint-*")
     checkpoint_dirs = glob.glob(checkpoint_pattern)
 
     if not checkpoint_dirs:
-        print("Warning: No checkpoint directories found")
-        return
+        raise FileNotFoundError(
+            f"{resume_from_dir} has no checkpoints to resume from (it was kept with keep_checkpoints=0)"
+        )
 
-    # Sort by checkpoint number to get the newest one
+    # Sort by checkpoint number, the newest one is resumed unless there is a best one
     checkpoint_dirs.sort(key=lambda x: int(x.split("-")[-1]))
-    newest_checkpoint = checkpoint_dirs[-1]
-    print(f"Found newest checkpoint: {os.path.basename(newest_checkpoint)}")
+    resume_checkpoint = checkpoint_dirs[-1]
+
+    # The served adapter is the best checkpoint's, recorded in the training summary
+    summary_path = os.path.join(output_dir, TRAINING_SUMMARY_FILENAME)
+    if os.path.exists(summary_path):
+        with open(summary_path, "r") as f:
+            best_checkpoint = json.load(f).get("best_checkpoint")
+        if best_checkpoint and os.path.isdir(os.path.join(output_dir, best_checkpoint)):
+            resume_checkpoint = os.path.join(output_dir, best_checkpoint)
+    print(f"Resuming from checkpoint: {os.path.basename(resume_checkpoint)}")
 
     # Remove scheduler.pt file if it exists
-    scheduler_path = os.path.join(newest_checkpoint, "scheduler.pt")
+    scheduler_path = os.path.join(resume_checkpoint, "scheduler.pt")
     if os.path.exists(scheduler_path):
         os.remove(scheduler_path)
-        print(f"Removed scheduler.pt from {os.path.basename(newest_checkpoint)}")
+        print(f"Removed scheduler.pt from {os.path.basename(resume_checkpoint)}")
 
-    # Edit trainer_state.json in the newest checkpoint
-    trainer_state_path = os.path.join(newest_checkpoint, "trainer_state.json")
+    # Edit trainer_state.json in the resumed checkpoint
+    trainer_state_path = os.path.join(resume_checkpoint, "trainer_state.json")
 
     if not os.path.exists(trainer_state_path):
-        print(f"Warning: trainer_state.json not found in {newest_checkpoint}")
-        return
+        print(f"Warning: trainer_state.json not found in {resume_checkpoint}")
+        return resume_checkpoint
 
     # Read the existing trainer state
     with open(trainer_state_path, "r") as f:
@@ -65,54 +107,79 @@ def resume_from_existing_model(
     trainer_state["global_step"] = 0
     trainer_state["train_batch_size"] = train_batch_size
 
+    # Forget the previous run's evaluations, so its best checkpoint is not
+    # kept over (or compared against) the checkpoints of the new data
+    trainer_state["best_metric"] = None
+    trainer_state["best_model_checkpoint"] = None
+    trainer_state["log_history"] = []
+
     # Write back the modified trainer state
     with open(trainer_state_path, "w") as f:
         json.dump(trainer_state, f, indent=2)
 
     print(
-        f"Reset trainer state: epoch=0, global_step=0, train_batch_size={train_batch_size}"
+        f"Reset trainer state: epoch=0, global_step=0, train_batch_size={train_batch_size}, "
+        f"best checkpoint and log history cleared"
     )
+    return resume_checkpoint
 
 
-def fine_tune(training_data: List[Dict[str, str]], training_settings: Dict[str, Any]):
-    # Extract settings
-    model_name = training_settings["model_name"]
-    num_epochs = training_settings["num_epochs"]
-    batch_size = training_settings["batch_size"]
-    accumulated_batch_size = training_settings["accumulated_batch_size"]
-    output_dir = training_settings["output_dir"]
-
-    max_seq_length = training_settings.get("max_seq_length", 2048)
-    learning_rate = training_settings.get("learning_rate", 2e-4)
+def load_model(model_path: str, max_seq_length: int, backend: str):
+    """
+    Load the base model and its tokenizer.
 
-    resume_from_dir = training_settings.get("resume_from_dir", None)
-    resume_from_checkpoint = resume_from_dir is not None
+    Args:
+        model_path: Model name or local model directory
+        max_seq_length: Longest training sequence
+        backend: "unsloth" loads the model 4-bit quantized with the unsloth
+            kernels on the GPU; "cpu" loads it in full precision with plain
+            transformers, for benchmarking the training flow without a GPU
 
-    # If resuming from checkpoint, prepare the environment
-    if resume_from_checkpoint:
-        resume_from_existing_model(resume_from_dir, output_dir, batch_size)
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    if backend == "cpu":
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32)
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        return model, tokenizer
 
-    # Load model and tokenizer with 4-bit quantization
-    model, tokenizer = FastLanguageModel.from_pretrained(
-        model_name=model_name,
+    if FastLanguageModel is None:
+        raise RuntimeError("unsloth is not available (it requires a GPU); use the 'cpu' backend")
+    return FastLanguageModel.from_pretrained(
+        model_name=model_path,
         max_seq_length=max_seq_length,
         dtype=None,  # Auto-detect dtype
         load_in_4bit=True,
     )
 
+
+def apply_lora(model, tokenizer, backend: str):
+    """
+    Wrap the model with LoRA adapters and make sure the tokenizer has a chat template.
+
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    if backend == "cpu":
+        from peft import LoraConfig, get_peft_model
+        model = get_peft_model(model, LoraConfig(
+            r=16,
+            lora_alpha=16,
+            lora_dropout=0,
+            bias="none",
+            target_modules=LORA_TARGET_MODULES,
+            task_type="CAUSAL_LM",
+        ))
+        if tokenizer.chat_template is None:
+            tokenizer.chat_template = CHATML_TEMPLATE
+        return model, tokenizer
+
     # Apply LoRA to the non-lora model
     model = FastLanguageModel.get_peft_model(
         model,
         r=16,  # LoRA rank
-        target_modules=[
-            "q_proj",
-            "k_proj",
-            "v_proj",
-            "o_proj",
-            "gate_proj",
-            "up_proj",
-            "down_proj",
-        ],
+        target_modules=LORA_TARGET_MODULES,
         lora_alpha=16,
         lora_dropout=0,  # Supports any, but = 0 is optimized
         bias="none",  # Supports any, but = "none" is optimized
@@ -127,82 +194,262 @@ def fine_tune(training_data: List[Dict[str, str]], training_settings: Dict[str,
             tokenizer,
             chat_template="chatml", # Do not use qwen2.5 template, since it would add the unnecessary system message. The chatml is the same foramt as qwen2.5 but without the system message.
         )
+    return model, tokenizer
 
-    # Format training data for chat template
-    def formatting_prompts_func(examples):
-        convos = []
-        for input_text, output_text in zip(examples["input"], examples["output"]):
-            convo = [
-                {"role": "user", "content": input_text},
-                {"role": "assistant", "content": output_text},
-            ]
-            convos.append(convo)
-
-        texts = [
-            tokenizer.apply_chat_template(
-                convo, tokenize=False, add_generation_prompt=False
-            )
-            for convo in convos
-        ]
-        return {"text": texts}
-
-    # Create dataset
-    dataset_dict = {
-        "input": [item["input"] for item in training_data],
-        "output": [item["output"] for item in training_data],
+
+def record_base_model_name(output_dir: str, model_name: str):
+    """
+    Point the saved adapter configs at the base model name instead of the
+    local model cache directory it was trained from, so the adapter stays
+    loadable on hosts with another cache layout.
+    """
+    paths = glob.glob(os.path.join(output_dir, "adapter_config.json")) + \
+        glob.glob(os.path.join(output_dir, "checkpoint-*", "adapter_config.json"))
+    for path in paths:
+        with open(path, "r") as f:
+            adapter_config = json.load(f)
+        adapter_config["base_model_name_or_path"] = model_name
+        with open(path, "w") as f:
+            json.dump(adapter_config, f, indent=2)
+
+
+def build_training_summary(trainer, num_epochs: int, has_eval: bool) -> Dict[str, Any]:
+    """
+    Summarize a finished training run from the trainer state.
+
+    Args:
+        trainer: Trainer after train() returned
+        num_epochs: Number of epochs the run was configured for
+        has_eval: Whether the run was evaluated on a validation set
+
+    Returns:
+        Dictionary with the epochs trained and saved, whether the run stopped
+        early, the best checkpoint and the eval loss curve
+    """
+    state = trainer.state
+    epochs_trained = state.epoch or 0
+    eval_curve = [
+        {"epoch": log["epoch"], "step": log["step"], "eval_loss": log["eval_loss"]}
+        for log in state.log_history if "eval_loss" in log
+    ]
+    return {
+        "num_epochs": num_epochs,
+        "epochs_trained": epochs_trained,
+        "epochs_saved": max(num_epochs - epochs_trained, 0),
+        "early_stopped": has_eval and epochs_trained < num_epochs,
+        "global_step": state.global_step,
+        "best_eval_loss": state.best_metric if has_eval else None,
+        "best_checkpoint": os.path.basename(state.best_model_checkpoint) if state.best_model_checkpoint else None,
+        "eval_curve": eval_curve,
     }
-    dataset = Dataset.from_dict(dataset_dict)
-    dataset = dataset.map(formatting_prompts_func, batched=True)
-
-    # Training arguments
-    training_args = TrainingArguments(
-        per_device_train_batch_size=batch_size,
-        gradient_accumulation_steps=accumulated_batch_size // batch_size,
-        warmup_steps=5,
-        num_train_epochs=num_epochs,
-        learning_rate=learning_rate,
-        fp16=not torch.cuda.is_bf16_supported(),
-        bf16=torch.cuda.is_bf16_supported(),
-        logging_steps=1,
-        optim="adamw_8bit",
-        weight_decay=0.01,
-        lr_scheduler_type="cosine",
-        seed=3407,
-        output_dir=output_dir,
-        save_strategy="epoch",
-        save_steps=500,
-        save_total_limit=2,
-        dataloader_num_workers=2,
-        remove_unused_columns=False,
-    )
 
-    # Create trainer
-    trainer = SFTTrainer(
-        model=model,
-        tokenizer=tokenizer,
-        train_dataset=dataset,
-        dataset_text_field="text",
-        max_seq_length=max_seq_length,
-        dataset_num_proc=2,
-        packing=False,  # Can make training 5x faster for short sequences
-        args=training_args,
+
+def fine_tune(training_data: List[Dict[str, str]], training_settings: Dict[str, Any],
+              eval_data: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    Fine-tune a model with LoRA and save the adapter to the output directory.
+
+    A validation set is taken from eval_data if given, otherwise split off the
+    training data by validation_fraction. With a validation set, the model is
+    evaluated every epoch (or every eval_steps), training stops early once the
+    eval loss has not improved by early_stopping_min_delta for
+    early_stopping_patience evaluations, and the best checkpoint is kept.
+
+    Every phase (load, PEFT setup, formatting/tokenization, training, save,
+    cleanup) is timed and its peak memory recorded in training_profile.json,
+    together with the training throughput in tokens per second and the share
+    of padding in the training batches. With profile_cpu, the CPU-side phases
+    are also dumped with cProfile.
+
+    The backend setting selects "unsloth" (default, GPU) or "cpu", which runs
+    the same flow with plain transformers/peft and a full-precision optimizer
+    (see benchmark_training.py).
+
+    Returns:
+        Training summary, also saved as training_summary.json in the output directory
+    """
+    # Extract settings
+    model_name = training_settings["model_name"]
+    # Verified local copy of the base model, resolved by the model cache
+    model_path = training_settings.get("model_path", model_name)
+    num_epochs = training_settings["num_epochs"]
+    batch_size = training_settings["batch_size"]
+    accumulated_batch_size = training_settings["accumulated_batch_size"]
+    output_dir = training_settings["output_dir"]
+
+    max_seq_length = training_settings.get("max_seq_length", 2048)
+    learning_rate = training_settings.get("learning_rate", 2e-4)
+
+    backend = training_settings.get("backend", "unsloth")
+    packing = training_settings.get("packing", False)
+    dataset_num_proc = training_settings.get("dataset_num_proc", 2)
+    dataloader_num_workers = training_settings.get("dataloader_num_workers", 2)
+
+    validation_fraction = training_settings.get("validation_fraction", 0.0)
+    eval_steps = training_settings.get("eval_steps", None)
+    early_stopping_patience = training_settings.get("early_stopping_patience", 3)
+    early_stopping_min_delta = training_settings.get("early_stopping_min_delta", 0.0)
+
+    resume_from_dir = training_settings.get("resume_from_dir", None)
+    resume_from_checkpoint = None
+
+    profiler = PhaseProfiler(cpu_profile=training_settings.get("profile_cpu", False))
+
+    with profiler.phase("load"):
+        # If resuming from checkpoint, prepare the environment
+        if resume_from_dir is not None:
+            resume_from_checkpoint = resume_from_existing_model(resume_from_dir, output_dir, batch_size)
+
+        # Load model and tokenizer (4-bit quantized with the unsloth backend)
+        model, tokenizer = load_model(model_path, max_seq_length, backend)
+
+    with profiler.phase("peft_setup"):
+        model, tokenizer = apply_lora(model, tokenizer, backend)
+
+    with profiler.phase("formatting"):
+        # Format training data for chat template
+        def formatting_prompts_func(examples):
+            convos = []
+            for input_text, output_text in zip(examples["input"], examples["output"]):
+                convo = [
+                    {"role": "user", "content": input_text},
+                    {"role": "assistant", "content": output_text},
+                ]
+                convos.append(convo)
+
+            texts = [
+                tokenizer.apply_chat_template(
+                    convo, tokenize=False, add_generation_prompt=False
+                )
+                for convo in convos
+            ]
+            return {"text": texts}
+
+        # Validation rows from a split of the training data, unless given explicitly
+        if not eval_data:
+            training_data, eval_data = split_validation_rows(training_data, validation_fraction)
+
+        # Create dataset
+        dataset_dict = {
+            "input": [item["input"] for item in training_data],
+            "output": [item["output"] for item in training_data],
+        }
+        dataset = Dataset.from_dict(dataset_dict)
+        dataset = dataset.map(formatting_prompts_func, batched=True)
+
+        eval_dataset = None
+        if eval_data:
+            eval_dataset = Dataset.from_dict({
+                "input": [item["input"] for item in eval_data],
+                "output": [item["output"] for item in eval_data],
+            }).map(formatting_prompts_func, batched=True)
+        has_eval = eval_dataset is not None and len(eval_dataset) > 0
+        if has_eval:
+            print(f"📏 Validation set: {len(eval_dataset)} rows, training set: {len(dataset)} rows")
+
+        # Evaluate and checkpoint on the same schedule, so the best checkpoint can be kept
+        schedule = "steps" if eval_steps else "epoch"
+
+        # Training arguments
+        on_gpu = backend != "cpu"
+        training_args = TrainingArguments(
+            per_device_train_batch_size=batch_size,
+            gradient_accumulation_steps=accumulated_batch_size // batch_size,
+            warmup_steps=5,
+            num_train_epochs=num_epochs,
+            learning_rate=learning_rate,
+            fp16=on_gpu and not torch.cuda.is_bf16_supported(),
+            bf16=on_gpu and torch.cuda.is_bf16_supported(),
+            use_cpu=not on_gpu,
+            logging_steps=1,
+            # The 8-bit optimizer of bitsandbytes needs a GPU
+            optim="adamw_8bit" if on_gpu else "adamw_torch",
+            weight_decay=0.01,
+            lr_scheduler_type="cosine",
+            seed=3407,
+            output_dir=output_dir,
+            save_strategy=schedule if has_eval else "epoch",
+            save_steps=eval_steps or 500,
+            save_total_limit=2,
+            eval_strategy=schedule if has_eval else "no",
+            eval_steps=eval_steps,
+            per_device_eval_batch_size=batch_size * 2,
+            load_best_model_at_end=has_eval,
+            metric_for_best_model="eval_loss" if has_eval else None,
+            greater_is_better=False if has_eval else None,
+            dataloader_num_workers=dataloader_num_workers,
+            remove_unused_columns=False,
+        )
+
+        # Create trainer
+        trainer = SFTTrainer(
+            model=model,
+            tokenizer=tokenizer,
+            train_dataset=dataset,
+            eval_dataset=eval_dataset if has_eval else None,
+            dataset_text_field="text",
+            max_seq_length=max_seq_length,
+            dataset_num_proc=dataset_num_proc,
+            packing=packing,  # Can make training 5x faster for short sequences
+            args=training_args,
+            callbacks=[
+                EarlyStoppingCallback(
+                    early_stopping_patience=early_stopping_patience,
+                    early_stopping_threshold=early_stopping_min_delta,
+                )
+            ] if has_eval else None,
+        )
+
+    # GPU-bound, so it is kept out of the cProfile dump
+    token_counter = TokenCounter()
+    token_counter.attach(trainer.model)
+    with profiler.phase("training", cpu=False):
+        trainer.train(resume_from_checkpoint=resume_from_checkpoint)
+    token_counter.detach()
+
+    with profiler.phase("save"):
+        # Save the trained LoRA adapter (save_model already writes the PEFT adapter,
+        # which is the best checkpoint when a validation set was used)
+        trainer.save_model(output_dir)
+        tokenizer.save_pretrained(output_dir)
+        if model_path != model_name:
+            record_base_model_name(output_dir, model_name)
+
+        summary = build_training_summary(trainer, num_epochs, has_eval)
+        with open(os.path.join(output_dir, TRAINING_SUMMARY_FILENAME), "w") as f:
+            json.dump(summary, f, indent=2)
+        if summary["early_stopped"]:
+            print(f"⏹️ Stopped early after {summary['epochs_trained']:.2f}/{num_epochs} epochs, "
+                  f"best eval loss {summary['best_eval_loss']:.4f}")
+
+        # Save output/input length statistics used for per-item inference budgets
+        input_lengths = [len(ids) for ids in tokenizer(dataset_dict["input"], add_special_tokens=False)["input_ids"]]
+        output_lengths = [len(ids) for ids in tokenizer(dataset_dict["output"], add_special_tokens=False)["input_ids"]]
+        save_length_stats(output_dir, compute_length_stats(input_lengths, output_lengths))
+
+    with profiler.phase("cleanup"):
+        # Clean up VRAM before returning
+        print("Releasing VRAM...")
+        del model
+        del tokenizer
+        del trainer
+        del dataset
+        del eval_dataset
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.synchronize()
+        print("✅ VRAM cleanup completed")
+
+    profile = profiler.report(
+        os.path.join(output_dir, CPU_PROFILE_FILENAME) if training_settings.get("profile_cpu") else None
     )
+    training_seconds = next(phase["seconds"] for phase in profile["phases"] if phase["name"] == "training")
+    profile["throughput"] = token_counter.report(training_seconds)
+    save_profile(output_dir, profile)
+    print(f"⏱️ Total {profile['total_seconds']:.1f}s, slowest phase: {profile['slowest_phase']}")
+    if profile["throughput"]["tokens_per_second"] is not None:
+        print(f"🚄 {profile['throughput']['tokens_per_second']:.0f} tokens/s, "
+              f"{profile['throughput']['padding_ratio']:.1%} padding")
 
-    trainer.train(resume_from_checkpoint=resume_from_checkpoint)
-
-    # Save the trained model and LoRA adapter
-    trainer.save_model(output_dir)
-    tokenizer.save_pretrained(output_dir)
-    model.save_pretrained(output_dir)
-
-    # Clean up VRAM before returning
-    print("Releasing VRAM...")
-    del model
-    del tokenizer
-    del trainer
-    del dataset
-    gc.collect()
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
-    print("✅ VRAM cleanup completed")
+    return summary
@@ -0,0 +1,172 @@
+"""
+GPU arbitration between the vLLM server and local fine-tunes.
+
+The vLLM server reserves a fixed share of GPU memory, so a fine-tune started
+on the same GPU either runs out of memory or requires serving to be stopped
+by hand. The GPUArbiter is asked for the GPU before every fine-tune. If the
+free memory is short of the training budget, it puts the server to sleep
+(vLLM sleep mode releases weights and KV cache) or, if sleeping is not
+supported or not enough, stops it, remembering which fine-tune was served.
+When the last fine-tune finishes, the server is woken up or restarted.
+
+The server is driven through a controller with these async methods, which
+a fake can implement to exercise the arbitration without a GPU:
+    is_running() -> bool
+    served_fine_tune() -> Optional[str]
+    supports_sleep() -> bool
+    sleep(), wake_up(), stop()
+    start(fine_tune_name)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+
+TRAINING_GPU_MEMORY_BYTES = int(float(os.getenv("TRAINING_GPU_MEMORY_GB", "16")) * 1024 ** 3)
+MAX_PAUSE_WINDOWS = 50
+
+
+def cuda_free_bytes() -> Optional[int]:
+    """Return the free memory of the current CUDA device, or None if unknown."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    if not torch.cuda.is_available():
+        return None
+    free, _ = torch.cuda.mem_get_info()
+    return free
+
+
+class GPUArbiter:
+    """Suspends the vLLM server while fine-tunes need its GPU memory."""
+
+    def __init__(self, server, free_memory: Callable[[], Optional[int]] = cuda_free_bytes,
+                 training_memory_bytes: int = TRAINING_GPU_MEMORY_BYTES,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            server: Controller of the vLLM server (see the module docstring)
+            free_memory: Returns the free GPU memory in bytes, None if unknown
+                (unknown is treated as short while the server runs)
+            training_memory_bytes: GPU memory a fine-tune needs
+            clock: Time source, replaceable in tests
+        """
+        self.server = server
+        self.free_memory = free_memory
+        self.training_memory_bytes = training_memory_bytes
+        self.clock = clock
+        self.lock = asyncio.Lock()
+        self.active_trainings: Dict[str, float] = {}
+        self.suspension: Optional[Dict[str, Any]] = None
+        self.pause_windows = deque(maxlen=MAX_PAUSE_WINDOWS)
+
+    def _memory_short(self) -> bool:
+        free = self.free_memory()
+        return free is None or free < self.training_memory_bytes
+
+    async def acquire(self, fine_tune_name: str) -> Dict[str, Any]:
+        """
+        Make the GPU available to a fine-tune, suspending the server if needed.
+
+        Returns:
+            Dictionary with the seconds the fine-tune waited for the GPU, and
+            how the server was suspended (None if it kept running)
+        """
+        requested_at = self.clock()
+        async with self.lock:
+            # Every fine-tune needs its own budget, so memory is checked again
+            # even while others train next to the server
+            if self.suspension is None and await self.server.is_running() and self._memory_short():
+                await self._suspend(fine_tune_name)
+            self.active_trainings[fine_tune_name] = self.clock()
+            wait_seconds = self.clock() - requested_at
+            if self.suspension is not None and self.suspension["suspended_for"] == fine_tune_name:
+                self.suspension["training_wait_seconds"] = wait_seconds
+            return {
+                "training_wait_seconds": wait_seconds,
+                "serving_suspension": self.suspension["mode"] if self.suspension else None,
+                "served_fine_tune": self.suspension["served_fine_tune"] if self.suspension else None,
+            }
+
+    async def _suspend(self, fine_tune_name: str):
+        served = self.server.served_fine_tune()
+        free_before = self.free_memory()
+        mode = None
+        if self.server.supports_sleep():
+            try:
+                await self.server.sleep()
+                mode = "sleep"
+            except Exception as e:
+                print(f"⚠️ Failed to put VLLM server to sleep, stopping it instead: {e}")
+            if mode == "sleep" and self._memory_short():
+                print("⚠️ Sleeping VLLM server did not free enough GPU memory, stopping it")
+                mode = None
+        if mode is None:
+            await self.server.stop()
+            mode = "stop"
+
+        self.suspension = {
+            "served_fine_tune": served,
+            "mode": mode,
+            "suspended_for": fine_tune_name,
+            "suspended_at": self.clock(),
+            "free_bytes_before": free_before,
+            "free_bytes_after": self.free_memory(),
+            "training_wait_seconds": None,
+        }
+        print(f"⏸️ VLLM server ({served}) suspended by {mode} for fine-tune {fine_tune_name}")
+
+    async def release(self, fine_tune_name: str):
+        """Return the GPU of a finished fine-tune, restoring the server after the last one."""
+        async with self.lock:
+            self.active_trainings.pop(fine_tune_name, None)
+            if self.active_trainings or self.suspension is None:
+                return
+            suspension = self.suspension
+            self.suspension = None
+
+            restore_error = None
+            try:
+                if suspension["served_fine_tune"] is None:
+                    # The server was stopped by hand meanwhile, there is nothing to restore
+                    await self.server.stop()
+                elif suspension["mode"] == "sleep":
+                    try:
+                        await self.server.wake_up()
+                    except Exception as e:
+                        print(f"⚠️ Failed to wake up VLLM server, restarting it: {e}")
+                        await self.server.stop()
+                        await self.server.start(suspension["served_fine_tune"])
+                else:
+                    await self.server.start(suspension["served_fine_tune"])
+            except Exception as e:
+                restore_error = str(e)
+                print(f"❌ Failed to restore VLLM server ({suspension['served_fine_tune']}): {e}")
+
+            resumed_at = self.clock()
+            self.pause_windows.append({
+                **suspension,
+                "resumed_at": resumed_at,
+                "serving_paused_seconds": resumed_at - suspension["suspended_at"],
+                "restore_error": restore_error,
+            })
+            if restore_error is None and suspension["served_fine_tune"] is not None:
+                print(f"▶️ VLLM server ({suspension['served_fine_tune']}) restored after "
+                      f"{resumed_at - suspension['suspended_at']:.0f}s")
+
+    def report(self) -> Dict[str, Any]:
+        """Return the active fine-tunes, the current suspension and past pause windows."""
+        now = self.clock()
+        current = None
+        if self.suspension is not None:
+            current = {**self.suspension, "serving_paused_seconds": now - self.suspension["suspended_at"]}
+        return {
+            "training_memory_bytes": self.training_memory_bytes,
+            "active_trainings": list(self.active_trainings),
+            "suspension": current,
+            "pause_windows": list(self.pause_windows),
+        }
@@ -0,0 +1,300 @@
+"""
+Scale-to-zero policy for the vLLM server.
+
+A running vLLM server holds its share of GPU memory whether or not requests
+arrive. The IdleScaler stops the server once no request has been served for
+VLLM_IDLE_TIMEOUT_SECONDS and remembers which fine-tune it served. The next
+inference request through the API starts it again and is held until the
+server is ready, for at most VLLM_COLD_START_TIMEOUT_SECONDS. Concurrent
+requests arriving during a cold start share it.
+
+Activity is read from the server's own Prometheus metrics (requests running,
+waiting and finished), so requests sent to the server directly, like those
+of the client, keep it alive as well. If the metrics cannot be read, the
+server is never stopped. Only requests through the API are held during a
+cold start; direct requests fail until the server is started again.
+
+Gaps between requests and cold-start durations are recorded, so the idle
+timeout can be tuned against how long requests wait after scaling to zero.
+
+The server is driven through a controller with these async methods (see
+gpu_arbiter for the others the same controller implements):
+    is_running() -> bool
+    is_ready() -> bool
+    metrics() -> Optional[str]  (Prometheus text, None if unavailable)
+    served_fine_tune() -> Optional[str]
+    start(fine_tune_name), stop()
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Callable
+
+
+VLLM_IDLE_TIMEOUT_SECONDS = float(os.getenv("VLLM_IDLE_TIMEOUT_SECONDS", "1800"))
+VLLM_COLD_START_TIMEOUT_SECONDS = float(os.getenv("VLLM_COLD_START_TIMEOUT_SECONDS", "300"))
+IDLE_CHECK_INTERVAL_SECONDS = 15
+READY_POLL_SECONDS = 2
+MAX_RECORDED_GAPS = 1000
+MAX_RECORDED_COLD_STARTS = 50
+
+# Gauges of requests in progress and the counter of finished requests
+IN_PROGRESS_METRICS = ("vllm:num_requests_running", "vllm:num_requests_waiting", "vllm:num_requests_swapped")
+FINISHED_METRIC = "vllm:request_success_total"
+
+
+def parse_request_activity(metrics_text: str) -> Dict[str, float]:
+    """
+    Sum the request gauges and counters of a vLLM metrics page.
+
+    Returns:
+        Dictionary with the requests in progress and the requests finished
+        since the server started
+    """
+    activity = {"in_progress": 0.0, "finished": 0.0}
+    for line in metrics_text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, rest = line.partition("{")
+        if rest:
+            rest = rest.rpartition("}")[2]
+        else:
+            name, _, rest = line.partition(" ")
+        if name in IN_PROGRESS_METRICS:
+            activity["in_progress"] += float(rest.split()[0])
+        elif name == FINISHED_METRIC:
+            activity["finished"] += float(rest.split()[0])
+    return activity
+
+
+class IdleScaler:
+    """Stops the vLLM server when idle and starts it again on demand."""
+
+    def __init__(self, server, idle_timeout_seconds: float = VLLM_IDLE_TIMEOUT_SECONDS,
+                 cold_start_timeout_seconds: float = VLLM_COLD_START_TIMEOUT_SECONDS,
+                 start_blocked: Callable[[], Optional[str]] = lambda: None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            server: Controller of the vLLM server (see the module docstring)
+            idle_timeout_seconds: Idle time after which the server is stopped,
+                0 disables scaling to zero
+            cold_start_timeout_seconds: Longest time a request is held while
+                the server starts
+            start_blocked: Returns why the server must not be started right
+                now (e.g. a fine-tune holds the GPU), None if it may be
+            clock: Time source, replaceable in tests
+        """
+        self.server = server
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.cold_start_timeout_seconds = cold_start_timeout_seconds
+        self.start_blocked = start_blocked
+        self.clock = clock
+        self.in_flight = 0
+        self.last_activity = clock()
+        self.scaled_down: Optional[Dict[str, Any]] = None
+        self.cold_start_task: Optional[asyncio.Task] = None
+        self.idle_gaps = deque(maxlen=MAX_RECORDED_GAPS)
+        self.cold_starts = deque(maxlen=MAX_RECORDED_COLD_STARTS)
+        self.idle_stops = 0
+        self.held_requests = 0
+        self.cold_start_timeouts = 0
+        self.finished_requests: Optional[float] = None
+        self.proxied_since_check = False
+        self.active_at_last_check = False
+
+    def notify_started(self):
+        """Restart the idle timer after the server was started."""
+        self.last_activity = self.clock()
+        self.scaled_down = None
+        # Counters start again from zero
+        self.finished_requests = None
+
+    def forget(self):
+        """Drop the remembered fine-tune, e.g. after the server was stopped by hand."""
+        self.scaled_down = None
+
+    @asynccontextmanager
+    async def request(self):
+        """
+        Hold an inference request until the server is ready, and keep it
+        from being stopped while the request runs.
+
+        Raises:
+            RuntimeError: If no server is running and none can be started
+            asyncio.TimeoutError: If the server is not ready in time
+        """
+        if self.in_flight == 0:
+            self.idle_gaps.append(self.clock() - self.last_activity)
+        self.in_flight += 1
+        try:
+            await self.ensure_ready()
+            yield
+        finally:
+            self.in_flight -= 1
+            self.last_activity = self.clock()
+            self.proxied_since_check = True
+
+    async def ensure_ready(self) -> Optional[float]:
+        """
+        Wait until the server is ready, starting it if it was scaled to zero.
+
+        Returns:
+            Seconds the caller was held, None if the server was already ready
+        """
+        if self.cold_start_task is None and await self.server.is_running() and await self.server.is_ready():
+            return None
+
+        held_at = self.clock()
+        self.held_requests += 1
+        if self.cold_start_task is None and not await self.server.is_running():
+            if self.scaled_down is None:
+                raise RuntimeError("VLLM server is not running")
+            reason = self.start_blocked()
+            if reason:
+                raise RuntimeError(f"VLLM server cannot be started: {reason}")
+            self.cold_start_task = asyncio.create_task(self._cold_start(self.scaled_down))
+            # Waiters that timed out no longer retrieve a failure
+            self.cold_start_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        try:
+            if self.cold_start_task is not None:
+                # Every waiter gives up after the timeout, the start itself carries on
+                await asyncio.wait_for(asyncio.shield(self.cold_start_task), self.cold_start_timeout_seconds)
+            else:
+                # Started by hand and still loading
+                await asyncio.wait_for(self._wait_ready(), self.cold_start_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.cold_start_timeouts += 1
+            raise
+        return self.clock() - held_at
+
+    async def _cold_start(self, scaled_down: Dict[str, Any]):
+        fine_tune_name = scaled_down["fine_tune_name"]
+        started_at = self.clock()
+        cold_start = {
+            "fine_tune_name": fine_tune_name,
+            "started_at": started_at,
+            "idle_before_seconds": started_at - scaled_down["stopped_at"],
+            "ready_seconds": None,
+            "error": None,
+        }
+        self.cold_starts.append(cold_start)
+        print(f"🥶 Cold-starting VLLM server ({fine_tune_name}) for a held request")
+        try:
+            await self.server.start(fine_tune_name)
+            await asyncio.wait_for(self._wait_ready(), self.cold_start_timeout_seconds)
+        except Exception as e:
+            cold_start["error"] = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            # Keep the fine-tune so the next request tries again
+            if not await self.server.is_running():
+                self.scaled_down = scaled_down
+            print(f"❌ Cold start of VLLM server ({fine_tune_name}) failed: {cold_start['error']}")
+            raise
+        finally:
+            self.cold_start_task = None
+        cold_start["ready_seconds"] = self.clock() - started_at
+        self.last_activity = self.clock()
+        print(f"✅ VLLM server ({fine_tune_name}) ready after a {cold_start['ready_seconds']:.0f}s cold start")
+
+    async def _wait_ready(self):
+        while not await self.server.is_ready():
+            if not await self.server.is_running():
+                raise RuntimeError("VLLM server exited while starting, check /vllm-server-logs")
+            await asyncio.sleep(READY_POLL_SECONDS)
+
+    async def observe_activity(self) -> bool:
+        """
+        Restart the idle timer if the server's metrics show requests since the last check.
+
+        Returns:
+            False if the metrics could not be read
+        """
+        metrics_text = await self.server.metrics()
+        if metrics_text is None:
+            return False
+        activity = parse_request_activity(metrics_text)
+        finished_changed = self.finished_requests is not None and activity["finished"] != self.finished_requests
+        active = finished_changed or activity["in_progress"] > 0
+        if active:
+            # A burst of requests sent directly to the server starts; those
+            # through the API recorded their gap already
+            if not (self.active_at_last_check or self.proxied_since_check or self.in_flight):
+                self.idle_gaps.append(self.clock() - self.last_activity)
+            self.last_activity = self.clock()
+        self.finished_requests = activity["finished"]
+        self.proxied_since_check = False
+        self.active_at_last_check = active
+        return True
+
+    async def check_idle(self) -> bool:
+        """
+        Stop the server if it has been idle for longer than the timeout.
+
+        Returns:
+            True if the server was stopped
+        """
+        if self.idle_timeout_seconds <= 0 or self.in_flight or self.cold_start_task is not None:
+            return False
+        if not await self.server.is_running():
+            return False
+        if not await self.observe_activity():
+            # Without metrics, direct requests to the server would go unnoticed
+            return False
+        idle_seconds = self.clock() - self.last_activity
+        if idle_seconds < self.idle_timeout_seconds:
+            return False
+        fine_tune_name = self.server.served_fine_tune()
+        if fine_tune_name is None:
+            return False
+
+        await self.server.stop()
+        self.scaled_down = {"fine_tune_name": fine_tune_name, "stopped_at": self.clock(), "idle_seconds": idle_seconds}
+        self.idle_stops += 1
+        print(f"💤 VLLM server ({fine_tune_name}) stopped after {idle_seconds:.0f}s idle, "
+              f"the next request starts it again")
+        return True
+
+    async def run(self, interval_seconds: float = IDLE_CHECK_INTERVAL_SECONDS):
+        """Check for an idle server periodically, forever."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.check_idle()
+            except Exception as e:
+                print(f"⚠️ Idle check of VLLM server failed: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        """Return the idle policy, current idle time, request gaps and past cold starts."""
+        gaps = sorted(self.idle_gaps)
+        completed = [cold_start["ready_seconds"] for cold_start in self.cold_starts
+                     if cold_start["ready_seconds"] is not None]
+        return {
+            "idle_timeout_seconds": self.idle_timeout_seconds,
+            "cold_start_timeout_seconds": self.cold_start_timeout_seconds,
+            "in_flight": self.in_flight,
+            "idle_seconds": 0.0 if self.in_flight else self.clock() - self.last_activity,
+            "scaled_down": self.scaled_down,
+            "cold_start_in_progress": self.cold_start_task is not None,
+            "idle_stops": self.idle_stops,
+            "held_requests": self.held_requests,
+            "cold_start_timeouts": self.cold_start_timeouts,
+            "request_gaps": {
+                "count": len(gaps),
+                "median_seconds": statistics.median(gaps) if gaps else None,
+                "p90_seconds": gaps[int(0.9 * (len(gaps) - 1))] if gaps else None,
+                "max_seconds": gaps[-1] if gaps else None,
+                # Requests that would have waited for a cold start under the current timeout
+                "over_timeout": sum(gap >= self.idle_timeout_seconds for gap in gaps)
+                if self.idle_timeout_seconds > 0 else 0,
+            },
+            "cold_start_seconds": {
+                "mean": statistics.mean(completed) if completed else None,
+                "max": max(completed) if completed else None,
+            },
+            "cold_starts": list(self.cold_starts),
+        }
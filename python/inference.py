@@ -7,10 +7,22 @@ with unsloth using the vLLM library. It specifically handles LoRA adapters
 """
 
 import os
-from typing import List, Dict, Any, Union
+import time
+from contextlib import nullcontext
+from typing import List, Dict, Any, Union, Tuple, Optional
 from vllm import LLM, SamplingParams
 from vllm.lora.request import LoRARequest
-from transformers import AutoTokenizer
+from vllm.sampling_params import GuidedDecodingParams
+from vllm.inputs import TokensPrompt
+
+from output_schema import try_parse_output, retry_temperature, new_parse_stats, summarize_parse_stats
+from speculative import speculative_config_from_settings, acceptance_from_metrics
+from length_budget import load_length_stats, compute_output_budgets, longest_first
+from snapshots import write_snapshot
+from prompt_prep import PromptPreparer, DEFAULT_PREP_WORKERS, DEFAULT_PREP_CHUNK_SIZE
+
+
+DEFAULT_GPU_MEMORY_UTILIZATION = 0.6
 
 
 
@@ -20,37 +32,32 @@ def infer(
     """
     Performs offline inference using a LoRA adapter with vLLM.
 
-    This function implements the official vLLM approach for offline LoRA inference
-    as demonstrated in multilora_inference.py. It loads the base model with LoRA
-    support and applies the adapter using LoRARequest during generation.
+    See infer_with_report for the accepted settings. Only the results are
+    returned; use infer_with_report to also get the run report.
+    """
+    results, _ = infer_with_report(data, inference_settings)
+    return results
+
+
+def load_lora_model(inference_settings: Dict[str, Any]) -> Tuple[LLM, LoRARequest]:
+    """
+    Load the base model with LoRA support and create the adapter request.
+
+    The returned pair can be passed to infer_with_report to run several
+    batches on one engine instead of loading the model for every call.
 
     Args:
-        data: List of dictionaries with 'input' keys containing prompts
-        inference_settings: Dictionary containing:
-            - adapter_path: Path to the LoRA adapter directory (from fine-tuning)
-            - model_name: Base model name (same as used in fine-tuning)
-            - temperature: Sampling temperature (0.0 to 1.0)
-            - max_output_tokens: Maximum number of tokens to generate
-            - top_p: Top-p sampling parameter (optional, default: 0.95)
-            - top_k: Top-k sampling parameter (optional, default: -1)
-            - repetition_penalty: Repetition penalty (optional, default: 1.0)
+        inference_settings: Dictionary with adapter_path, model_name, the
+            speculative decoding settings accepted by infer_with_report and
+            gpu_memory_utilization (optional, default: 0.6), the share of
+            GPU memory the engine may use
 
     Returns:
-        List of dictionaries with 'input' and 'output' keys
-
-    References:
-        Based on vLLM's official multilora_inference.py example:
-        https://github.com/vllm-project/vllm/blob/main/examples/offline_inference/multilora_inference.py
+        Tuple of the vLLM engine and the LoRA request of the adapter
     """
-
-    # Extract settings
     adapter_path = inference_settings["adapter_path"]
     model_name = inference_settings["model_name"]
-    temperature = inference_settings["temperature"]
-    max_output_tokens = inference_settings["max_output_tokens"]
-    top_p = inference_settings.get("top_p", 0.95)
-    top_k = inference_settings.get("top_k", -1)
-    repetition_penalty = inference_settings.get("repetition_penalty", 1.0)
+    speculative_config = speculative_config_from_settings(inference_settings)
 
     print(f"Loading base model: {model_name}")
     print(f"Using LoRA adapter: {adapter_path}")
@@ -70,12 +77,17 @@ def infer(
             max_loras=1,  # Maximum number of LoRA adapters
             max_lora_rank=64,  # Maximum LoRA rank
             tensor_parallel_size=1,
-            gpu_memory_utilization=0.6,
+            gpu_memory_utilization=inference_settings.get("gpu_memory_utilization", DEFAULT_GPU_MEMORY_UTILIZATION),
             trust_remote_code=True,
             max_model_len=2048,
             dtype="half",
+            speculative_config=speculative_config,
+            # Speculative acceptance is read from the engine's stat loggers
+            disable_log_stats=not speculative_config,
         )
         print("✅ Base model loaded successfully with LoRA support")
+        if speculative_config:
+            print(f"⚡ Using n-gram speculative decoding: {speculative_config}")
 
         # Create LoRA request using the official vLLM API
         print(f"📁 Creating LoRA request for adapter: {adapter_path}")
@@ -89,58 +101,235 @@ def infer(
     except Exception as e:
         print(f"❌ Failed to load model with LoRA support: {e}")
         raise RuntimeError(f"Cannot load model with LoRA support. Error: {e}")
-    
-    
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-    # Set up sampling parameters
-    sampling_params = SamplingParams(
-        temperature=temperature,
-        max_tokens=max_output_tokens,
-        top_p=top_p,
-        top_k=top_k,
-        repetition_penalty=repetition_penalty,
-        stop=["</s>", "<|im_end|>", "<|endoftext|>"],  # Common stop tokens
-    )
+
+    return llm, lora_request
+
+
+def infer_with_report(
+    data: List[Dict[str, str]], inference_settings: Dict[str, Any],
+    model: Optional[Tuple[LLM, LoRARequest]] = None,
+    preparer: Optional[PromptPreparer] = None
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """
+    Performs offline inference using a LoRA adapter with vLLM.
+
+    This function implements the official vLLM approach for offline LoRA inference
+    as demonstrated in multilora_inference.py. It loads the base model with LoRA
+    support and applies the adapter using LoRARequest during generation.
+
+    Args:
+        data: List of dictionaries with 'input' keys containing prompts
+        inference_settings: Dictionary containing:
+            - adapter_path: Path to the LoRA adapter directory (from fine-tuning)
+            - model_name: Base model name (same as used in fine-tuning)
+            - temperature: Sampling temperature (0.0 to 1.0)
+            - max_output_tokens: Maximum number of tokens to generate for any item
+            - top_p: Top-p sampling parameter (optional, default: 0.95)
+            - top_k: Top-k sampling parameter (optional, default: -1)
+            - repetition_penalty: Repetition penalty (optional, default: 1.0)
+            - output_schema: JSON schema of the output format (optional). When
+              given, generation is constrained with vLLM guided decoding
+            - max_parse_retries: Number of times unparseable outputs are
+              regenerated, at a temperature of at least 0.7 (optional,
+              default: 0)
+            - speculative_decoding: Enable n-gram prompt-lookup speculative
+              decoding (optional, default: False)
+            - prompt_lookup_max / prompt_lookup_min: N-gram window matched
+              against the prompt (optional, default: 4 / 1)
+            - num_speculative_tokens: Lookahead tokens proposed per step
+              (optional, default: 5)
+            - output_length_ratio: Output/input token ratio used to derive
+              per-item budgets (optional, default: learned ratio saved with
+              the adapter, or max_output_tokens for every item if absent)
+            - prep_workers: Processes rendering and tokenizing prompts
+              (optional, default: up to 4, 0 to prepare on this thread)
+            - prep_chunk_size: Prompts prepared per chunk; preparation of the
+              next chunk overlaps generation of the current one (optional,
+              default: 4096)
+            - output_snapshot_path: Parquet file the results are written to
+              (optional)
+        model: Engine and LoRA request from load_lora_model to reuse
+            (optional, loaded from the settings if not given)
+        preparer: Entered PromptPreparer to reuse across calls, so its worker
+            processes start once (optional, started for this call from
+            prep_workers and prep_chunk_size if not given)
+
+    Returns:
+        Tuple of the results in input order, a list of dictionaries with
+        'input', 'output', 'parse_ok', 'max_tokens' and 'hit_budget' keys, and
+        a report with parse-failure and retry rates, the number of items that
+        hit their budget, decode throughput, prompt preparation time and, with
+        speculative decoding, the acceptance rate
+
+    References:
+        Based on vLLM's official multilora_inference.py example:
+        https://github.com/vllm-project/vllm/blob/main/examples/offline_inference/multilora_inference.py
+    """
+
+    # Extract settings
+    adapter_path = inference_settings["adapter_path"]
+    model_name = inference_settings["model_name"]
+    temperature = inference_settings["temperature"]
+    max_output_tokens = inference_settings["max_output_tokens"]
+    top_p = inference_settings.get("top_p", 0.95)
+    top_k = inference_settings.get("top_k", -1)
+    repetition_penalty = inference_settings.get("repetition_penalty", 1.0)
+    output_schema = inference_settings.get("output_schema")
+    max_parse_retries = inference_settings.get("max_parse_retries", 0)
+    speculative_config = speculative_config_from_settings(inference_settings)
+    prep_workers = inference_settings.get("prep_workers", DEFAULT_PREP_WORKERS)
+    prep_chunk_size = inference_settings.get("prep_chunk_size", DEFAULT_PREP_CHUNK_SIZE)
+
+    llm, lora_request = model if model is not None else load_lora_model(inference_settings)
+
+    guided_decoding = GuidedDecodingParams(json=output_schema) if output_schema else None
+    if output_schema:
+        print("🧭 Using guided JSON decoding with the output-format schema")
+
+    # Sampling parameters differ only by max_tokens and the temperature of
+    # retries, so share one object per budget
+    sampling_params_by_budget = {}
+
+    def get_sampling_params(max_tokens: int, retry: bool = False) -> SamplingParams:
+        if (max_tokens, retry) not in sampling_params_by_budget:
+            sampling_params_by_budget[max_tokens, retry] = SamplingParams(
+                temperature=retry_temperature(temperature) if retry else temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+                top_k=top_k,
+                repetition_penalty=repetition_penalty,
+                stop=["</s>", "<|im_end|>", "<|endoftext|>"],  # Common stop tokens
+                guided_decoding=guided_decoding,
+            )
+        return sampling_params_by_budget[max_tokens, retry]
 
     # Extract prompts from input data
     prompts = [item["input"] for item in data]
-    messages_list = [[{"role": "user", "content": prompt}] for prompt in prompts]
-    texts = tokenizer.apply_chat_template(
-        messages_list,
-        tokenize=False,
-        add_generation_prompt=True,
-        enable_thinking=False  # Disables thinking mode
-    )
+
+    # Per-item output budgets follow the training data output/input ratio
+    output_length_ratio = inference_settings.get("output_length_ratio")
+    if output_length_ratio is None:
+        length_stats = load_length_stats(adapter_path)
+        if length_stats is not None:
+            output_length_ratio = length_stats["output_input_ratio"]
+        else:
+            print("⚠️ No length statistics found with the adapter, using max_output_tokens for every item")
+
+    prompt_token_ids = [None] * len(prompts)
+    budgets = [max_output_tokens] * len(prompts)
 
     print(f"Performing inference on {len(prompts)} prompts...")
     print("🎯 Using LoRA adapter for fine-tuned responses")
 
-    # Generate responses using the LoRA adapter
-    try:
-        outputs = llm.generate(
-            texts,
-            sampling_params,
+    def generate_indices(indices: List[int], retry: bool = False) -> List[Any]:
+        return llm.generate(
+            [TokensPrompt(prompt_token_ids=prompt_token_ids[i]) for i in indices],
+            [get_sampling_params(budgets[i], retry) for i in indices],
             lora_request=lora_request,  # Apply the LoRA adapter
         )
+
+    # Prompts are rendered and tokenized chunk by chunk in worker processes
+    # while the previous chunk generates; every chunk is one generate call,
+    # longest budgets first, with a budget per prompt. Outputs are scattered
+    # back to input order.
+    own_preparer = preparer is None
+    if own_preparer:
+        preparer = PromptPreparer(model_name, prep_workers, prep_chunk_size)
+    else:
+        preparer.reset_stats()
+    outputs = [None] * len(prompts)
+    generation_start = time.perf_counter()
+    try:
+        with preparer if own_preparer else nullcontext(preparer):
+            for start, chunk in preparer.prepare(prompts):
+                chunk_budgets = compute_output_budgets(chunk["input_lengths"], output_length_ratio, max_output_tokens)
+                for offset, (token_ids, budget) in enumerate(zip(chunk["token_ids"], chunk_budgets)):
+                    prompt_token_ids[start + offset] = token_ids
+                    budgets[start + offset] = budget
+                indices = [start + offset for offset in longest_first(chunk_budgets)]
+                for i, output in zip(indices, generate_indices(indices)):
+                    outputs[i] = output
         print("✅ Generation completed with LoRA adapter")
     except Exception as e:
         print(f"❌ Error during LoRA generation: {e}")
+    prep_stats = preparer.stats()
+    generation_seconds = time.perf_counter() - generation_start - prep_stats["wait_seconds"]
+    generated_tokens = sum(
+        len(output.outputs[0].token_ids)
+        for output in outputs if output is not None and len(output.outputs) > 0
+    )
+
+    generated = [
+        output.outputs[0].text.strip()
+        if output is not None and len(output.outputs) > 0 else None
+        for output in outputs
+    ]
+    hit_budget = [
+        output is not None and len(output.outputs) > 0 and output.outputs[0].finish_reason == "length"
+        for output in outputs
+    ]
+
+    # Regenerate unparseable outputs, which would otherwise go to the failed-data path
+    parse_stats = new_parse_stats()
+    mode = "guided" if output_schema else "unguided"
+    parse_stats[mode]["requests"] = len(prompts)
+    failed = [i for i, text in enumerate(generated) if text is None or try_parse_output(text) is None]
+    for attempt in range(max_parse_retries):
+        # Prompts whose preparation failed cannot be regenerated
+        retry = [i for i in failed if prompt_token_ids[i] is not None]
+        if not retry:
+            break
+        print(f"🔁 Retrying {len(retry)} unparseable outputs (attempt {attempt + 1}/{max_parse_retries})")
+        parse_stats[mode]["retries"] += len(retry)
+        for i, output in zip(retry, generate_indices(retry, retry=True)):
+            if output is not None and len(output.outputs) > 0:
+                generated[i] = output.outputs[0].text.strip()
+                hit_budget[i] = output.outputs[0].finish_reason == "length"
+        failed = [i for i in failed if generated[i] is None or try_parse_output(generated[i]) is None]
+    parse_stats[mode]["parse_failures"] = len(failed)
 
     # Format results
     results = []
-    for i, (prompt, output) in enumerate(zip(prompts, outputs)):
-        if output is not None and len(output.outputs) > 0:
-            generated_text = output.outputs[0].text.strip()
-            # Check if we used LoRA or base model
-            model_type = (
-                "[FINE-TUNED]" if "lora_request" in locals() else "[BASE MODEL]"
-            )
+    failed_set = set(failed)
+    for i, (prompt, generated_text) in enumerate(zip(prompts, generated)):
+        if generated_text is not None:
+            model_type = "[FINE-TUNED]"
         else:
             generated_text = f"Error: Failed to generate response for prompt {i+1}"
             model_type = "[ERROR]"
 
-        results.append({"input": prompt, "output": f"{model_type}: {generated_text}"})
+        results.append({
+            "input": prompt,
+            "output": f"{model_type}: {generated_text}",
+            "parse_ok": i not in failed_set,
+            "max_tokens": budgets[i],
+            "hit_budget": hit_budget[i],
+        })
+
+    report = {
+        "guided_decoding": bool(output_schema),
+        "parse_stats": summarize_parse_stats(parse_stats),
+        "speculative_config": speculative_config,
+        "generated_tokens": generated_tokens,
+        "generation_seconds": generation_seconds,
+        "tokens_per_second": generated_tokens / generation_seconds if generation_seconds > 0 else 0.0,
+        "speculative_acceptance": None,
+        "output_length_ratio": output_length_ratio,
+        "prompt_prep": prep_stats,
+        "budget_hits": sum(hit_budget),
+    }
+    if speculative_config:
+        try:
+            report["speculative_acceptance"] = acceptance_from_metrics(llm.get_metrics())
+        except Exception as e:
+            print(f"⚠️ vLLM engine metrics unavailable, acceptance rate not reported: {e}")
+
+    output_snapshot_path = inference_settings.get("output_snapshot_path")
+    report["output_snapshot"] = write_snapshot(output_snapshot_path, results) if output_snapshot_path else None
 
+    print(f"📊 Parse failures: {len(failed)}/{len(prompts)} ({mode} decoding)")
+    print(f"📏 Items that hit their output budget: {sum(hit_budget)}/{len(prompts)}")
+    print(f"🧵 Prompt preparation: {prep_stats['worker_cpu_seconds']:.1f} CPU s on {prep_stats['workers']} workers, "
+          f"{prep_stats['wait_seconds']:.1f}s waited")
     print(f"Inference completed. Generated {len(results)} responses with LoRA adapter.")
-    return results
\ No newline at end of file
+    return results, report
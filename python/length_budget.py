@@ -0,0 +1,101 @@
+"""
+Per-item output budgets derived from training data lengths.
+
+Fine-tuning records the ratio between output and input token lengths of its
+training data next to the adapter. Inference uses that ratio to give every
+prompt its own max_tokens instead of one global budget, so a few long inputs
+no longer set the budget for everything and runaway generations are cut off.
+"""
+
+import json
+import math
+import os
+from typing import List, Dict, Any, Optional
+
+
+LENGTH_STATS_FILENAME = "length_stats.json"
+
+# Quantile of the per-row output/input ratio used as the budget ratio
+RATIO_QUANTILE = 0.95
+# Headroom applied on top of the learned ratio
+BUDGET_MARGIN = 1.2
+# Smallest budget given to any item, so very short inputs can still answer
+MIN_OUTPUT_TOKENS = 32
+
+
+def compute_length_stats(input_lengths: List[int], output_lengths: List[int]) -> Dict[str, Any]:
+    """
+    Compute output/input token length statistics of training data.
+
+    Args:
+        input_lengths: Token length of every training input
+        output_lengths: Token length of every training output
+
+    Returns:
+        Dictionary with the learned output/input ratio and length summaries
+    """
+    ratios = sorted(
+        output_length / max(input_length, 1)
+        for input_length, output_length in zip(input_lengths, output_lengths)
+    )
+    if not ratios:
+        raise ValueError("Cannot compute length statistics of empty training data")
+
+    index = min(len(ratios) - 1, math.ceil(RATIO_QUANTILE * len(ratios)) - 1)
+    return {
+        "output_input_ratio": ratios[index],
+        "ratio_quantile": RATIO_QUANTILE,
+        "max_output_tokens": max(output_lengths),
+        "mean_input_tokens": sum(input_lengths) / len(input_lengths),
+        "mean_output_tokens": sum(output_lengths) / len(output_lengths),
+        "rows": len(ratios),
+    }
+
+
+def save_length_stats(output_dir: str, stats: Dict[str, Any]):
+    """Save length statistics next to the adapter."""
+    with open(os.path.join(output_dir, LENGTH_STATS_FILENAME), "w") as f:
+        json.dump(stats, f, indent=2)
+
+
+def load_length_stats(adapter_dir: str) -> Optional[Dict[str, Any]]:
+    """Load length statistics saved with an adapter, or None if there are none."""
+    path = os.path.join(adapter_dir, LENGTH_STATS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compute_output_budgets(
+    input_lengths: List[int], ratio: Optional[float], max_output_tokens: int
+) -> List[int]:
+    """
+    Compute the max_tokens of every item.
+
+    Args:
+        input_lengths: Token length of every input
+        ratio: Output/input length ratio, or None to use max_output_tokens for all
+        max_output_tokens: Hard cap applied to every budget
+
+    Returns:
+        List of per-item output budgets
+    """
+    if ratio is None:
+        return [max_output_tokens] * len(input_lengths)
+    return [
+        min(max_output_tokens, max(MIN_OUTPUT_TOKENS, math.ceil(ratio * BUDGET_MARGIN * length)))
+        for length in input_lengths
+    ]
+
+
+def longest_first(lengths: List[int]) -> List[int]:
+    """
+    Order item indices by length, longest first.
+
+    The items are submitted to the engine as one request list in this order.
+    Continuous batching refills the slots of finished items from the rest of
+    the list, and the longest generations start first instead of trailing
+    behind the others.
+    """
+    return sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
@@ -0,0 +1,102 @@
+"""
+Bounded in-memory capture of subprocess output.
+
+The vLLM server's stdout and stderr are read line by line into a ring buffer
+that keeps the newest lines, so its logs can be tailed and followed through
+the API without shell access to the host.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable
+
+
+DEFAULT_MAX_LINES = 5000
+STREAM_READ_LIMIT = 1 << 20
+
+
+class LogRingBuffer:
+    """Keeps the newest lines of a log, each numbered with an increasing sequence number."""
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.next_seq = 0
+        self._new_lines = asyncio.Event()
+
+    def append(self, stream: str, line: str):
+        """Add a line and wake up followers."""
+        self.lines.append({"seq": self.next_seq, "time": time.time(), "stream": stream, "line": line})
+        self.next_seq += 1
+        self._new_lines.set()
+        self._new_lines = asyncio.Event()
+
+    def tail(self, count: int, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the newest lines.
+
+        Args:
+            count: Maximum number of lines
+            since: Only return lines with a sequence number of at least this
+        """
+        lines = [entry for entry in self.lines if since is None or entry["seq"] >= since]
+        return lines[-count:] if count else []
+
+    async def follow(self, since: int, is_alive: Callable[[], bool],
+                     poll_seconds: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield lines from sequence number since onwards as they arrive.
+
+        Stops once is_alive() returns False and every line has been yielded.
+        """
+        while True:
+            new_lines = self._new_lines
+            for entry in self.tail(len(self.lines), since):
+                yield entry
+                since = entry["seq"] + 1
+            if not is_alive() and since >= self.next_seq:
+                return
+            try:
+                await asyncio.wait_for(new_lines.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def pump_stream(stream: asyncio.StreamReader, name: str, buffer: LogRingBuffer, echo: bool = True):
+    """
+    Read a subprocess stream line by line into a ring buffer until it closes.
+
+    Lines longer than the stream's read limit are stored in pieces, as much
+    as the stream has buffered at a time, rather than dropped.
+
+    Args:
+        stream: stdout or stderr of an asyncio subprocess
+        name: Stream name stored with every line
+        buffer: Ring buffer receiving the lines
+        echo: Also print the lines to the console
+    """
+    def store(line: bytes):
+        text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        buffer.append(name, text)
+        if echo:
+            print(text)
+
+    split_line = False
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # Stream closed, possibly after a last line without a newline
+            line = e.partial
+        except asyncio.LimitOverrunError as e:
+            # Line longer than the read limit: readline() would drop it, so
+            # take the part in the buffer as a line of its own and read on
+            store(await stream.readexactly(e.consumed))
+            split_line = True
+            continue
+        if not line:
+            break
+        # The newline ending a split line is not a line of its own
+        if not (split_line and line in (b"\n", b"\r\n")):
+            store(line)
+        split_line = False
@@ -0,0 +1,344 @@
+"""
+Local cache of base-model weights with background prefetching.
+
+Fine-tunes and vLLM servers otherwise resolve model_name through the Hugging
+Face cache on first use, so a cold disk or page cache stalls them. The
+ModelCache keeps every base model in its own directory under MODEL_CACHE_DIR,
+verifies the files against their safetensors headers, and reads the weights
+sequentially into the page cache in the background as soon as a fine-tune is
+submitted or a server start is requested. Models are evicted least recently
+used first when the cache exceeds its disk budget.
+
+Models that cannot be cached (gated without a token, unusual layouts) are
+reported by resolve(); callers then fall back to loading model_name through
+the Hugging Face cache as before.
+
+Offline use: set MODEL_CACHE_OFFLINE=1 (or HF_HUB_OFFLINE=1) and place each
+model in MODEL_CACHE_DIR/<org>--<name>, or pass a local directory as the
+model name. Nothing is downloaded then.
+"""
+
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable
+
+from huggingface_hub import list_repo_files, snapshot_download
+from huggingface_hub.utils import GatedRepoError
+
+
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "./model_cache")
+MODEL_CACHE_BUDGET_BYTES = int(float(os.environ.get("MODEL_CACHE_BUDGET_GB", "200")) * 1024 ** 3)
+MODEL_CACHE_OFFLINE = os.environ.get("MODEL_CACHE_OFFLINE", os.environ.get("HF_HUB_OFFLINE", "0")) == "1"
+
+INDEX_FILENAME = "cache_index.json"
+
+# Files needed to load a model and its tokenizer, including the code of
+# trust_remote_code models; other repository files are skipped
+MODEL_FILE_PATTERNS = ["*.json", "*.safetensors", "*.model", "*.txt", "*.tiktoken", "*.jinja", "*.py"]
+# Weights of models published without safetensors
+PICKLE_WEIGHT_PATTERNS = ["*.bin"]
+
+PREFETCH_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def model_cache_dir(model_name: str, cache_dir: str = MODEL_CACHE_DIR) -> str:
+    """Return the cache directory of a model."""
+    return os.path.join(cache_dir, model_name.replace("/", "--"))
+
+
+def directory_size(path: str) -> int:
+    """Return the total size of the files under a directory in bytes."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+def weight_files(model_dir: str) -> List[str]:
+    """List the weight files of a model directory, safetensors if there are any, else .bin."""
+    names = os.listdir(model_dir)
+    safetensors = [name for name in names if name.endswith(".safetensors")]
+    return sorted(
+        os.path.join(model_dir, name) for name in (safetensors or [name for name in names if name.endswith(".bin")])
+    )
+
+
+def verify_model_dir(model_dir: str) -> List[str]:
+    """
+    Check that a model directory is complete without hashing the weights.
+
+    Every safetensors file must have a readable header whose tensors end
+    exactly at the end of the file, which catches truncated downloads, and
+    every shard named in a sharded index must be present. .bin weights
+    can only be checked for presence.
+
+    Returns:
+        List of problems found, empty if the directory is usable
+    """
+    problems = []
+    if not os.path.isfile(os.path.join(model_dir, "config.json")):
+        problems.append("config.json is missing")
+
+    files = weight_files(model_dir) if os.path.isdir(model_dir) else []
+    if not files:
+        problems.append("no weight files")
+
+    safetensors = files and files[0].endswith(".safetensors")
+    index_path = os.path.join(
+        model_dir, "model.safetensors.index.json" if safetensors else "pytorch_model.bin.index.json"
+    )
+    if os.path.isfile(index_path):
+        with open(index_path, "r") as f:
+            shards = set(json.load(f).get("weight_map", {}).values())
+        problems.extend(f"{shard} is missing" for shard in sorted(shards)
+                        if not os.path.isfile(os.path.join(model_dir, shard)))
+
+    for path in files if safetensors else []:
+        try:
+            with open(path, "rb") as f:
+                header_size = struct.unpack("<Q", f.read(8))[0]
+                header = json.loads(f.read(header_size))
+            data_end = max(
+                (tensor["data_offsets"][1] for key, tensor in header.items() if key != "__metadata__"),
+                default=0,
+            )
+            expected_size = 8 + header_size + data_end
+            actual_size = os.path.getsize(path)
+            if actual_size != expected_size:
+                problems.append(f"{os.path.basename(path)} is {actual_size} bytes, expected {expected_size}")
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            problems.append(f"{os.path.basename(path)} has an unreadable header: {e}")
+    return problems
+
+
+def prefetch_files(paths: Iterable[str]) -> int:
+    """
+    Read files sequentially so they are in the page cache when loaded.
+
+    Returns:
+        Number of bytes read
+    """
+    total = 0
+    buffer = bytearray(PREFETCH_BLOCK_SIZE)
+    for path in paths:
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                total += read
+    return total
+
+
+class ModelCache:
+    """Resolves base models to verified local directories and keeps them warm."""
+
+    def __init__(self, cache_dir: str = MODEL_CACHE_DIR, budget_bytes: int = MODEL_CACHE_BUDGET_BYTES,
+                 offline: bool = MODEL_CACHE_OFFLINE):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-cache")
+        self.resolving: Dict[str, Future] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.pins: Dict[str, int] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _save_index(self):
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _set_status(self, model_name: str, **fields):
+        with self.lock:
+            self.status.setdefault(model_name, {}).update(fields)
+
+    def resolve(self, model_name: str) -> str:
+        """
+        Return a verified local directory holding the model, downloading it if needed.
+
+        Raises:
+            FileNotFoundError: If the model is not cached and the cache is offline
+            RuntimeError: If the files fail verification
+        """
+        if os.path.isdir(model_name):
+            problems = verify_model_dir(model_name)
+            if problems:
+                raise RuntimeError(f"Local model directory {model_name} is incomplete: {'; '.join(problems)}")
+            return model_name
+
+        path = model_cache_dir(model_name, self.cache_dir)
+        problems = verify_model_dir(path) if os.path.isdir(path) else ["not cached"]
+        downloaded = bool(problems)
+        if problems:
+            if self.offline:
+                raise FileNotFoundError(
+                    f"Model {model_name} is not available offline in {path}: {'; '.join(problems)}"
+                )
+            self._set_status(model_name, state="downloading")
+            print(f"⬇️ Downloading base model {model_name} to {path}")
+            try:
+                patterns = MODEL_FILE_PATTERNS
+                if not any(name.endswith(".safetensors") for name in list_repo_files(model_name)):
+                    patterns = MODEL_FILE_PATTERNS + PICKLE_WEIGHT_PATTERNS
+                snapshot_download(repo_id=model_name, local_dir=path, allow_patterns=patterns)
+            except GatedRepoError as e:
+                raise RuntimeError(
+                    f"Model {model_name} is gated: accept its license on the Hugging Face Hub "
+                    f"and set HF_TOKEN for this process ({e})"
+                )
+            problems = verify_model_dir(path)
+            if problems:
+                raise RuntimeError(f"Downloaded model {model_name} failed verification: {'; '.join(problems)}")
+
+        with self.lock:
+            entry = self.index.setdefault(model_name, {"path": path})
+            if downloaded or "bytes" not in entry:
+                entry["bytes"] = directory_size(path)
+            entry["last_used"] = time.time()
+            self._save_index()
+        self.evict(protected=[model_name])
+        return path
+
+    def ensure(self, model_name: str) -> Future:
+        """
+        Resolve a model and prefetch its weights in the background.
+
+        Concurrent calls for the same model share one task; a call after the
+        task has finished starts a new one, so every use refreshes the model's
+        place in the eviction order and prefetches its weights again.
+
+        Returns:
+            Future resolving to the local model directory as soon as the files
+            are verified; reading the weights into the page cache continues
+            afterwards, ahead of the loader
+        """
+        with self.lock:
+            future = self.resolving.get(model_name)
+            in_flight = future is not None and (
+                not future.done() or self.status.get(model_name, {}).get("state") == "prefetching"
+            )
+            if in_flight:
+                entry = self.index.get(model_name)
+                if entry is not None:
+                    entry["last_used"] = time.time()
+                    self._save_index()
+                return future
+            future = Future()
+            self.resolving[model_name] = future
+            self.status[model_name] = {"state": "resolving", "error": None}
+        self.executor.submit(self._resolve_and_prefetch, model_name, future)
+        return future
+
+    def _resolve_and_prefetch(self, model_name: str, future: Future):
+        try:
+            path = self.resolve(model_name)
+        except Exception as e:
+            self._set_status(model_name, state="failed", error=str(e))
+            print(f"❌ Failed to resolve base model {model_name}: {e}")
+            future.set_exception(e)
+            return
+        future.set_result(path)
+
+        self._set_status(model_name, state="prefetching", path=path)
+        start = time.perf_counter()
+        try:
+            bytes_read = prefetch_files(weight_files(path))
+        except OSError as e:
+            self._set_status(model_name, state="ready", error=f"prefetch failed: {e}")
+            return
+        seconds = time.perf_counter() - start
+        self._set_status(model_name, state="ready", bytes_prefetched=bytes_read, prefetch_seconds=seconds)
+        print(f"🔥 Prefetched {bytes_read / 1024 ** 3:.1f} GB of {model_name} in {seconds:.1f}s")
+
+    def pin(self, model_name: str):
+        """Protect a model from eviction while it is in use."""
+        with self.lock:
+            self.pins[model_name] = self.pins.get(model_name, 0) + 1
+
+    def unpin(self, model_name: str):
+        """Release a pin taken with pin()."""
+        with self.lock:
+            if self.pins.get(model_name, 0) <= 1:
+                self.pins.pop(model_name, None)
+            else:
+                self.pins[model_name] -= 1
+
+    def evict(self, protected: Iterable[str] = ()) -> List[str]:
+        """
+        Delete least recently used models until the cache fits its budget.
+
+        Pinned models, models being resolved and protected models are kept.
+
+        Returns:
+            Names of the evicted models
+        """
+        evicted = []
+        with self.lock:
+            keep = set(protected) | set(self.pins) | {
+                name for name, future in self.resolving.items() if not future.done()
+            }
+            total = sum(entry.get("bytes", 0) for entry in self.index.values())
+            for name, entry in sorted(self.index.items(), key=lambda item: item[1].get("last_used", 0)):
+                if total <= self.budget_bytes:
+                    break
+                if name in keep:
+                    continue
+                shutil.rmtree(entry["path"], ignore_errors=True)
+                total -= entry.get("bytes", 0)
+                evicted.append(name)
+            for name in evicted:
+                del self.index[name]
+                self.resolving.pop(name, None)
+                self.status.pop(name, None)
+            if evicted:
+                self._save_index()
+        for name in evicted:
+            print(f"🗑️ Evicted base model {name} from the model cache")
+        return evicted
+
+    def report(self) -> Dict[str, Any]:
+        """Return the cache size, budget and the state of every cached model."""
+        with self.lock:
+            models = [
+                {
+                    "model_name": name,
+                    "path": entry["path"],
+                    "bytes": entry.get("bytes", 0),
+                    "last_used": entry.get("last_used"),
+                    "pinned": name in self.pins,
+                    **self.status.get(name, {"state": "cached"}),
+                }
+                for name, entry in sorted(self.index.items(), key=lambda item: -item[1].get("last_used", 0))
+            ]
+            in_progress = [
+                {"model_name": name, **status}
+                for name, status in self.status.items() if name not in self.index
+            ]
+        return {
+            "cache_dir": self.cache_dir,
+            "offline": self.offline,
+            "budget_bytes": self.budget_bytes,
+            "total_bytes": sum(model["bytes"] for model in models),
+            "models": models + in_progress,
+        }
@@ -0,0 +1,119 @@
+"""
+Output-format JSON schemas for guided decoding.
+
+The client describes an output format as a mapping of key and value names
+(senseName, visionName, positiveName, ...). This module turns such a mapping
+into a JSON schema that vLLM can enforce with guided/structured decoding, and
+provides the parse check used to report parse-failure rates.
+
+Names left empty in the output format fall back to the defaults, as in the
+client's formatAnnotation(), so the schema matches the training targets.
+"""
+
+import json
+from typing import Dict, Any, Optional
+
+
+SENSE_NAME_DEFAULTS = {
+    "visionName": "Vision",
+    "hearingName": "Hearing",
+    "tasteName": "Taste",
+    "smellName": "Smell",
+    "touchName": "Touch",
+}
+SENTIMENT_NAME_DEFAULTS = {
+    "positiveName": "Positive",
+    "negativeName": "Negative",
+    "neutralName": "Neutral",
+}
+
+# Training target of rows without annotations (see the client's json-generator.util.ts)
+NO_ANNOTATIONS_TEXT = "No annotations to display"
+
+# Regenerating at the original (often zero) temperature would repeat the same output
+MIN_RETRY_TEMPERATURE = 0.7
+
+
+def build_output_schema(
+    output_format: Dict[str, Any], format_type: str = "order-preserving"
+) -> Dict[str, Any]:
+    """
+    Build the JSON schema of model outputs for an output format.
+
+    Args:
+        output_format: Output format record as stored by the client
+        format_type: "order-preserving" for a flat array of annotations, or
+            "sense-prioritized" for an object of annotation arrays keyed by sense
+
+    Returns:
+        JSON schema dictionary
+    """
+    sense_values = [output_format.get(key) or default for key, default in SENSE_NAME_DEFAULTS.items()]
+    sentiment_values = [output_format.get(key) or default for key, default in SENTIMENT_NAME_DEFAULTS.items()]
+    sense_key = output_format.get("senseName") or "sense"
+    stimulus_key = output_format.get("stimulusName") or "stimulus"
+    perception_key = output_format.get("perceptionName") or "perception"
+    sentiment_key = output_format.get("sentimentName") or "sentiment"
+
+    annotation_schema = {
+        "type": "object",
+        "properties": {
+            sense_key: {"type": "string", "enum": sense_values},
+            stimulus_key: {"type": "string"},
+            perception_key: {"type": "string"},
+            sentiment_key: {"type": "string", "enum": sentiment_values},
+        },
+        "required": [sense_key, stimulus_key, perception_key, sentiment_key],
+        "additionalProperties": False,
+    }
+    annotation_array_schema = {"type": "array", "items": annotation_schema}
+
+    if format_type == "order-preserving":
+        return annotation_array_schema
+    if format_type == "sense-prioritized":
+        return {
+            "type": "object",
+            "properties": {sense: annotation_array_schema for sense in sense_values},
+            "additionalProperties": False,
+        }
+    raise ValueError(f"Guided decoding is not supported for output format type: {format_type}")
+
+
+def try_parse_output(text: str) -> Optional[Any]:
+    """
+    Parse a generated output as JSON, returning None if it is unparseable.
+
+    The no-annotations training target parses as an empty list.
+    """
+    if isinstance(text, str) and text.strip() == NO_ANNOTATIONS_TEXT:
+        return []
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def retry_temperature(temperature: float) -> float:
+    """Return the sampling temperature for regenerating an unparseable output."""
+    return max(temperature, MIN_RETRY_TEMPERATURE)
+
+
+def new_parse_stats() -> Dict[str, Dict[str, int]]:
+    """Create empty parse statistics, split by guided and unguided generations."""
+    return {
+        mode: {"requests": 0, "parse_failures": 0, "retries": 0}
+        for mode in ("guided", "unguided")
+    }
+
+
+def summarize_parse_stats(stats: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, float]]:
+    """Add parse-failure and retry rates to parse statistics."""
+    summary = {}
+    for mode, counts in stats.items():
+        requests = counts["requests"]
+        summary[mode] = {
+            **counts,
+            "parse_failure_rate": counts["parse_failures"] / requests if requests else 0.0,
+            "retry_rate": counts["retries"] / requests if requests else 0.0,
+        }
+    return summary
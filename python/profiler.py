@@ -0,0 +1,212 @@
+"""
+Per-phase time and memory profiling of fine-tuning jobs.
+
+A PhaseProfiler times named phases and samples their peak memory: the process
+resident set size from a background thread, and the CUDA allocated/reserved
+peaks from torch's allocator statistics when a GPU is present. CPU-side phases
+can additionally be recorded with cProfile and dumped as a pstats file (open
+with `python -m pstats`, snakeviz, or convert for flamegraph tools).
+
+A TokenCounter hooked into the model counts the real and padded tokens of
+the training batches, giving the training throughput and padding overhead.
+"""
+
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+PROFILE_FILENAME = "training_profile.json"
+CPU_PROFILE_FILENAME = "training_profile.pstats"
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.1
+
+_MB = 1024 * 1024
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Without procfs only the lifetime peak is available (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _cuda():
+    """Return the torch.cuda module if a GPU is usable, else None."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.cuda if torch.cuda.is_available() else None
+
+
+class PhaseProfiler:
+    """Times phases of a job and records their peak memory."""
+
+    def __init__(self, cpu_profile: bool = False):
+        """
+        Args:
+            cpu_profile: Record CPU-side phases (those entered with cpu=True) with cProfile
+        """
+        self.phases: List[Dict[str, Any]] = []
+        self.cpu_profiler = cProfile.Profile() if cpu_profile else None
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, cpu: bool = True):
+        """
+        Profile the enclosed block as one phase.
+
+        Args:
+            name: Phase name reported in the profile
+            cpu: Whether the phase is CPU-bound and should be included in the
+                cProfile dump (GPU-bound phases would only show kernel waits)
+        """
+        cuda = _cuda()
+        if cuda is not None:
+            cuda.synchronize()
+            cuda.reset_peak_memory_stats()
+
+        rss_start = current_rss_bytes()
+        rss_peak = [rss_start]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(RSS_SAMPLE_INTERVAL_SECONDS):
+                rss_peak[0] = max(rss_peak[0], current_rss_bytes())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        profiling_cpu = self.cpu_profiler is not None and cpu
+        if profiling_cpu:
+            self.cpu_profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if cuda is not None:
+                cuda.synchronize()
+            seconds = time.perf_counter() - start
+            if profiling_cpu:
+                self.cpu_profiler.disable()
+            stop.set()
+            sampler.join()
+            rss_end = current_rss_bytes()
+
+            entry = {
+                "name": name,
+                "seconds": round(seconds, 3),
+                "rss_start_mb": round(rss_start / _MB, 1),
+                "rss_end_mb": round(rss_end / _MB, 1),
+                "rss_peak_mb": round(max(rss_peak[0], rss_end) / _MB, 1),
+                "cuda_allocated_peak_mb": None,
+                "cuda_reserved_peak_mb": None,
+            }
+            if cuda is not None:
+                entry["cuda_allocated_peak_mb"] = round(cuda.max_memory_allocated() / _MB, 1)
+                entry["cuda_reserved_peak_mb"] = round(cuda.max_memory_reserved() / _MB, 1)
+            self.phases.append(entry)
+            print(f"⏱️ {name}: {seconds:.2f}s, peak RSS {entry['rss_peak_mb']:.0f} MB"
+                  + (f", peak CUDA {entry['cuda_allocated_peak_mb']:.0f} MB" if cuda is not None else ""))
+
+    def report(self, cpu_profile_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the structured profile, dumping the cProfile stats if recorded.
+
+        Args:
+            cpu_profile_path: Where to write the pstats dump
+
+        Returns:
+            Dictionary with the phases, the total time, the slowest phase and
+            the file name of the pstats dump
+        """
+        dump_file = None
+        if self.cpu_profiler is not None and cpu_profile_path:
+            self.cpu_profiler.dump_stats(cpu_profile_path)
+            dump_file = os.path.basename(cpu_profile_path)
+
+        slowest = max(self.phases, key=lambda p: p["seconds"]) if self.phases else None
+        return {
+            "phases": self.phases,
+            "total_seconds": round(time.perf_counter() - self.started_at, 3),
+            "slowest_phase": slowest["name"] if slowest else None,
+            "rss_peak_mb": max((p["rss_peak_mb"] for p in self.phases), default=None),
+            "cuda_allocated_peak_mb": max(
+                (p["cuda_allocated_peak_mb"] for p in self.phases if p["cuda_allocated_peak_mb"] is not None),
+                default=None,
+            ),
+            "cpu_profile_file": dump_file,
+        }
+
+
+class TokenCounter:
+    """Counts the tokens of training forward passes, with and without padding."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.batches = 0
+        self.handle = None
+
+    def attach(self, model):
+        """Count every forward pass of the model in training mode from now on."""
+        self.handle = model.register_forward_pre_hook(self._count, with_kwargs=True)
+
+    def detach(self):
+        """Stop counting."""
+        if self.handle is not None:
+            self.handle.remove()
+            self.handle = None
+
+    def _count(self, module, args, kwargs):
+        if not module.training:
+            return
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is None:
+            return
+        attention_mask = kwargs.get("attention_mask")
+        self.padded_tokens += input_ids.numel()
+        self.tokens += int(attention_mask.sum()) if attention_mask is not None else input_ids.numel()
+        self.batches += 1
+
+    def report(self, seconds: float) -> Dict[str, Any]:
+        """
+        Args:
+            seconds: Duration of the training the tokens were counted over
+
+        Returns:
+            Dictionary with the token counts, the share of padding and the
+            tokens trained per second
+        """
+        return {
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_ratio": round(1 - self.tokens / self.padded_tokens, 4) if self.padded_tokens else None,
+            "tokens_per_second": round(self.tokens / seconds, 1) if seconds > 0 else None,
+        }
+
+
+def save_profile(artifact_dir: str, profile: Dict[str, Any]):
+    """Save a training profile next to the adapter."""
+    with open(os.path.join(artifact_dir, PROFILE_FILENAME), "w") as f:
+        json.dump(profile, f, indent=2)
+
+
+def load_profile(artifact_dir: str) -> Optional[Dict[str, Any]]:
+    """Load the training profile saved with an adapter, or None if there is none."""
+    path = os.path.join(artifact_dir, PROFILE_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
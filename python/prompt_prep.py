@@ -0,0 +1,174 @@
+"""
+Parallel, pre-tokenized prompt preparation for offline inference.
+
+Rendering the chat template and tokenizing 100k prompts on the main thread
+keeps the GPU idle for minutes, and vLLM would tokenize the rendered strings
+a second time. A PromptPreparer renders and tokenizes chunks of prompts in
+worker processes with the fast tokenizer and yields token ids that are passed
+straight to the engine. Chunks are submitted ahead, so the preparation of the
+next chunks overlaps the generation of the current one.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+
+from transformers import AutoTokenizer
+
+
+DEFAULT_PREP_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_PREP_CHUNK_SIZE = 4096
+
+_tokenizer = None
+
+
+def _init_worker(model_name: str):
+    """Load the fast tokenizer once per worker process."""
+    global _tokenizer
+    # Parallelism comes from the worker processes, not from the tokenizer's threads
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+def prepare_chunk(prompts: List[str]) -> Dict[str, Any]:
+    """
+    Render and tokenize a chunk of prompts with the worker's tokenizer.
+
+    Returns:
+        Dictionary with the prompt token ids (chat template applied), the
+        token lengths of the raw prompts used for output budgets, and the
+        render, tokenize and CPU seconds spent
+    """
+    cpu_start = time.process_time()
+    render_start = time.perf_counter()
+    texts = _tokenizer.apply_chat_template(
+        [[{"role": "user", "content": prompt}] for prompt in prompts],
+        tokenize=False,
+        add_generation_prompt=True,
+        enable_thinking=False  # Disables thinking mode
+    )
+    render_seconds = time.perf_counter() - render_start
+
+    tokenize_start = time.perf_counter()
+    # The rendered template already contains the special tokens
+    token_ids = _tokenizer(texts, add_special_tokens=False)["input_ids"]
+    tokenize_seconds = time.perf_counter() - tokenize_start
+
+    input_lengths = [len(ids) for ids in _tokenizer(prompts, add_special_tokens=False)["input_ids"]]
+    return {
+        "token_ids": token_ids,
+        "input_lengths": input_lengths,
+        "render_seconds": render_seconds,
+        "tokenize_seconds": tokenize_seconds,
+        "cpu_seconds": time.process_time() - cpu_start,
+    }
+
+
+class PromptPreparer:
+    """Prepares prompt chunks in worker processes, in order and ahead of use."""
+
+    def __init__(self, model_name: str, num_workers: int = DEFAULT_PREP_WORKERS,
+                 chunk_size: int = DEFAULT_PREP_CHUNK_SIZE):
+        """
+        Args:
+            model_name: Model whose tokenizer and chat template are used
+            num_workers: Number of worker processes (0 prepares on the calling thread)
+            chunk_size: Number of prompts prepared per task
+        """
+        self.model_name = model_name
+        self.num_workers = num_workers
+        self.chunk_size = max(chunk_size, 1)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start the statistics over, e.g. before the next batch on the same workers."""
+        self.chunks = 0
+        self.render_seconds = 0.0
+        self.tokenize_seconds = 0.0
+        self.worker_cpu_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def __enter__(self) -> "PromptPreparer":
+        if self.num_workers > 0:
+            # Spawn, since forking a process that holds a CUDA context is unsafe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name,),
+            )
+        else:
+            _init_worker(self.model_name)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def prepare(self, prompts: List[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield (start index, prepared chunk) for consecutive chunks of prompts.
+
+        With worker processes, up to num_workers + 1 chunks are in flight, so
+        the caller generates from one chunk while the next ones are prepared.
+        """
+        starts = iter(range(0, len(prompts), self.chunk_size))
+
+        if self.executor is None:
+            for start in starts:
+                wait_start = time.perf_counter()
+                chunk = prepare_chunk(prompts[start:start + self.chunk_size])
+                self.wait_seconds += time.perf_counter() - wait_start
+                self._record(chunk)
+                yield start, chunk
+            return
+
+        pending = deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                pending.append((start, self.executor.submit(prepare_chunk, prompts[start:start + self.chunk_size])))
+
+        for _ in range(self.num_workers + 1):
+            submit_next()
+        while pending:
+            start, future = pending.popleft()
+            wait_start = time.perf_counter()
+            chunk = future.result()
+            self.wait_seconds += time.perf_counter() - wait_start
+            submit_next()
+            self._record(chunk)
+            yield start, chunk
+
+    def _record(self, chunk: Dict[str, Any]):
+        self.chunks += 1
+        self.render_seconds += chunk["render_seconds"]
+        self.tokenize_seconds += chunk["tokenize_seconds"]
+        self.worker_cpu_seconds += chunk["cpu_seconds"]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarize the preparation work.
+
+        Returns:
+            Dictionary with the CPU time spent preparing, the time the caller
+            waited for it, the CPU time kept off the critical path by the
+            workers, and the engine-side tokenization avoided by passing ids
+        """
+        return {
+            "workers": self.num_workers,
+            "chunks": self.chunks,
+            "chunk_size": self.chunk_size,
+            "render_seconds": self.render_seconds,
+            "tokenize_seconds": self.tokenize_seconds,
+            "worker_cpu_seconds": self.worker_cpu_seconds,
+            "wait_seconds": self.wait_seconds,
+            "overlapped_cpu_seconds": max(self.worker_cpu_seconds - self.wait_seconds, 0.0),
+            "engine_tokenization_avoided_seconds": self.tokenize_seconds,
+        }
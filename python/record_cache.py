@@ -0,0 +1,106 @@
+"""
+Read-through cache of fine-tune records.
+
+Status polling from several clients reads the same few records over and over.
+RecordCache keeps recently read records in memory, bounded in size (least
+recently used first out) and in age (TTL). Writes through the API invalidate
+their record immediately; writes from elsewhere are picked up from a MongoDB
+change stream when the server is a replica set, and otherwise after the TTL.
+
+Every invalidation bumps a per-record generation. A read that started before
+an invalidation is not cached when it completes, so a slow read can never put
+back a record older than a concurrent write.
+"""
+
+import copy
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL_SECONDS = 30.0
+
+
+class RecordCache:
+    """Bounded, expiring cache of records keyed by name."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.global_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self, name: str) -> tuple:
+        """Return the generation to pass to put() for a read starting now."""
+        return self.global_generation, self.generations.get(name, 0)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached record, or None on a miss."""
+        entry = self.entries.get(name)
+        if entry is not None and self.clock() - entry["cached_at"] > self.ttl_seconds:
+            del self.entries[name]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(name)
+        self.hits += 1
+        return copy.deepcopy(entry["record"])
+
+    def put(self, name: str, record: Dict[str, Any], generation: tuple):
+        """Cache a record read at the given generation, unless it was invalidated meanwhile."""
+        if generation != self.generation(name):
+            return
+        self.entries[name] = {"record": copy.deepcopy(record), "cached_at": self.clock()}
+        self.entries.move_to_end(name)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, name: str):
+        """Drop a record after it was written."""
+        self.entries.pop(name, None)
+        # Only generations of names being read matter, so the map stays small enough
+        self.generations[name] = self.generations.get(name, 0) + 1
+        if len(self.generations) > 4 * self.max_size:
+            self.generations.clear()
+            self.global_generation += 1
+        self.invalidations += 1
+
+    def invalidate_document_id(self, document_id: Any):
+        """Drop the record with a database id, for changes that do not carry the name."""
+        for name, entry in list(self.entries.items()):
+            if entry["record"].get("_id") == document_id:
+                self.invalidate(name)
+                return
+        # Not cached, but a read of it may be in flight and must not be cached
+        self.global_generation += 1
+
+    def clear(self):
+        """Drop every record, e.g. when change notifications may have been missed."""
+        self.entries.clear()
+        self.generations.clear()
+        self.global_generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit/miss counters and the cache occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
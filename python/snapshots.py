@@ -0,0 +1,107 @@
+"""
+Columnar snapshots of training inputs and inference outputs.
+
+Every fine-tune persists the exact rows it trained (and validated) on, and an
+inference run can persist its outputs, as zstd-compressed Parquet files. The
+readers memory-map the files and stream record batches, so evaluation and
+re-training can scan millions of rows without loading them all at once.
+"""
+
+import os
+import shutil
+from typing import List, Dict, Any, Optional, Iterator, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+SNAPSHOT_ROOT = "./snapshots"
+FINE_TUNE_SNAPSHOT_DIR = os.path.join(SNAPSHOT_ROOT, "fine_tunes")
+
+COMPRESSION = "zstd"
+ROW_GROUP_SIZE = 64 * 1024
+DEFAULT_BATCH_SIZE = 64 * 1024
+
+
+def fine_tune_snapshot_dir(fine_tune_name: str) -> str:
+    """Return the snapshot directory of a fine-tune."""
+    return os.path.join(FINE_TUNE_SNAPSHOT_DIR, fine_tune_name)
+
+
+def write_snapshot(path: str, rows: List[Dict[str, Any]], columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Write rows to a compressed Parquet file.
+
+    Args:
+        path: Destination file
+        rows: Rows as dictionaries
+        columns: Columns to write, in order (default: keys of the first row)
+
+    Returns:
+        Dictionary with the path, the number of rows and the file size
+    """
+    columns = list(columns) if columns is not None else (list(rows[0].keys()) if rows else [])
+    table = pa.table({column: [row.get(column) for row in rows] for column in columns})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    pq.write_table(table, temporary_path, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(temporary_path, path)
+    return {"path": path, "rows": len(rows), "bytes": os.path.getsize(path)}
+
+
+def write_fine_tune_snapshot(fine_tune_name: str, training_data: List[Dict[str, str]],
+                             eval_data: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    Persist the exact training (and validation) rows of a fine-tune.
+
+    Returns:
+        Dictionary referencing the written files, stored on the fine-tune record
+    """
+    snapshot_dir = fine_tune_snapshot_dir(fine_tune_name)
+    snapshot = {"train": write_snapshot(os.path.join(snapshot_dir, "train.parquet"), training_data, ["input", "output"])}
+    if eval_data:
+        snapshot["eval"] = write_snapshot(os.path.join(snapshot_dir, "eval.parquet"), eval_data, ["input", "output"])
+    return snapshot
+
+
+def delete_fine_tune_snapshot(fine_tune_name: str):
+    """Delete the snapshot files of a fine-tune."""
+    snapshot_dir = fine_tune_snapshot_dir(fine_tune_name)
+    if os.path.isdir(snapshot_dir):
+        shutil.rmtree(snapshot_dir)
+
+
+def collect_orphan_snapshots(referenced_names: Sequence[str]) -> List[str]:
+    """Delete snapshot directories of fine-tunes that no longer have a record."""
+    referenced = set(referenced_names)
+    removed = []
+    if os.path.isdir(FINE_TUNE_SNAPSHOT_DIR):
+        for entry in os.scandir(FINE_TUNE_SNAPSHOT_DIR):
+            if entry.is_dir() and entry.name not in referenced:
+                shutil.rmtree(entry.path)
+                removed.append(entry.path)
+    return removed
+
+
+def scan_snapshot(path: str, columns: Optional[Sequence[str]] = None,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a snapshot as record batches from a memory-mapped file.
+
+    Only one batch (and the columns asked for) is materialized at a time.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=list(columns) if columns else None)
+
+
+def iter_snapshot_rows(path: str, columns: Optional[Sequence[str]] = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream a snapshot row by row as dictionaries."""
+    for batch in scan_snapshot(path, columns, batch_size):
+        yield from batch.to_pylist()
+
+
+def snapshot_row_count(path: str) -> int:
+    """Return the number of rows of a snapshot from its metadata, without reading it."""
+    return pq.ParquetFile(path, memory_map=True).metadata.num_rows
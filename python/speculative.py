@@ -0,0 +1,83 @@
+"""
+N-gram (prompt-lookup) speculative decoding configuration.
+
+Span extraction outputs copy most of their stimulus and perception text
+verbatim from the input, so proposing the continuation of a matching n-gram
+from the prompt gives large decode speedups without a draft model.
+"""
+
+from typing import Dict, Any, Optional
+
+
+DEFAULT_PROMPT_LOOKUP_MAX = 4
+DEFAULT_PROMPT_LOOKUP_MIN = 1
+DEFAULT_NUM_SPECULATIVE_TOKENS = 5
+
+
+def build_ngram_speculative_config(
+    prompt_lookup_max: int = DEFAULT_PROMPT_LOOKUP_MAX,
+    prompt_lookup_min: int = DEFAULT_PROMPT_LOOKUP_MIN,
+    num_speculative_tokens: int = DEFAULT_NUM_SPECULATIVE_TOKENS,
+) -> Dict[str, Any]:
+    """
+    Build the vLLM speculative config for prompt-lookup decoding.
+
+    Args:
+        prompt_lookup_max: Largest n-gram window matched against the prompt
+        prompt_lookup_min: Smallest n-gram window matched against the prompt
+        num_speculative_tokens: Number of tokens proposed (lookahead) per step
+
+    Returns:
+        Dictionary accepted by vLLM's ``speculative_config``
+    """
+    if not 1 <= prompt_lookup_min <= prompt_lookup_max:
+        raise ValueError(
+            f"Invalid n-gram window: min={prompt_lookup_min}, max={prompt_lookup_max}"
+        )
+    if num_speculative_tokens < 1:
+        raise ValueError(f"num_speculative_tokens must be positive: {num_speculative_tokens}")
+
+    return {
+        "method": "ngram",
+        "num_speculative_tokens": num_speculative_tokens,
+        "prompt_lookup_max": prompt_lookup_max,
+        "prompt_lookup_min": prompt_lookup_min,
+    }
+
+
+def speculative_config_from_settings(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the speculative config for the settings, or None if the mode is off."""
+    if not settings.get("speculative_decoding", False):
+        return None
+    return build_ngram_speculative_config(
+        prompt_lookup_max=settings.get("prompt_lookup_max", DEFAULT_PROMPT_LOOKUP_MAX),
+        prompt_lookup_min=settings.get("prompt_lookup_min", DEFAULT_PROMPT_LOOKUP_MIN),
+        num_speculative_tokens=settings.get("num_speculative_tokens", DEFAULT_NUM_SPECULATIVE_TOKENS),
+    )
+
+
+def acceptance_from_metrics(metrics) -> Optional[Dict[str, Any]]:
+    """
+    Compute the draft acceptance rate from vLLM engine metrics.
+
+    Args:
+        metrics: Metrics returned by ``LLM.get_metrics()``
+
+    Returns:
+        Dictionary with draft/accepted token counts and the acceptance rate,
+        or None if the engine reported no speculative decoding metrics
+    """
+    counters = {}
+    for metric in metrics:
+        if metric.name in ("vllm:spec_decode_num_draft_tokens", "vllm:spec_decode_num_accepted_tokens"):
+            counters[metric.name] = counters.get(metric.name, 0) + metric.value
+
+    draft = counters.get("vllm:spec_decode_num_draft_tokens")
+    if not draft:
+        return None
+    accepted = counters.get("vllm:spec_decode_num_accepted_tokens", 0)
+    return {
+        "draft_tokens": int(draft),
+        "accepted_tokens": int(accepted),
+        "acceptance_rate": accepted / draft,
+    }
@@ -0,0 +1,154 @@
+"""Drive the GPU arbiter with a fake vLLM server controller and fake GPU memory."""
+
+import asyncio
+
+from gpu_arbiter import GPUArbiter
+
+GB = 1024 ** 3
+
+
+class FakeServer:
+    """Stand-in for the vLLM server controller, holding or freeing fake GPU memory."""
+
+    def __init__(self, gpu, fine_tune_name="ft-served", sleep_supported=True, sleep_frees=True,
+                 sleep_fails=False):
+        self.gpu = gpu
+        self.fine_tune_name = fine_tune_name
+        self.sleep_supported = sleep_supported
+        self.sleep_frees = sleep_frees
+        self.sleep_fails = sleep_fails
+        self.running = True
+        self.sleeping = False
+        self.calls = []
+        self.gpu.used += self.gpu.server_bytes
+
+    async def is_running(self):
+        return self.running
+
+    def served_fine_tune(self):
+        return self.fine_tune_name if self.running else None
+
+    def supports_sleep(self):
+        return self.sleep_supported
+
+    async def sleep(self):
+        self.calls.append("sleep")
+        if self.sleep_fails:
+            raise RuntimeError("sleep endpoint unavailable")
+        self.sleeping = True
+        if self.sleep_frees:
+            self.gpu.used -= self.gpu.server_bytes
+
+    async def wake_up(self):
+        self.calls.append("wake_up")
+        self.sleeping = False
+        if self.sleep_frees:
+            self.gpu.used += self.gpu.server_bytes
+
+    async def stop(self):
+        self.calls.append("stop")
+        if self.running and not (self.sleeping and self.sleep_frees):
+            self.gpu.used -= self.gpu.server_bytes
+        self.running = False
+        self.sleeping = False
+
+    async def start(self, fine_tune_name):
+        self.calls.append(f"start {fine_tune_name}")
+        self.running = True
+        self.fine_tune_name = fine_tune_name
+        self.gpu.used += self.gpu.server_bytes
+
+
+class FakeGPU:
+    def __init__(self, total_bytes, server_bytes):
+        self.total_bytes = total_bytes
+        self.server_bytes = server_bytes
+        self.used = 0
+
+    def free(self):
+        return self.total_bytes - self.used
+
+
+def make_arbiter(total_gb=40, server_gb=24, training_gb=16, **server_options):
+    gpu = FakeGPU(total_gb * GB, server_gb * GB)
+    server = FakeServer(gpu, **server_options)
+    arbiter = GPUArbiter(server, free_memory=gpu.free, training_memory_bytes=training_gb * GB,
+                         clock=lambda: 0.0)
+    return arbiter, server, gpu
+
+
+def test_server_sleeps_while_training_and_wakes_up_after():
+    async def scenario():
+        arbiter, server, _ = make_arbiter(total_gb=32)
+        grant = await arbiter.acquire("ft-train")
+        assert grant["serving_suspension"] == "sleep"
+        assert grant["served_fine_tune"] == "ft-served"
+        assert server.calls == ["sleep"]
+
+        await arbiter.release("ft-train")
+        assert server.calls == ["sleep", "wake_up"]
+        assert arbiter.suspension is None
+        assert len(arbiter.pause_windows) == 1
+
+    asyncio.run(scenario())
+
+
+def test_server_is_stopped_when_sleep_fails_or_frees_too_little():
+    async def scenario(**server_options):
+        arbiter, server, _ = make_arbiter(total_gb=32, **server_options)
+        grant = await arbiter.acquire("ft-train")
+        assert grant["serving_suspension"] == "stop"
+        assert not server.running
+
+        await arbiter.release("ft-train")
+        assert server.calls[-1] == "start ft-served"
+        assert server.running
+        return server.calls
+
+    assert asyncio.run(scenario(sleep_supported=False)) == ["stop", "start ft-served"]
+    assert asyncio.run(scenario(sleep_fails=True)) == ["sleep", "stop", "start ft-served"]
+    assert asyncio.run(scenario(sleep_frees=False)) == ["sleep", "stop", "start ft-served"]
+
+
+def test_server_stopped_by_hand_during_suspension_is_not_restored():
+    async def scenario():
+        arbiter, server, _ = make_arbiter(total_gb=32)
+        await arbiter.acquire("ft-train")
+        # What POST /stop-vllm-server does while the server is suspended
+        arbiter.suspension["served_fine_tune"] = None
+
+        await arbiter.release("ft-train")
+        assert server.calls == ["sleep", "stop"]
+        assert not server.running
+        assert arbiter.pause_windows[-1]["restore_error"] is None
+
+    asyncio.run(scenario())
+
+
+def test_overlapping_trainings_each_get_memory_and_restore_after_the_last():
+    async def scenario():
+        # Room for the server and one fine-tune, not for a second one
+        arbiter, server, gpu = make_arbiter(total_gb=40)
+        first = await arbiter.acquire("ft-1")
+        assert first["serving_suspension"] is None
+        gpu.used += 16 * GB
+
+        second = await arbiter.acquire("ft-2")
+        assert second["serving_suspension"] == "sleep"
+        assert arbiter.suspension["suspended_for"] == "ft-2"
+        gpu.used += 16 * GB
+
+        third = await arbiter.acquire("ft-3")
+        assert third["serving_suspension"] == "sleep"
+        assert server.calls == ["sleep"]
+
+        for name in ["ft-1", "ft-3"]:
+            gpu.used -= 16 * GB
+            await arbiter.release(name)
+            assert server.calls == ["sleep"]
+        gpu.used -= 16 * GB
+        await arbiter.release("ft-2")
+        assert server.calls == ["sleep", "wake_up"]
+        assert arbiter.active_trainings == {}
+
+    asyncio.run(scenario())
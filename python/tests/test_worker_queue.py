@@ -0,0 +1,91 @@
+"""Drive the job queue with local worker stand-ins, as the remote workers would."""
+
+from worker_queue import JobQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_queue():
+    clock = FakeClock()
+    return JobQueue(heartbeat_timeout=60, clock=clock), clock
+
+
+def test_jobs_are_dispatched_within_worker_capacity():
+    queue, _ = make_queue()
+    first = queue.register_worker("gpu-a", capacity=1)
+    second = queue.register_worker("gpu-b", capacity=2)
+    for name in ["ft-1", "ft-2", "ft-3", "ft-4"]:
+        queue.enqueue(name, {"fine_tune_name": name})
+
+    assert queue.pull(first)["job_id"] == "ft-1"
+    assert queue.pull(first) is None
+    assert queue.pull(second)["job_id"] == "ft-2"
+    assert queue.pull(second)["job_id"] == "ft-3"
+    assert queue.pull(second) is None
+    assert queue.owns(second, "ft-3") and not queue.owns(first, "ft-3")
+
+    queue.finish("ft-1")
+    assert queue.pull(first)["job_id"] == "ft-4"
+    assert queue.snapshot()["pending_jobs"] == []
+
+
+def test_jobs_of_a_lost_worker_are_requeued_first():
+    queue, clock = make_queue()
+    lost = queue.register_worker("gpu-a", capacity=1)
+    alive = queue.register_worker("gpu-b", capacity=1)
+    queue.enqueue("ft-1", {})
+    queue.enqueue("ft-2", {})
+    queue.enqueue("ft-3", {})
+    queue.pull(lost)
+    queue.pull(alive)
+
+    clock.now = 45
+    assert queue.heartbeat(alive)
+    clock.now = 70
+    assert queue.requeue_lost_workers() == ["ft-1"]
+    assert lost not in queue.workers
+    assert not queue.owns(lost, "ft-1")
+    assert queue.snapshot()["pending_jobs"] == ["ft-1", "ft-3"]
+
+    # The lost worker must re-register before it can pull again
+    assert not queue.heartbeat(lost)
+    assert queue.pull(lost) is None
+
+    queue.finish("ft-2")
+    job = queue.pull(alive)
+    assert job["job_id"] == "ft-1"
+    assert job["attempts"] == 2
+
+
+def test_finished_job_is_not_dispatched_or_owned():
+    queue, _ = make_queue()
+    worker = queue.register_worker("gpu-a", capacity=1)
+    queue.enqueue("ft-deleted", {})
+    queue.enqueue("ft-kept", {})
+
+    queue.finish("ft-deleted")
+    assert queue.pull(worker)["job_id"] == "ft-kept"
+    queue.finish("ft-kept")
+    assert not queue.owns(worker, "ft-kept")
+    assert queue.workers[worker]["jobs"] == []
+
+
+def test_jobs_of_several_lost_workers_are_requeued_in_enqueue_order():
+    queue, clock = make_queue()
+    first = queue.register_worker("gpu-a", capacity=2)
+    second = queue.register_worker("gpu-b", capacity=1)
+    for name in ["ft-1", "ft-2", "ft-3", "ft-4"]:
+        queue.enqueue(name, {})
+    queue.pull(second)
+    queue.pull(first)
+    queue.pull(first)
+
+    clock.now = 70
+    assert sorted(queue.requeue_lost_workers()) == ["ft-1", "ft-2", "ft-3"]
+    assert queue.snapshot()["pending_jobs"] == ["ft-1", "ft-2", "ft-3", "ft-4"]
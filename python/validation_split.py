@@ -0,0 +1,44 @@
+"""
+Hold-out of validation rows from the training data of a fine-tune.
+
+The split is made before the training set is snapshotted, so the snapshot
+holds exactly the rows trained and evaluated on. It is seeded and
+independent of the training libraries, so the API and fine_tune() split the
+same rows the same way.
+"""
+
+import math
+import random
+from typing import List, Dict, Tuple, Optional
+
+
+VALIDATION_SEED = 3407
+
+
+def split_validation_rows(
+    rows: List[Dict[str, str]], validation_fraction: float, seed: int = VALIDATION_SEED
+) -> Tuple[List[Dict[str, str]], Optional[List[Dict[str, str]]]]:
+    """
+    Split a random validation set off the training rows.
+
+    Args:
+        rows: Training rows
+        validation_fraction: Share of the rows held out, rounded up to whole rows
+        seed: Random seed of the split
+
+    Returns:
+        Tuple of the training rows and the validation rows, None if the
+        fraction is 0 or either side would be empty
+    """
+    if validation_fraction <= 0:
+        return rows, None
+    eval_size = math.ceil(validation_fraction * len(rows))
+    if eval_size == 0 or eval_size >= len(rows):
+        print(f"⚠️ {len(rows)} rows are too few to hold out {validation_fraction:.0%} "
+              f"for validation, training without a validation set")
+        return rows, None
+
+    eval_indices = set(random.Random(seed).sample(range(len(rows)), eval_size))
+    train_rows = [row for index, row in enumerate(rows) if index not in eval_indices]
+    eval_rows = [row for index, row in enumerate(rows) if index in eval_indices]
+    return train_rows, eval_rows
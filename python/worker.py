@@ -0,0 +1,237 @@
+"""
+Training worker agent for running fine-tune jobs on remote GPU hosts.
+
+The agent registers its capacity with the API (started with
+TRAINING_MODE=remote), sends heartbeats, pulls fine-tune jobs, streams their
+status back and uploads the finished adapter directory to the central
+artifact location.
+
+Usage:
+    python worker.py --api-url http://central-host:8000 --capacity 1
+
+To exercise the protocol without a GPU, start several stand-ins on one machine
+with simulated training:
+    python worker.py --api-url http://localhost:8000 --hostname stand-in-1 --simulate-seconds 20
+    python worker.py --api-url http://localhost:8000 --hostname stand-in-2 --simulate-seconds 20
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import tarfile
+import threading
+import time
+import traceback
+from typing import Dict, Any, Optional
+
+import requests
+
+from model_cache import ModelCache
+
+
+POLL_INTERVAL_SECONDS = 5
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class WorkerAgent:
+    """Pulls fine-tune jobs from the API and runs them on this host."""
+
+    def __init__(self, api_url: str, hostname: str, capacity: int, work_dir: str,
+                 simulate_seconds: Optional[float] = None):
+        self.api_url = api_url.rstrip("/")
+        self.hostname = hostname
+        self.capacity = capacity
+        self.work_dir = work_dir
+        self.simulate_seconds = simulate_seconds
+        self.worker_id: Optional[str] = None
+        self.heartbeat_interval = POLL_INTERVAL_SECONDS
+        self.active_jobs: Dict[str, threading.Thread] = {}
+        self.stop_event = threading.Event()
+        self.model_cache = ModelCache()
+
+    def register(self):
+        """Register (or re-register) with the API."""
+        response = requests.post(
+            f"{self.api_url}/workers/register",
+            json={
+                "hostname": self.hostname,
+                "capacity": self.capacity,
+                "worker_id": self.worker_id,
+                "info": {"simulated": self.simulate_seconds is not None},
+            },
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        registration = response.json()
+        self.worker_id = registration["worker_id"]
+        self.heartbeat_interval = registration["heartbeat_interval"]
+        print(f"✅ Registered as worker {self.worker_id}")
+
+    def heartbeat_loop(self):
+        """Send heartbeats until stopped, re-registering if the API forgot us."""
+        while not self.stop_event.wait(self.heartbeat_interval):
+            try:
+                response = requests.post(
+                    f"{self.api_url}/workers/{self.worker_id}/heartbeat",
+                    timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+                if response.status_code == 404:
+                    self.register()
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Heartbeat failed: {e}")
+
+    def report_status(self, fine_tune_name: str, status: str,
+                      message: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """Stream a job status to the API. Returns False if the job was taken away."""
+        response = requests.post(
+            f"{self.api_url}/workers/{self.worker_id}/jobs/{fine_tune_name}/status",
+            json={"status": status, "message": message, "error": error},
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+        if response.status_code == 409:
+            return False
+        response.raise_for_status()
+        return True
+
+    def download_parent(self, parent_name: str) -> str:
+        """Download and extract the adapter a job resumes from."""
+        parent_dir = os.path.join(self.work_dir, "parents", parent_name)
+        if os.path.isdir(parent_dir):
+            return parent_dir
+
+        archive_path = parent_dir + ".tar.gz"
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        with requests.get(f"{self.api_url}/fine-tunes/{parent_name}/artifact", stream=True,
+                          timeout=REQUEST_TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            with open(archive_path, "wb") as f:
+                shutil.copyfileobj(response.raw, f)
+        with tarfile.open(archive_path, "r:gz") as archive:
+            archive.extractall(parent_dir)
+        os.remove(archive_path)
+        return parent_dir
+
+    def upload_artifact(self, fine_tune_name: str, output_dir: str):
+        """Upload the finished adapter directory as a tar.gz archive."""
+        archive_path = shutil.make_archive(output_dir, "gztar", output_dir)
+        try:
+            with open(archive_path, "rb") as f:
+                response = requests.put(
+                    f"{self.api_url}/workers/{self.worker_id}/jobs/{fine_tune_name}/artifact",
+                    files={"file": (os.path.basename(archive_path), f, "application/gzip")},
+                    timeout=None,
+                )
+            response.raise_for_status()
+        finally:
+            os.remove(archive_path)
+
+    def simulate_training(self, fine_tune_name: str, output_dir: str):
+        """Stand-in for fine_tune() that sleeps and writes a placeholder adapter."""
+        steps = 4
+        for step in range(steps):
+            time.sleep(self.simulate_seconds / steps)
+            if not self.report_status(fine_tune_name, "training", f"simulated step {step + 1}/{steps}"):
+                raise RuntimeError("Job was reassigned")
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "adapter_config.json"), "w") as f:
+            json.dump({"simulated": True, "fine_tune_name": fine_tune_name}, f)
+
+    def run_job(self, job: Dict[str, Any]):
+        """Run one fine-tune job and upload its adapter."""
+        fine_tune_name = job["fine_tune_name"]
+        training_settings = dict(job["training_settings"])
+        output_dir = os.path.join(self.work_dir, fine_tune_name)
+        training_settings["output_dir"] = output_dir
+
+        try:
+            self.report_status(fine_tune_name, "training", f"started on {self.hostname}")
+            if job.get("resumed_from"):
+                training_settings["resume_from_dir"] = self.download_parent(job["resumed_from"])
+
+            if self.simulate_seconds is not None:
+                self.simulate_training(fine_tune_name, output_dir)
+            else:
+                from fine_tune import fine_tune
+                try:
+                    training_settings["model_path"] = self.model_cache.resolve(training_settings["model_name"])
+                except Exception as e:
+                    print(f"⚠️ Base model not cached, loading it by name: {e}")
+                fine_tune(job["training_data"], training_settings, job.get("eval_data"))
+
+            self.report_status(fine_tune_name, "training", "uploading adapter")
+            self.upload_artifact(fine_tune_name, output_dir)
+            print(f"✅ Fine-tune completed and uploaded: {fine_tune_name}")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                self.report_status(fine_tune_name, "failed", error=str(e))
+            except requests.exceptions.RequestException:
+                pass
+            print(f"❌ Fine-tune failed: {fine_tune_name}, Error: {e}")
+        finally:
+            if os.path.isdir(output_dir):
+                shutil.rmtree(output_dir)
+            self.active_jobs.pop(fine_tune_name, None)
+
+    def run(self):
+        """Register, then pull and run jobs until interrupted."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.register()
+        threading.Thread(target=self.heartbeat_loop, daemon=True).start()
+
+        try:
+            while True:
+                if len(self.active_jobs) >= self.capacity:
+                    time.sleep(POLL_INTERVAL_SECONDS)
+                    continue
+                try:
+                    response = requests.post(
+                        f"{self.api_url}/workers/{self.worker_id}/pull",
+                        timeout=REQUEST_TIMEOUT_SECONDS,
+                    )
+                    if response.status_code == 404:
+                        self.register()
+                        continue
+                    response.raise_for_status()
+                except requests.exceptions.RequestException as e:
+                    print(f"⚠️ Failed to pull job: {e}")
+                    time.sleep(POLL_INTERVAL_SECONDS)
+                    continue
+
+                if response.status_code == 204:
+                    time.sleep(POLL_INTERVAL_SECONDS)
+                    continue
+
+                job = response.json()
+                print(f"🚀 Pulled fine-tune job: {job['fine_tune_name']}")
+                thread = threading.Thread(target=self.run_job, args=(job,), daemon=True)
+                self.active_jobs[job["fine_tune_name"]] = thread
+                thread.start()
+        except KeyboardInterrupt:
+            print("🛑 Worker stopping")
+            self.stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", required=True, help="URL of the central API")
+    parser.add_argument("--hostname", default=socket.gethostname(), help="Name reported to the API")
+    parser.add_argument("--capacity", type=int, default=1, help="Number of concurrent fine-tune jobs")
+    parser.add_argument("--work-dir", default="./worker_jobs", help="Local directory for job files")
+    parser.add_argument("--simulate-seconds", type=float, default=None,
+                        help="Simulate training for this many seconds instead of running fine_tune()")
+    args = parser.parse_args()
+
+    WorkerAgent(
+        api_url=args.api_url,
+        hostname=args.hostname,
+        capacity=args.capacity,
+        work_dir=os.path.join(args.work_dir, args.hostname),
+        simulate_seconds=args.simulate_seconds,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
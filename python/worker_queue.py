@@ -0,0 +1,131 @@
+"""
+Job queue for dispatching fine-tune jobs to remote training workers.
+
+Workers on other GPU hosts register their capacity, keep themselves alive with
+heartbeats and pull fine-tune jobs. A worker that misses heartbeats for longer
+than the timeout is considered lost and its jobs are put back at the front of
+the queue. The queue holds no I/O so it can be driven by the API and by tests
+with several local worker stand-ins alike.
+"""
+
+import time
+import uuid
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable
+
+
+HEARTBEAT_TIMEOUT_SECONDS = 60
+
+
+class JobQueue:
+    """In-memory queue of fine-tune jobs and registry of training workers."""
+
+    def __init__(self, heartbeat_timeout: float = HEARTBEAT_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.clock = clock
+        self.pending = deque()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.workers: Dict[str, Dict[str, Any]] = {}
+
+    def register_worker(self, hostname: str, capacity: int,
+                        worker_id: Optional[str] = None,
+                        info: Optional[Dict[str, Any]] = None) -> str:
+        """Register a worker (or re-register a known one) and return its id."""
+        worker_id = worker_id or f"{hostname}-{uuid.uuid4().hex[:8]}"
+        previous = self.workers.get(worker_id)
+        self.workers[worker_id] = {
+            "worker_id": worker_id,
+            "hostname": hostname,
+            "capacity": capacity,
+            "info": info or {},
+            "jobs": previous["jobs"] if previous else [],
+            "last_heartbeat": self.clock(),
+            "registered_at": previous["registered_at"] if previous else self.clock(),
+        }
+        return worker_id
+
+    def heartbeat(self, worker_id: str) -> bool:
+        """Record a heartbeat. Returns False if the worker is unknown and must re-register."""
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return False
+        worker["last_heartbeat"] = self.clock()
+        return True
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any]):
+        """Add a job to the back of the queue."""
+        self.jobs[job_id] = {"job_id": job_id, "payload": payload, "worker_id": None, "attempts": 0}
+        self.pending.append(job_id)
+
+    def pull(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Assign the next pending job to a worker with free capacity."""
+        worker = self.workers.get(worker_id)
+        if worker is None or len(worker["jobs"]) >= worker["capacity"] or not self.pending:
+            return None
+
+        job = self.jobs[self.pending.popleft()]
+        job["worker_id"] = worker_id
+        job["attempts"] += 1
+        worker["jobs"].append(job["job_id"])
+        worker["last_heartbeat"] = self.clock()
+        return job
+
+    def owns(self, worker_id: str, job_id: str) -> bool:
+        """Check whether a job is currently assigned to a worker."""
+        job = self.jobs.get(job_id)
+        return job is not None and job["worker_id"] == worker_id
+
+    def finish(self, job_id: str):
+        """Remove a finished (completed or failed) job."""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        worker = self.workers.get(job["worker_id"])
+        if worker is not None and job_id in worker["jobs"]:
+            worker["jobs"].remove(job_id)
+        if job_id in self.pending:
+            self.pending.remove(job_id)
+
+    def requeue_lost_workers(self) -> List[str]:
+        """
+        Drop workers whose heartbeat timed out and requeue their jobs.
+
+        Returns:
+            Ids of the requeued jobs
+        """
+        now = self.clock()
+        requeued = []
+        for worker_id, worker in list(self.workers.items()):
+            if now - worker["last_heartbeat"] <= self.heartbeat_timeout:
+                continue
+            for job_id in worker["jobs"]:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    job["worker_id"] = None
+                    requeued.append(job_id)
+            del self.workers[worker_id]
+
+        # Lost jobs go first, they have waited the longest, in the order they were enqueued
+        enqueue_order = {job_id: position for position, job_id in enumerate(self.jobs)}
+        requeued.sort(key=enqueue_order.get)
+        self.pending.extendleft(reversed(requeued))
+        return requeued
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the state of workers and jobs for reporting."""
+        now = self.clock()
+        return {
+            "workers": [
+                {
+                    "worker_id": worker["worker_id"],
+                    "hostname": worker["hostname"],
+                    "capacity": worker["capacity"],
+                    "info": worker["info"],
+                    "jobs": list(worker["jobs"]),
+                    "seconds_since_heartbeat": now - worker["last_heartbeat"],
+                }
+                for worker in self.workers.values()
+            ],
+            "pending_jobs": list(self.pending),
+        }